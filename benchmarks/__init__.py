@@ -0,0 +1,8 @@
+"""Benchmark suite for clyps.
+
+:mod:`benchmarks.workloads` generates parameterised production-system
+workloads and :mod:`benchmarks.runner` times them on the inference engines::
+
+    python -m benchmarks.runner --output results.json
+    python -m benchmarks.runner --compare results.json --output new.json
+"""
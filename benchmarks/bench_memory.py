@@ -0,0 +1,36 @@
+"""Compares the bytes per fact of FactStore and ColumnarFactStore.
+
+Usage: python -m benchmarks.bench_memory [number of facts]
+"""
+import random
+import sys
+import tracemalloc
+
+from clyps.columnar import ColumnarFactStore
+from clyps.fact import Fact
+from clyps.store import FactStore
+
+
+def facts(count, seed=1):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield Fact.from_string(
+            f"(e{rng.randrange(count // 5 or 1)} a{rng.randrange(30)} v{rng.randrange(2000)})"
+        )
+
+
+def bytes_per_fact(factory, count):
+    tracemalloc.start()
+    store = factory(facts(count))
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current / len(store)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    objects = bytes_per_fact(FactStore, count)
+    columnar = bytes_per_fact(ColumnarFactStore, count)
+    print(f"FactStore:         {objects:8.1f} bytes/fact")
+    print(f"ColumnarFactStore: {columnar:8.1f} bytes/fact")
+    print(f"Reduction:         {objects / columnar:8.1f}x")
@@ -0,0 +1,61 @@
+"""Compares sequential semi-naive inference with the process-pool engine.
+
+Two workloads: ancestors over chains with a few unrelated rules, and the
+transitive closure of a random graph with a single recursive rule, where
+all the work is in one rule and only splitting the data can spread it.
+
+Usage: python -m benchmarks.bench_parallel [chains] [chain length] [workers]
+"""
+import random
+import sys
+import time
+
+from clyps.fact import Fact
+from clyps.kb import KnowledgeBase
+from clyps.rule import Rule
+
+
+def build(engine, chains, length, workers=None):
+    kb = KnowledgeBase(engine=engine, workers=workers)
+    for chain in range(chains):
+        for i in range(length):
+            kb.add_fact(Fact(f"c{chain}n{i}", "parent", f"c{chain}n{i + 1}"))
+            kb.add_fact(Fact(f"c{chain}n{i}", "has", "hair"))
+    kb.add_rule(Rule("base", [Fact("?x", "parent", "?y")], [Fact("?x", "ancestor", "?y")]))
+    kb.add_rule(
+        Rule("step", [Fact("?x", "parent", "?y"), Fact("?y", "ancestor", "?z")], [Fact("?x", "ancestor", "?z")])
+    )
+    kb.add_rule(Rule("mammal", [Fact("?x", "has", "hair")], [Fact("?x", "is", "mammal")]))
+    kb.add_rule(Rule("warm", [Fact("?x", "is", "mammal")], [Fact("?x", "is", "warm")]))
+    return kb
+
+
+def build_closure(engine, nodes, edges, workers=None):
+    kb = KnowledgeBase(engine=engine, workers=workers)
+    kb.add_rule(Rule("reach", [Fact("?x", "reach", "?y"), Fact("?y", "reach", "?z")], [Fact("?x", "reach", "?z")]))
+    rng = random.Random(1)
+    for _ in range(edges):
+        kb.add_fact(Fact(f"n{rng.randrange(nodes)}", "reach", f"n{rng.randrange(nodes)}"))
+    return kb
+
+
+def timed(kb):
+    start = time.perf_counter()
+    kb.infer()
+    return time.perf_counter() - start, len(kb.facts)
+
+
+if __name__ == "__main__":
+    chains = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    length = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    for name, builder, args in (
+        ("ancestors", build, (chains, length)),
+        ("closure", build_closure, (chains * 8, chains * 10)),
+    ):
+        sequential, facts = timed(builder("seminaive", *args))
+        parallel, parallel_facts = timed(builder("parallel", *args, workers))
+        assert facts == parallel_facts
+        print(f"{name} facts: {facts}")
+        print(f"  seminaive: {sequential:.2f}s")
+        print(f"  parallel:  {parallel:.2f}s ({sequential / parallel:.2f}x)")
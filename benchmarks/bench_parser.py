@@ -0,0 +1,41 @@
+"""Parse throughput of clyps.parser, in MB/s.
+
+Usage: python -m benchmarks.bench_parser [number of lines]
+"""
+import sys
+import time
+
+from clyps.fact import Fact
+from clyps.parser import parse
+
+
+def source(lines):
+    parts = []
+    for i in range(lines):
+        if i % 10 == 0:
+            parts.append(f"(defrule rule{i} (?x has attr{i}) (?x is kind{i % 7}) => (?x gets label{i}))")
+        else:
+            parts.append(f"(entity{i} has attr{i % 1000})")
+    return "\n".join(parts) + "\n"
+
+
+def throughput(text, function):
+    start = time.perf_counter()
+    result = function(text)
+    elapsed = time.perf_counter() - start
+    return len(text.encode()) / elapsed / 1e6, result
+
+
+def line_by_line(text):
+    # One Fact.from_string call per line, for comparison
+    return [Fact.from_string(line) for line in text.splitlines() if not line.startswith("(defrule")]
+
+
+if __name__ == "__main__":
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    text = source(lines)
+    speed, items = throughput(text, parse)
+    print(f"{lines} lines, {len(text) / 1e6:.1f} MB, {len(items)} items")
+    print(f"parse:              {speed:6.2f} MB/s")
+    speed, _ = throughput(text, line_by_line)
+    print(f"Fact.from_string:   {speed:6.2f} MB/s")
@@ -0,0 +1,65 @@
+"""Records per second of RuleSet.run_many against a KnowledgeBase per record.
+
+Every record is a small, independent fact set evaluated against the same
+rules.
+
+Usage: python -m benchmarks.bench_ruleset [records] [workers] [chunksize]
+"""
+import random
+import sys
+import time
+
+from clyps.fact import Fact
+from clyps.kb import KnowledgeBase
+from clyps.ruleset import RuleSet
+
+SOURCE = """
+(defrule adult (?c age adult) => (?c may borrow))
+(defrule income (?c income high) (?c may borrow) => (?c limit large))
+(defrule risky (?c history late) (?c limit large) => (?c needs review))
+(defrule flag (?c needs review) (?c country ?country) => (?country has review))
+(defrule trusted (?c history clean) (?c may borrow) => (?c is trusted))
+"""
+
+
+def records(count, seed=3):
+    rng = random.Random(seed)
+    for record in range(count):
+        customer = f"c{record}"
+        yield [
+            Fact(customer, "age", rng.choice(["adult", "minor"])),
+            Fact(customer, "income", rng.choice(["high", "low"])),
+            Fact(customer, "history", rng.choice(["late", "clean"])),
+            Fact(customer, "country", rng.choice(["es", "fr", "de"])),
+        ]
+
+
+def per_record(batches):
+    results = []
+    for batch in batches:
+        kb = KnowledgeBase(engine="seminaive")
+        kb.loads(SOURCE)
+        for fact in batch:
+            kb.add_fact(fact)
+        kb.infer()
+        results.append(len(kb.facts) - len(batch))
+    return results
+
+
+def rule_set(batches, workers, chunksize):
+    return [len(derived) for derived in RuleSet.loads(SOURCE).run_many(batches, workers, chunksize)]
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    chunksize = int(sys.argv[3]) if len(sys.argv) > 3 else 256
+    start = time.perf_counter()
+    expected = per_record(records(count))
+    baseline = count / (time.perf_counter() - start)
+    start = time.perf_counter()
+    assert rule_set(records(count), workers, chunksize) == expected
+    throughput = count / (time.perf_counter() - start)
+    print(f"records: {count}")
+    print(f"KnowledgeBase per record: {baseline:,.0f} records/s")
+    print(f"RuleSet.run_many:         {throughput:,.0f} records/s ({throughput / baseline:.1f}x)")
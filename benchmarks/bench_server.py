@@ -0,0 +1,62 @@
+"""Load test for the network service with many concurrent stand-in clients.
+
+Usage: python -m benchmarks.bench_server [clients] [assertions per client] [--port PORT | --socket PATH]
+
+Without --port or --socket an in-process server is started; otherwise the
+clients connect to a running ``clyps serve``.
+"""
+import argparse
+import asyncio
+import time
+
+from clyps.fact import Fact
+from clyps.kb import KnowledgeBase
+from clyps.rule import Rule
+from clyps.server import Client, KnowledgeBaseServer
+
+
+async def client_session(index, assertions, connect):
+    client = await connect()
+    latencies = []
+    for i in range(assertions):
+        start = time.perf_counter()
+        await client.assert_facts(f"(c{index}n{i} has hair)")
+        latencies.append(time.perf_counter() - start)
+    results = [bindings async for bindings in client.query("(?x is mammal)", limit=100)]
+    await client.close()
+    return latencies, len(results)
+
+
+async def main(clients, assertions, port=None, path=None):
+    listener = None
+    if port is None and path is None:
+        kb = KnowledgeBase(engine="seminaive")
+        kb.add_rule(Rule("mammal", [Fact("?x", "has", "hair")], [Fact("?x", "is", "mammal")]))
+        server = KnowledgeBaseServer(kb)
+        listener = await server.start()
+        port = listener.sockets[0].getsockname()[1]
+
+    def connect():
+        return Client.connect(port=port, path=path)
+
+    start = time.perf_counter()
+    sessions = await asyncio.gather(*(client_session(i, assertions, connect) for i in range(clients)))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for session, _ in sessions for latency in session)
+    print(f"{clients} clients x {assertions} assertions in {elapsed:.2f}s")
+    print(f"{len(latencies) / elapsed:,.0f} assertions/s")
+    print(f"latency p50 {latencies[len(latencies) // 2] * 1000:.1f}ms"
+          f"  p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms")
+    if listener is not None:
+        print(f"{server.batches} inference passes")
+        listener.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("clients", type=int, nargs="?", default=200)
+    parser.add_argument("assertions", type=int, nargs="?", default=20)
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--socket", dest="path")
+    args = parser.parse_args()
+    asyncio.run(main(args.clients, args.assertions, args.port, args.path))
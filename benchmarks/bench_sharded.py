@@ -0,0 +1,51 @@
+"""Compares sequential semi-naive inference with the entity-sharded engine.
+
+The workload only has entity-local rules, like the ``mammalRule`` example,
+over ``entities`` entities with four facts each.
+
+Usage: python -m benchmarks.bench_sharded [entities] [workers]
+"""
+import sys
+import time
+
+from clyps.fact import Fact
+from clyps.kb import KnowledgeBase
+from clyps.rule import Rule
+from clyps.store import FactStore
+
+
+def build(engine, entities, workers=None):
+    facts = []
+    for i in range(entities):
+        animal = f"a{i}"
+        facts += [
+            Fact(animal, "has", "hair" if i % 2 else "feathers"),
+            Fact(animal, "eats", "meat" if i % 3 else "grass"),
+            Fact(animal, "lives", "land"),
+            Fact(animal, "weight", str(i % 100)),
+        ]
+    kb = KnowledgeBase(engine=engine, store=FactStore(facts), workers=workers)
+    kb.add_rule(Rule("mammal", [Fact("?animal", "has", "hair")], [Fact("?animal", "is", "mammal")]))
+    kb.add_rule(Rule("bird", [Fact("?animal", "has", "feathers")], [Fact("?animal", "is", "bird")]))
+    kb.add_rule(Rule("carnivore", [Fact("?animal", "is", "mammal"), Fact("?animal", "eats", "meat")],
+                     [Fact("?animal", "is", "carnivore")]))
+    kb.add_rule(Rule("predator", [Fact("?animal", "is", "carnivore"), Fact("?animal", "lives", "?where")],
+                     [Fact("?animal", "hunts", "?where")]))
+    return kb
+
+
+def timed(kb):
+    start = time.perf_counter()
+    kb.infer()
+    return time.perf_counter() - start, len(kb.facts)
+
+
+if __name__ == "__main__":
+    entities = int(sys.argv[1]) if len(sys.argv) > 1 else 250000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    sequential, facts = timed(build("seminaive", entities))
+    sharded, sharded_facts = timed(build("sharded", entities, workers))
+    assert facts == sharded_facts
+    print(f"facts: {facts}")
+    print(f"seminaive: {sequential:.2f}s")
+    print(f"sharded:   {sharded:.2f}s ({sequential / sharded:.2f}x)")
@@ -0,0 +1,44 @@
+"""Times saving a saturated knowledge base and opening its snapshot.
+
+Runs with and without truth maintenance, whose derived flags are also saved.
+
+Usage: python -m benchmarks.bench_snapshot [number of facts]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from clyps.columnar import ColumnarFactStore
+from clyps.fact import Fact
+from clyps.kb import KnowledgeBase
+from clyps.rule import Rule
+
+
+def build(count, truth_maintenance=False):
+    kb = KnowledgeBase(engine="seminaive", store=ColumnarFactStore(), truth_maintenance=truth_maintenance)
+    kb.add_rule(Rule("tag", [Fact("?x", "a1", "?y")], [Fact("?x", "tagged", "?y")]))
+    for i in range(count):
+        kb.add_fact(Fact(f"e{i // 20}", f"a{i % 30}", f"v{i % 2000}"))
+    kb.infer()
+    return kb
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    for truth_maintenance in (False, True):
+        kb = build(count, truth_maintenance)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "kb.snap")
+            start = time.perf_counter()
+            kb.save_snapshot(path)
+            saved = time.perf_counter() - start
+            start = time.perf_counter()
+            loaded = KnowledgeBase.load_snapshot(path)
+            opened = time.perf_counter() - start
+            start = time.perf_counter()
+            found = len(loaded.facts.lookup("e7", "a1", None))
+            queried = time.perf_counter() - start
+            print(f"{len(kb.facts)} facts, {os.path.getsize(path) / 2**20:.1f} MiB"
+                  f"{', truth maintenance' if truth_maintenance else ''}")
+            print(f"save {saved:.3f}s  open {opened * 1000:.2f}ms  first lookup {queried * 1000:.2f}ms ({found} facts)")
@@ -0,0 +1,72 @@
+"""Compares Rule.match with the NumPy matcher of clyps.vectorized.
+
+Also runs the semi-naive engine end to end over a columnar store, with the
+large rounds matched in Python and with NumPy.
+
+Usage: python -m benchmarks.bench_vectorized [number of facts]
+"""
+import random
+import sys
+import time
+
+from clyps import kb as kb_module
+from clyps.columnar import ColumnarFactStore
+from clyps.fact import Fact
+from clyps.kb import KnowledgeBase
+from clyps.rule import Rule
+from clyps.vectorized import FactArrays
+
+RULES = [
+    Rule("select", [Fact("?x", "a1", "v7")], []),
+    Rule("scan", [Fact("?x", "a2", "?y")], []),
+    Rule("join", [Fact("?x", "a3", "v1"), Fact("?x", "a4", "?y")], []),
+]
+
+
+def facts(count, seed=1):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield Fact(f"e{rng.randrange(count // 5 or 1)}", f"a{rng.randrange(30)}", f"v{rng.randrange(2000)}")
+
+
+ENGINE_RULES = [
+    Rule("join", [Fact("?x", "a3", "v1"), Fact("?x", "a4", "?y")], [Fact("?x", "b1", "?y")]),
+    Rule("chain", [Fact("?x", "b1", "?y"), Fact("?z", "a5", "?y")], [Fact("?z", "b2", "?x")]),
+    Rule("copy", [Fact("?x", "a6", "?y")], [Fact("?y", "b3", "?x")]),
+]
+
+
+def infer(store, vectorized):
+    kb_module.VECTORIZED_DELTA = 20000 if vectorized else sys.maxsize
+    kb = KnowledgeBase(engine="seminaive", store=store)
+    for rule in ENGINE_RULES:
+        kb.add_rule(rule)
+    kb.infer()
+    return len(kb.facts)
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    store = ColumnarFactStore(facts(count))
+    store.compact()
+    seconds, arrays = timed(lambda: FactArrays(store))
+    print(f"{count} facts, FactArrays built in {seconds:.3f}s")
+    print(f"{'rule':8} {'matches':>8} {'python':>9} {'numpy':>9} {'ids only':>9}")
+    for rule in RULES:
+        python, expected = timed(lambda: rule.match(store))
+        vectorized, result = timed(lambda: arrays.match(rule))
+        ids, _ = timed(lambda: arrays.match_ids(rule))
+        assert len(result) == len(expected)
+        print(f"{rule.name:8} {len(result):8} {python:8.3f}s {vectorized:8.3f}s {ids:8.3f}s")
+
+    print("semi-naive engine over a columnar store:")
+    for vectorized in (False, True):
+        store = ColumnarFactStore(facts(count))
+        seconds, size = timed(lambda: infer(store, vectorized))
+        print(f"  {'numpy' if vectorized else 'python':6} {size} facts in {seconds:.3f}s")
@@ -0,0 +1,70 @@
+"""Read latency while another thread runs inference.
+
+Compares readers that take a lock shared with the writer (the only safe
+option with a plain FactStore) with readers of VersionedFactStore snapshots.
+
+Usage: python -m benchmarks.bench_versioned [chains] [chain length]
+"""
+import sys
+import threading
+import time
+
+from clyps.fact import Fact
+from clyps.kb import KnowledgeBase
+from clyps.rule import Rule
+from clyps.versioned import VersionedFactStore
+
+
+def build(store=None):
+    kb = KnowledgeBase(engine="seminaive", store=store)
+    kb.add_rule(Rule("base", [Fact("?x", "parent", "?y")], [Fact("?x", "ancestor", "?y")]))
+    kb.add_rule(Rule("step", [Fact("?x", "parent", "?y"), Fact("?y", "ancestor", "?z")],
+                     [Fact("?x", "ancestor", "?z")]))
+    return kb
+
+
+def measure(kb, chains, length, read):
+    lock = threading.Lock()
+    done = threading.Event()
+    latencies = []
+
+    def writer():
+        for chain in range(chains):
+            with lock:
+                for i in range(length):
+                    kb.add_fact(Fact(f"c{chain}n{i}", "parent", f"c{chain}n{i + 1}"))
+                kb.infer()
+        done.set()
+
+    def reader():
+        while not done.is_set():
+            start = time.perf_counter()
+            read(kb, lock)
+            latencies.append(time.perf_counter() - start)
+            time.sleep(0.001)
+
+    threads = [threading.Thread(target=writer), threading.Thread(target=reader)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)], latencies[-1]
+
+
+def locked_read(kb, lock):
+    with lock:
+        return list(kb.query("(c0n0 ancestor ?x)", limit=10))
+
+
+def snapshot_read(kb, lock):
+    return list(kb.snapshot().query("(c0n0 ancestor ?x)", limit=10))
+
+
+if __name__ == "__main__":
+    chains = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    length = int(sys.argv[2]) if len(sys.argv) > 2 else 150
+    for name, kb, read in [("locked", build(), locked_read),
+                           ("snapshot", build(VersionedFactStore()), snapshot_read)]:
+        p50, p99, worst = measure(kb, chains, length, read)
+        print(f"{name:<9} read latency p50 {p50 * 1000:7.2f}ms  p99 {p99 * 1000:7.2f}ms  max {worst * 1000:7.2f}ms")
@@ -0,0 +1,157 @@
+"""Runs workloads on the inference engines and reports time and memory.
+
+Usage::
+
+    python -m benchmarks.runner [--workload NAME ...] [--engine NAME ...]
+                                [--sizes N,N,...] [--repeat N]
+                                [--output results.json] [--compare old.json]
+
+For every workload, size and engine the runner reports the time spent
+asserting the facts and running ``infer()``, the facts per second (final
+facts over total time) and the peak memory traced by :mod:`tracemalloc`.
+Timings are the best of ``--repeat`` runs without tracing; memory is
+measured in a separate traced run, since tracing slows Python down.
+"""
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+import clyps
+from clyps.kb import KnowledgeBase
+
+from .workloads import DEFAULT_SIZES, WORKLOADS, Workload
+
+
+def execute(workload: Workload, engine: str) -> KnowledgeBase:
+    """Builds a knowledge base for the workload and saturates it."""
+    kb = KnowledgeBase(engine=engine)
+    for rule in workload.rules:
+        kb.add_rule(rule)
+    for fact in workload.facts:
+        kb.add_fact(fact)
+    kb.infer()
+    return kb
+
+
+def measure(workload: Workload, engine: str, repeat: int = 1, memory: bool = True) -> dict:
+    """Times one workload on one engine and returns a result record."""
+    best_assert = best_infer = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        kb = KnowledgeBase(engine=engine)
+        for rule in workload.rules:
+            kb.add_rule(rule)
+        start = time.perf_counter()
+        for fact in workload.facts:
+            kb.add_fact(fact)
+        asserted = time.perf_counter()
+        kb.infer()
+        finished = time.perf_counter()
+        best_assert = min(best_assert, asserted - start)
+        best_infer = min(best_infer, finished - asserted)
+    facts = len(kb.facts)
+    del kb
+
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        execute(workload, engine)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    seconds = best_assert + best_infer
+    return {
+        "workload": workload.name,
+        "params": workload.params,
+        "engine": engine,
+        "rules": len(workload.rules),
+        "input_facts": len(workload.facts),
+        "facts": facts,
+        "derived_facts": facts - len(set(workload.facts)),
+        "assert_seconds": best_assert,
+        "infer_seconds": best_infer,
+        "seconds": seconds,
+        "facts_per_second": facts / seconds if seconds else None,
+        "peak_memory_bytes": peak,
+    }
+
+
+def run(workloads: Optional[List[str]] = None, engines: Optional[List[str]] = None,
+        sizes: Optional[List[int]] = None, repeat: int = 1, memory: bool = True, log=None) -> dict:
+    """Runs every combination and returns a JSON-serialisable report."""
+    results = []
+    for name in workloads or list(WORKLOADS):
+        for size in sizes or DEFAULT_SIZES[name]:
+            workload = WORKLOADS[name](size)
+            for engine in engines or ["seminaive", "rete"]:
+                result = measure(workload, engine, repeat=repeat, memory=memory)
+                results.append(result)
+                if log is not None:
+                    log(format_result(result))
+    return {
+        "clyps_version": clyps.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "results": results,
+    }
+
+
+def format_result(result: dict) -> str:
+    memory = result["peak_memory_bytes"]
+    memory = "-" if memory is None else f"{memory / 2**20:.1f} MiB"
+    return (
+        f"{result['workload']:<20} {result['params']['size']:>8} {result['engine']:<10}"
+        f" {result['facts']:>9} facts {result['seconds']:9.3f}s"
+        f" {result['facts_per_second'] or 0:>12,.0f} facts/s {memory:>10}"
+    )
+
+
+def _key(result: dict):
+    return result["workload"], json.dumps(result["params"], sort_keys=True), result["engine"]
+
+
+def compare(baseline: dict, report: dict) -> List[str]:
+    """Lines comparing the timings of a report with an earlier one."""
+    previous: Dict[tuple, dict] = {_key(result): result for result in baseline["results"]}
+    lines = []
+    for result in report["results"]:
+        old = previous.get(_key(result))
+        if old is None or not result["seconds"]:
+            continue
+        speedup = old["seconds"] / result["seconds"]
+        lines.append(f"{format_result(result)}  {speedup:5.2f}x vs {baseline.get('clyps_version', '?')}")
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workload", action="append", choices=sorted(WORKLOADS), dest="workloads")
+    parser.add_argument("--engine", action="append", choices=KnowledgeBase.ENGINES, dest="engines")
+    parser.add_argument("--sizes", type=lambda text: [int(size) for size in text.split(",")])
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--no-memory", action="store_false", dest="memory", help="skip the traced run")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    args = parser.parse_args(argv)
+
+    report = run(args.workloads, args.engines, args.sizes, args.repeat, args.memory, log=print)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as stream:
+            json.dump(report, stream, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as stream:
+            baseline = json.load(stream)
+        print()
+        for line in compare(baseline, report):
+            print(line)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""Parameterised workload generators.
+
+Every generator takes a size and returns a :class:`Workload` with the facts
+to assert and the rules to run. The classic OPS5/CLIPS benchmarks are
+adapted to what clyps rules can express (positive conditions over
+(entity attribute value) facts, no negation or arithmetic): they keep the
+join structure of the originals, not their conflict-resolution behaviour.
+"""
+from typing import Callable, Dict, List
+
+from clyps.fact import Fact
+from clyps.rule import Rule
+
+
+class Workload:
+    """Facts and rules of one benchmark run, with the parameters that made them."""
+
+    def __init__(self, name: str, params: dict, facts: List[Fact], rules: List[Rule]):
+        self.name = name
+        self.params = params
+        self.facts = facts
+        self.rules = rules
+
+    def __repr__(self) -> str:
+        return f"Workload({self.name}, {self.params}, {len(self.facts)} facts, {len(self.rules)} rules)"
+
+
+def transitive_closure(size: int, chains: int = 1) -> Workload:
+    """``chains`` parent chains of ``size`` edges and the ancestor rules.
+
+    Recursive rule with a two-condition join; derives size*(size+1)/2
+    ancestor facts per chain.
+    """
+    facts = [
+        Fact(f"c{chain}n{i}", "parent", f"c{chain}n{i + 1}")
+        for chain in range(chains) for i in range(size)
+    ]
+    rules = [
+        Rule("base", [Fact("?x", "parent", "?y")], [Fact("?x", "ancestor", "?y")]),
+        Rule("step", [Fact("?x", "parent", "?y"), Fact("?y", "ancestor", "?z")], [Fact("?x", "ancestor", "?z")]),
+    ]
+    return Workload("transitive_closure", {"size": size, "chains": chains}, facts, rules)
+
+
+def manners(size: int, hobbies: int = 3) -> Workload:
+    """Miss Manners style: seating ``size`` guests next to compatible ones.
+
+    Guests alternate sex and have one to three of ``hobbies`` hobbies; two
+    guests of opposite sex sharing a hobby may sit together. Starting from
+    the first guest, the seating spreads to every reachable guest. The
+    four-condition hobby join dominates, as in the original benchmark.
+    """
+    facts = []
+    for guest in range(size):
+        name = f"guest{guest}"
+        facts.append(Fact(name, "sex", "m" if guest % 2 == 0 else "f"))
+        for offset in range(guest % 3 + 1):
+            facts.append(Fact(name, "hobby", f"h{(guest + offset) % hobbies}"))
+    facts.append(Fact("guest0", "seated", "yes"))
+    rules = [
+        Rule("compatible_mf",
+             [Fact("?a", "sex", "m"), Fact("?b", "sex", "f"), Fact("?a", "hobby", "?h"), Fact("?b", "hobby", "?h")],
+             [Fact("?a", "compatible", "?b")]),
+        Rule("compatible_fm",
+             [Fact("?a", "sex", "f"), Fact("?b", "sex", "m"), Fact("?a", "hobby", "?h"), Fact("?b", "hobby", "?h")],
+             [Fact("?a", "compatible", "?b")]),
+        Rule("seat", [Fact("?a", "seated", "yes"), Fact("?a", "compatible", "?b")],
+             [Fact("?b", "seated", "yes"), Fact("?a", "next", "?b")]),
+    ]
+    return Workload("manners", {"size": size, "hobbies": hobbies}, facts, rules)
+
+
+def waltz(size: int) -> Workload:
+    """Waltz style line labelling on a ``size`` x ``size`` grid of junctions.
+
+    Junctions are typed (arrow, fork, L, tee) and connected to their right
+    and lower neighbours. Arrows and forks label their edges, the labels
+    propagate through tee junctions and L junctions next to a convex edge
+    become boundaries; junctions with two labels are marked as conflicts.
+    """
+    types = ("arrow", "fork", "L", "tee")
+    facts = []
+    for row in range(size):
+        for column in range(size):
+            junction = f"j{row}_{column}"
+            facts.append(Fact(junction, "type", types[(row * 3 + column) % len(types)]))
+            if column + 1 < size:
+                facts.append(Fact(junction, "edge", f"j{row}_{column + 1}"))
+            if row + 1 < size:
+                facts.append(Fact(junction, "edge", f"j{row + 1}_{column}"))
+    rules = [
+        Rule("arrow", [Fact("?j", "type", "arrow"), Fact("?j", "edge", "?k")], [Fact("?k", "label", "plus")]),
+        Rule("fork", [Fact("?j", "type", "fork"), Fact("?j", "edge", "?k")], [Fact("?k", "label", "minus")]),
+        Rule("tee", [Fact("?j", "label", "?l"), Fact("?j", "edge", "?k"), Fact("?k", "type", "tee")],
+             [Fact("?k", "label", "?l")]),
+        Rule("boundary", [Fact("?j", "label", "plus"), Fact("?j", "edge", "?k"), Fact("?k", "type", "L")],
+             [Fact("?k", "label", "boundary")]),
+        Rule("conflict", [Fact("?j", "label", "plus"), Fact("?j", "label", "minus")],
+             [Fact("?j", "status", "conflict")]),
+    ]
+    return Workload("waltz", {"size": size}, facts, rules)
+
+
+def fan_out(size: int, width: int = 20) -> Workload:
+    """``width`` rules that all match every one of ``size`` items.
+
+    Each rule has one condition on the same attribute and two actions, so
+    every asserted item wakes up all the rules.
+    """
+    facts = [Fact(f"item{i}", "kind", "item") for i in range(size)]
+    rules = [
+        Rule(f"feature{n}", [Fact("?x", "kind", "item")],
+             [Fact("?x", f"feature{n}", "on"), Fact("?x", "tagged", f"t{n}")])
+        for n in range(width)
+    ]
+    return Workload("fan_out", {"size": size, "width": width}, facts, rules)
+
+
+def bulk_assert(size: int, attributes: int = 30) -> Workload:
+    """``size`` facts spread over ``attributes`` attributes and a single rule.
+
+    Measures the cost of asserting and indexing facts; the rule only matches
+    one attribute.
+    """
+    facts = [Fact(f"e{i // 20}", f"a{i % attributes}", f"v{i % 2000}") for i in range(size)]
+    rules = [Rule("copy", [Fact("?x", "a0", "?y")], [Fact("?x", "copied", "?y")])]
+    return Workload("bulk_assert", {"size": size, "attributes": attributes}, facts, rules)
+
+
+WORKLOADS: Dict[str, Callable[..., Workload]] = {
+    "transitive_closure": transitive_closure,
+    "manners": manners,
+    "waltz": waltz,
+    "fan_out": fan_out,
+    "bulk_assert": bulk_assert,
+}
+
+# Sizes used when none are given; each step doubles the work (roughly)
+DEFAULT_SIZES: Dict[str, List[int]] = {
+    "transitive_closure": [50, 100, 200],
+    "manners": [32, 64, 128],
+    "waltz": [10, 20, 40],
+    "fan_out": [1000, 2000, 4000],
+    "bulk_assert": [25000, 50000, 100000],
+}
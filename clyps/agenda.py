@@ -0,0 +1,149 @@
+"""Agenda with conflict resolution, used when ``engine="agenda"``.
+
+Activations are not computed up front. When a fact is added, every rule
+with a condition on the fact's attribute gets a *source*: a generator of
+the rule's matches in which that fact is the most recent one. Sources are
+kept in a priority queue ordered by rule salience and by the conflict
+resolution strategy, and a match is only computed when it is about to
+fire, so the matches of activations that never fire are never built.
+
+Strategies:
+
+* ``depth``: activations of newer facts first (the CLIPS default)
+* ``breadth``: activations of older facts first
+* ``lex``: activations are compared by the recency of all their facts,
+  most recent first; the matches of a source all share their most recent
+  fact, so they are all computed and sorted when the source is created
+"""
+import heapq
+import itertools
+from typing import Iterator, List, Optional, Tuple
+
+from .fact import Fact
+from .rule import Rule
+from .store import FactStore
+
+STRATEGIES = ("depth", "breadth", "lex")
+
+Activation = Tuple[Rule, Tuple[str, ...], Tuple[Fact, ...]]
+
+
+class _Snapshot:
+    """Store view whose lookups copy their result.
+
+    Sources are resumed after other activations fired, so they must not
+    iterate over index buckets that may have grown in between.
+    """
+
+    def __init__(self, store):
+        self._store = store
+
+    def lookup(self, entity=None, attribute=None, value=None):
+        return tuple(self._store.lookup(entity, attribute, value))
+
+    def candidates(self, condition: Fact):
+        return self._store.candidates(condition)
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+
+class Agenda:
+    """Priority queue of lazily generated rule activations."""
+
+    def __init__(self, store, rules: List[Rule], strategy: str = "depth", stats=None):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown conflict resolution strategy: {strategy}")
+        self.store = store
+        self.strategy = strategy
+        self.stats = stats
+        self._view = _Snapshot(store)
+        self._readers = {}
+        for _rule in rules:
+            for attribute in dict.fromkeys(condition.attribute for condition in _rule.conditions):
+                self._readers.setdefault(attribute, []).append(_rule)
+        self._queue: list = []
+        self._counter = itertools.count()
+        # Rules without conditions read no fact, so they are activated once here
+        for _rule in rules:
+            if not _rule.conditions:
+                self._activate(_rule, iter([((), ())]), -1)
+
+    def rebind(self, store) -> None:
+        """Switches to another store holding the same facts, e.g. an overlay of the current one."""
+        self.store = store
+        self._view = _Snapshot(store)
+
+    def add_fact(self, fact: Fact) -> None:
+        """Queues the activations in which a newly added fact is the most recent fact."""
+        recency = self.store.sequence(fact)
+        for _rule in self._readers.get(fact.attribute, ()):
+            self._activate(_rule, self._matches(_rule, fact, recency), recency)
+
+    def _activate(self, _rule: Rule, source: Iterator, recency: int) -> None:
+        """Queues a source of activations whose most recent fact has the given sequence number."""
+        if self.strategy == "lex":
+            self._push_next(_rule, iter(sorted(source, key=self._recency)))
+        else:
+            order = next(self._counter)
+            if self.strategy == "depth":
+                key = (-_rule.salience, -recency, -order)
+            else:
+                key = (-_rule.salience, recency, order)
+            heapq.heappush(self._queue, (key, _rule, source, None))
+
+    def pop(self) -> Optional[Activation]:
+        """Computes and returns the next activation to fire, or None if there is none."""
+        while self._queue:
+            key, _rule, source, activation = heapq.heappop(self._queue)
+            if activation is None:
+                activation = next(source, None)
+                if activation is None:
+                    continue
+                heapq.heappush(self._queue, (key, _rule, source, None))
+            else:
+                self._push_next(_rule, source)
+            values, facts = activation
+            # Facts may have been removed since the match was computed
+            if not all(fact in self.store for fact in facts):
+                continue
+            # or removed and added again, in which case the match belongs to a newer source
+            if self.strategy == "lex" and self._recency(activation) + (1,) != key[1]:
+                continue
+            return _rule, values, facts
+        return None
+
+    def __bool__(self) -> bool:
+        return bool(self._queue)
+
+    def _push_next(self, _rule: Rule, source: Iterator) -> None:
+        activation = next(source, None)
+        if activation is None:
+            return
+        # A longer activation wins over one that is a prefix of it
+        key = (-_rule.salience, self._recency(activation) + (1,), next(self._counter))
+        heapq.heappush(self._queue, (key, _rule, source, activation))
+
+    def _recency(self, activation) -> Tuple[int, ...]:
+        """The negated sequence numbers of the facts of an activation, most recent first."""
+        sequence = self.store.sequence
+        return tuple(sorted(-sequence(fact) for fact in activation[1]))
+
+    def _matches(self, _rule: Rule, fact: Fact, recency: int
+                 ) -> Iterator[Tuple[Tuple[str, ...], Tuple[Fact, ...]]]:
+        """Matches of a rule that use the fact and no fact added after it."""
+        store = self.store
+        sequence = store.sequence
+        # The fact may have been removed (and added again, with a new source)
+        if fact not in store or sequence(fact) != recency:
+            return
+        compiled = _rule.compiled()
+        if not compiled.has_variables:
+            conditions = _rule.conditions
+            if fact in conditions and all(c in store and sequence(c) <= recency for c in conditions):
+                yield (), tuple(conditions)
+            return
+        rule_stats = None if self.stats is None else self.stats.rule(_rule.name)
+        for values, facts in compiled.matches(self._view, FactStore([fact]), rule_stats):
+            if all(sequence(matched) <= recency for matched in facts):
+                yield values, facts
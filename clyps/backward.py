@@ -0,0 +1,345 @@
+"""Goal-directed evaluation: answering one pattern without computing the whole closure.
+
+:func:`prove` works backward from the goal. A *subgoal* is a condition
+with some positions bound to constants; its answers are the stored facts
+that match it plus the facts derived by the rules whose actions unify with
+it, whose conditions become subgoals in turn. Every subgoal has a table of
+answers, so a subgoal that is reached again (e.g. through a recursive rule)
+reuses the table instead of looping. The joins that read a table are
+resumed with the answers added to it later, until no table grows.
+
+:func:`prove_magic` gets the same answers bottom-up with a magic-sets
+rewrite: every rule is guarded by a *magic* fact that records a subgoal
+some other rule (or the goal) asks for, and extra rules derive the magic
+facts of the subgoals of a rule's conditions from the magic fact of its
+action. Semi-naive evaluation of the rewritten rules only derives facts
+that are relevant to the goal.
+
+Both follow the semantics of forward inference, including
+:meth:`KnowledgeBase._apply_bindings <clyps.kb.KnowledgeBase._apply_bindings>`:
+in rules with variables, an action whose entity is not a variable of the
+conditions derives nothing. Neither changes the facts of the knowledge base.
+"""
+from collections import deque
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from .fact import Fact
+from .overlay import OverlayFactStore
+from .planner import is_variable, match_condition
+from .store import FactStore
+
+# Fills the unbound positions of magic facts
+_FREE = "*"
+
+Key = Tuple[Optional[str], str, Optional[str], bool]
+
+
+def _key(pattern: Fact) -> Key:
+    """Identifies a subgoal by its constants, ignoring the names of its variables."""
+    entity = None if is_variable(pattern.entity) else pattern.entity
+    value = None if is_variable(pattern.value) else pattern.value
+    same = entity is None and pattern.entity == pattern.value
+    return entity, pattern.attribute, value, same
+
+
+def _pattern(key: Key) -> Fact:
+    entity, attribute, value, same = key
+    return Fact(
+        "?e" if entity is None else entity,
+        attribute,
+        "?e" if same else "?v" if value is None else value,
+    )
+
+
+def _producers(rules) -> Dict[str, List[Tuple[object, Fact]]]:
+    """The (rule, action) pairs that derive facts of each attribute."""
+    producers: Dict[str, List[Tuple[object, Fact]]] = {}
+    for _rule in rules:
+        variables = _rule.compiled().variables
+        for action in _rule.actions:
+            if variables and action.entity not in variables:
+                continue
+            producers.setdefault(action.attribute, []).append((_rule, action))
+    return producers
+
+
+def _unify(action: Fact, goal: Fact, variables: Sequence[str]) -> Optional[Dict[str, str]]:
+    """Bindings of the rule variables that make an action produce facts matching the goal."""
+    bindings: Dict[str, str] = {}
+    for term, target in ((action.entity, goal.entity), (action.value, goal.value)):
+        if is_variable(target):
+            continue
+        if term in variables:
+            if bindings.get(term, target) != target:
+                return None
+            bindings[term] = target
+        elif term != target:
+            return None
+    return bindings
+
+
+def _instantiate(action: Fact, bindings: Dict[str, str]) -> Fact:
+    return Fact(bindings.get(action.entity, action.entity), action.attribute, bindings.get(action.value, action.value))
+
+
+def _bound(condition: Fact, bound: Set[str]) -> Tuple[bool, bool]:
+    return tuple(not is_variable(term) or term in bound for term in (condition.entity, condition.value))
+
+
+def _order(conditions: Sequence[Fact], bound: Set[str]) -> List[Fact]:
+    """Orders conditions so that each one shares as many bound variables as possible.
+
+    Ties are broken by the number of constants, then by the written order.
+    """
+    remaining = list(conditions)
+    bound = set(bound)
+    order = []
+    while remaining:
+        best = max(remaining, key=lambda condition: (
+            sum(term in bound for term in (condition.entity, condition.value)),
+            sum(not is_variable(term) for term in (condition.entity, condition.value)),
+        ))
+        remaining.remove(best)
+        order.append(best)
+        bound.update(term for term in (best.entity, best.value) if is_variable(term))
+    return order
+
+
+def _answers(goal: Fact, facts) -> List[Dict[str, str]]:
+    """Bindings of the goal's variables for each fact that matches it, without repetitions."""
+    results = []
+    seen = set()
+    for fact in facts:
+        bindings = match_condition(fact, goal)
+        if bindings is not None:
+            key = tuple(sorted(bindings.items()))
+            if key not in seen:
+                seen.add(key)
+                results.append(bindings)
+    return results
+
+
+class _Consumer:
+    """A join of a rule waiting for the answers of the subgoal of one of its conditions."""
+
+    __slots__ = ("key", "goal", "action", "conditions", "index", "bindings", "seen")
+
+    def __init__(self, key: Key, goal: Fact, action: Fact, conditions: List[Fact], index: int,
+                 bindings: Dict[str, str], seen: int):
+        self.key = key
+        self.goal = goal
+        self.action = action
+        self.conditions = conditions
+        self.index = index
+        self.bindings = bindings
+        # Number of answers of the subgoal already joined
+        self.seen = seen
+
+
+class _Tables:
+    """Tabled top-down evaluation of subgoals.
+
+    Evaluation uses a work list instead of recursion: a join that reaches a
+    condition with a subgoal registers a :class:`_Consumer` on the subgoal's
+    table and goes on with its current answers. Answers added to a table
+    later are passed to its consumers, each of which only joins the answers
+    it has not seen yet.
+    """
+
+    def __init__(self, store, rules):
+        self.store = store
+        self.producers = _producers(rules)
+        self.tables: Dict[Key, FactStore] = {}
+        # Answers of each table in the order they were added
+        self.answers: Dict[Key, List[Fact]] = {}
+        self.consumers: Dict[Key, List[_Consumer]] = {}
+        # Tables whose rules have not been evaluated yet, and tables with answers their consumers have not seen
+        self.new: Deque[Key] = deque()
+        self.grown: Dict[Key, None] = {}
+
+    def solve(self, goal: Fact) -> FactStore:
+        key = _key(goal)
+        self._table(key)
+        while self.new or self.grown:
+            if self.new:
+                self._evaluate(self.new.popleft())
+            else:
+                key_grown = next(iter(self.grown))
+                del self.grown[key_grown]
+                self._resume(key_grown)
+        return self.tables[key]
+
+    def _table(self, key: Key) -> List[Fact]:
+        """Returns the answers of a subgoal, creating its table with the matching stored facts."""
+        answers = self.answers.get(key)
+        if answers is None:
+            goal = _pattern(key)
+            answers = self.answers[key] = [
+                fact for fact in self.store.candidates(goal) if match_condition(fact, goal) is not None
+            ]
+            self.tables[key] = FactStore(answers)
+            self.consumers[key] = []
+            if key[1] in self.producers:
+                self.new.append(key)
+        return answers
+
+    def _evaluate(self, key: Key) -> None:
+        goal = _pattern(key)
+        for _rule, action in self.producers[key[1]]:
+            bindings = _unify(action, goal, _rule.compiled().variables)
+            if bindings is not None:
+                conditions = _order(_rule.conditions, set(bindings))
+                self._join(key, goal, action, conditions, 0, bindings)
+
+    def _resume(self, key: Key) -> None:
+        answers = self.answers[key]
+        consumers = self.consumers[key]
+        # Joins resumed here can register more consumers of the same table
+        for consumer in consumers[:]:
+            new = answers[consumer.seen:]
+            consumer.seen = len(answers)
+            self._extend(consumer, new)
+
+    def _join(self, key: Key, goal: Fact, action: Fact, conditions: List[Fact], index: int,
+              bindings: Dict[str, str]) -> None:
+        if index == len(conditions):
+            fact = _instantiate(action, bindings)
+            if match_condition(fact, goal) is not None and self.tables[key].add(fact):
+                self.answers[key].append(fact)
+                self.grown[key] = None
+            return
+        condition = conditions[index]
+        pattern = _instantiate(condition, bindings)
+        if condition.attribute in self.producers:
+            subgoal = _key(pattern)
+            answers = self._table(subgoal)
+            consumer = _Consumer(key, goal, action, conditions, index, bindings, len(answers))
+            self.consumers[subgoal].append(consumer)
+            self._extend(consumer, answers[:consumer.seen])
+            return
+        for fact in self.store.candidates(pattern):
+            local = match_condition(fact, condition)
+            if local is None or any(bindings.get(k, v) != v for k, v in local.items()):
+                continue
+            self._join(key, goal, action, conditions, index + 1, {**bindings, **local})
+
+    def _extend(self, consumer: _Consumer, facts: Sequence[Fact]) -> None:
+        """Goes on with the join of a consumer for some answers of its subgoal."""
+        condition = consumer.conditions[consumer.index]
+        bindings = consumer.bindings
+        for fact in facts:
+            local = match_condition(fact, condition)
+            if local is None or any(bindings.get(k, v) != v for k, v in local.items()):
+                continue
+            self._join(consumer.key, consumer.goal, consumer.action, consumer.conditions, consumer.index + 1,
+                       {**bindings, **local})
+
+
+def prove(store, rules, goal: Fact) -> List[Dict[str, str]]:
+    """Returns the bindings of the goal's variables for every derivable fact matching it.
+
+    A goal without variables gives ``[{}]`` if it is derivable and ``[]``
+    otherwise.
+    """
+    return _answers(goal, _Tables(store, rules).solve(goal))
+
+
+def _magic(attribute: str, bound: Tuple[bool, bool]) -> str:
+    # Attributes written in source files cannot contain spaces, so these never clash
+    return "magic " + attribute + " " + "".join("b" if flag else "f" for flag in bound)
+
+
+def _magic_condition(pattern: Fact, bound: Tuple[bool, bool]) -> Fact:
+    return Fact(
+        pattern.entity if bound[0] else _FREE,
+        _magic(pattern.attribute, bound),
+        pattern.value if bound[1] else _FREE,
+    )
+
+
+def magic_sets(rules, goal: Fact) -> Tuple[Fact, List[Tuple[List[Fact], Callable[[Dict[str, str]], Fact]]]]:
+    """Rewrites the rules for a goal.
+
+    Returns the seed magic fact of the goal and the rewritten rules, as
+    (conditions, producer) pairs where the producer builds the derived fact
+    from the bindings of a match.
+    """
+    producers = _producers(rules)
+    seed_bound = _bound(goal, set())
+    seed = _magic_condition(goal, seed_bound)
+    program = []
+    queue = [(goal.attribute, seed_bound)]
+    seen = set(queue)
+    while queue:
+        attribute, adornment = queue.pop()
+        for _rule, action in producers.get(attribute, ()):
+            variables = _rule.compiled().variables
+            terms = (action.entity, action.value)
+            if any(flag and is_variable(term) and term not in variables for term, flag in zip(terms, adornment)):
+                # The action writes that variable as it is, which never equals a bound constant
+                continue
+            bound = {term for term, flag in zip(terms, adornment) if flag and is_variable(term)}
+            guard = _magic_condition(action, adornment)
+            body = [guard]
+            for condition in _order(_rule.conditions, bound):
+                if condition.attribute in producers:
+                    needed = _bound(condition, bound)
+                    # The condition's bound positions are asked for as a new subgoal
+                    program.append((list(body), _producer(_magic_condition(condition, needed))))
+                    if (condition.attribute, needed) not in seen:
+                        seen.add((condition.attribute, needed))
+                        queue.append((condition.attribute, needed))
+                body.append(condition)
+                bound.update(term for term in (condition.entity, condition.value) if is_variable(term))
+            program.append((body, _producer(action)))
+    return seed, program
+
+
+def _producer(template: Fact) -> Callable[[Dict[str, str]], Fact]:
+    return lambda bindings: _instantiate(template, bindings)
+
+
+def _match(conditions: Sequence[Fact], index: int, store, bindings: Dict[str, str]) -> Iterator[Dict[str, str]]:
+    """Bindings that extend ``bindings`` to match the conditions from ``index`` on."""
+    if index == len(conditions):
+        yield bindings
+        return
+    condition = conditions[index]
+    for fact in store.candidates(_instantiate(condition, bindings)):
+        local = match_condition(fact, condition)
+        if local is None or any(bindings.get(k, v) != v for k, v in local.items()):
+            continue
+        yield from _match(conditions, index + 1, store, {**bindings, **local})
+
+
+def prove_magic(store, rules, goal: Fact) -> List[Dict[str, str]]:
+    """Same as :func:`prove`, using semi-naive evaluation of the magic-sets rewrite."""
+    if goal.attribute not in _producers(rules):
+        return _answers(goal, store.candidates(goal))
+    seed, program = magic_sets(rules, goal)
+    # Every condition of a rewritten rule in turn matches the new facts, and
+    # the others are joined in an order that follows the bound variables
+    plans = []
+    for conditions, produce in program:
+        for pivot, condition in enumerate(conditions):
+            rest = conditions[:pivot] + conditions[pivot + 1:]
+            bound = {term for term in (condition.entity, condition.value) if is_variable(term)}
+            plans.append((condition, _order(rest, bound), produce))
+    facts = OverlayFactStore(store)
+    facts.add(seed)
+    delta = FactStore([seed])
+    while delta:
+        new_facts = FactStore()
+        for condition, rest, produce in plans:
+            for fact in delta.candidates(condition):
+                bindings = match_condition(fact, condition)
+                if bindings is None:
+                    continue
+                for solution in _match(rest, 0, facts, bindings):
+                    derived = produce(solution)
+                    if derived not in facts:
+                        new_facts.add(derived)
+        for fact in new_facts:
+            facts.add(fact)
+        delta = new_facts
+    return _answers(goal, facts.candidates(goal))
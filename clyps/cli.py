@@ -1,14 +1,30 @@
-from prompt_toolkit import prompt
-from prompt_toolkit.history import InMemoryHistory
+import itertools
+import json
+import sys
+
 import click
 from clyps.kb import KnowledgeBase
 from clyps.fact import Fact
+from clyps.parser import parse_fact
 from clyps.rule import Rule
+from clyps.stats import InferenceStats
+
 
+@click.group(invoke_without_command=True)
+@click.pass_context
+def main(ctx):
+    """CLYPS, a Python CLIPS implementation. Starts the REPL by default."""
+    if ctx.invoked_subcommand is None:
+        ctx.invoke(cli)
 
-@click.command()
+
+@main.command("repl")
 def cli():
     """REPL interface for CLYPS with CLIPS-like syntax."""
+    # Only the REPL needs prompt_toolkit; importing it here keeps batch jobs fast to start
+    from prompt_toolkit import prompt
+    from prompt_toolkit.history import InMemoryHistory
+
     kb = KnowledgeBase()
     history = InMemoryHistory()
     click.echo("CLYPS REPL with CLIPS-like syntax. Type (exit) or (quit) to leave.")
@@ -34,23 +50,144 @@ def cli():
                 kb.add_rule(rule)
                 click.echo(f"=> Rule defined: {rule}")
 
-            # Perform inference
+            # Perform inference and show the derived facts
             elif command == "(run)":
-                kb.infer()
-                click.echo("=> Inference completed.")
-                click.echo("Current facts:")
+                derived = []
+                with kb.subscribe(callback=lambda change: derived.append(change.fact)):
+                    kb.infer()
+                click.echo(f"=> Inference completed: {len(derived)} facts derived.")
+                for fact in derived:
+                    click.echo(fact)
+
+            # Show every fact
+            elif command == "(facts)":
                 for fact in kb.facts:
                     click.echo(fact)
 
+            # Show the profiling counters of the inferences run so far
+            elif command == "(stats)":
+                if kb.stats is None:
+                    kb.stats = InferenceStats()
+                    click.echo("=> Statistics enabled; they are collected from the next (run).")
+                else:
+                    click.echo(kb.stats.report())
+
+            # Print every rule firing
+            elif command == "(watch rules)":
+                if kb.stats is None:
+                    kb.stats = InferenceStats()
+                kb.stats.watch = _echo_firing
+                click.echo("=> Watching rules.")
+
+            elif command == "(unwatch rules)":
+                if kb.stats is not None:
+                    kb.stats.watch = None
+                click.echo("=> Not watching rules.")
+
             # Unknown command
             else:
                 click.echo(
-                    "Unknown command. Use (assert <fact>), (defrule <name> <rule>), (run), (exit) or (quit)."
+                    "Unknown command. Use (assert <fact>), (defrule <name> <rule>), (run), (facts), (stats), "
+                    "(watch rules), (unwatch rules), (exit) or (quit)."
                 )
 
         except Exception as e:
             click.echo(f"Error: {e}")
 
 
+def _echo_firing(name, bindings):
+    click.echo(f"FIRE {name}: " + ", ".join(f"{variable}={value}" for variable, value in bindings.items()))
+
+
+@main.command()
+@click.argument("sources", nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=7070, show_default=True)
+@click.option("--socket", "path", type=click.Path(dir_okay=False), help="Listen on a Unix socket instead of TCP.")
+@click.option("--engine", type=click.Choice(KnowledgeBase.ENGINES), default="seminaive", show_default=True)
+@click.option("--snapshot", type=click.Path(exists=True, dir_okay=False), help="Start from a saved snapshot.")
+@click.option("--batch-delay", default=0.002, show_default=True, help="Seconds to wait for assertions to batch.")
+def serve(sources, host, port, path, engine, snapshot, batch_delay):
+    """Shares a knowledge base over a JSON lines protocol (see clyps.server)."""
+    import asyncio
+
+    from clyps.server import serve_forever
+
+    kb = KnowledgeBase.load_snapshot(snapshot, engine=engine) if snapshot else KnowledgeBase(engine=engine)
+    for source in sources:
+        kb.load(source)
+    kb.infer()
+    address = path or f"{host}:{port}"
+    click.echo(f"Serving {len(kb.facts)} facts and {len(kb.rules)} rules on {address}")
+    try:
+        asyncio.run(serve_forever(kb, host, port, path, batch_delay=batch_delay))
+    except KeyboardInterrupt:
+        pass
+
+
+@main.command()
+@click.argument("sources", nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.option("--facts", "fact_files", multiple=True, type=click.File("r"),
+              help="JSON lines file of facts, or - for stdin. Can be repeated.")
+@click.option("--stream", is_flag=True, help="Read facts from stdin in chunks, inferring after each one.")
+@click.option("--chunk-size", default=1000, show_default=True, help="Facts per chunk with --stream.")
+@click.option("--engine", type=click.Choice(KnowledgeBase.ENGINES), default="seminaive", show_default=True)
+@click.option("--max-cycles", type=int, help="Limit of each inference (see KnowledgeBase.infer).")
+def run(sources, fact_files, stream, chunk_size, engine, max_cycles):
+    """Runs the rules of SOURCES and writes the derived facts to stdout.
+
+    Facts are read from the sources and from JSON lines files holding one
+    fact per line, either as a list (["dog", "has", "hair"]) or as a string
+    ("(dog has hair)"). Derived facts are written as JSON lists, one per
+    line, as soon as each inference finishes. With --stream, stdin is read
+    in chunks and inference resumes after every chunk, so only the facts
+    derived from the new ones are written.
+    """
+    kb = KnowledgeBase(engine=engine)
+    for source in sources:
+        kb.load(source)
+    for fact_file in fact_files:
+        for fact in _read_facts(fact_file):
+            kb.add_fact(fact)
+    out = sys.stdout
+    kb.subscribe(callback=lambda change: out.write(json.dumps(_encode(change.fact)) + "\n"))
+    kb.infer(max_cycles=max_cycles)
+    out.flush()
+    if not stream:
+        return
+    facts = _read_facts(sys.stdin)
+    while True:
+        chunk = list(itertools.islice(facts, chunk_size))
+        if not chunk:
+            break
+        for fact in chunk:
+            kb.add_fact(fact)
+        kb.infer(max_cycles=max_cycles)
+        out.flush()
+
+
+def _read_facts(lines):
+    """Yields the facts of a JSON lines stream."""
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+            if isinstance(item, str):
+                fact = parse_fact(item)
+            elif isinstance(item, list) and len(item) == 3 and all(isinstance(term, str) for term in item):
+                fact = Fact(*item)
+            else:
+                raise ValueError("expected a fact string or an [entity, attribute, value] list")
+        except ValueError as error:
+            raise click.ClickException(f"Invalid fact on line {number}: {error}")
+        yield fact
+
+
+def _encode(fact):
+    return [fact.entity, fact.attribute, fact.value]
+
+
 if __name__ == "__main__":
-    cli()
+    main()
@@ -0,0 +1,327 @@
+"""Compact, array-backed storage for large fact sets."""
+import bisect
+import sys
+from array import array
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .fact import Fact
+from .symbols import SymbolTable
+
+# Rows added since the last merge are kept in small hash indexes; once they
+# exceed this fraction of the sorted rows they are merged into them.
+_MERGE_RATIO = 4
+_MIN_MERGE = 1024
+
+
+class ColumnarFactStore:
+    """Fact store that keeps facts as interned integer triples.
+
+    Entities, attributes and values are interned in a :class:`SymbolTable`
+    and stored in three ``array('I')`` columns, one row per fact. Instead of
+    per-key Python containers, the store keeps two permutations of the rows
+    (``array('I')``) sorted by (entity, attribute, value) and by
+    (attribute, value, entity); membership and index lookups are binary
+    searches over them, comparing integers only. Recently added rows live in
+    a small hash-indexed tail until they are merged into the permutations.
+
+    :class:`~clyps.fact.Fact` objects are only materialised when a fact is
+    read, and they share the strings of the symbol table. The store offers
+    the interface of :class:`~clyps.store.FactStore`, so it can be passed to
+    ``KnowledgeBase(store=...)``.
+    """
+
+    def __init__(self, facts: Iterable[Fact] = (), symbols: Optional[SymbolTable] = None):
+        self.symbols = symbols if symbols is not None else SymbolTable()
+        self._entities = array("I")
+        self._attributes = array("I")
+        self._values = array("I")
+        self._alive = bytearray()
+        self._size = 0
+        self._eav = array("I")
+        self._ave = array("I")
+        self._tail: Dict[Tuple[int, int, int], int] = {}
+        self._tail_by_entity_attribute: Dict[Tuple[int, int], List[int]] = {}
+        self._tail_by_attribute_value: Dict[Tuple[int, int], List[int]] = {}
+        self._tail_by_attribute: Dict[int, List[int]] = {}
+        self._writable = True
+        # Facts as a list for indexing, built on demand after a change
+        self._list: Optional[List[Fact]] = None
+        for fact in facts:
+            self.add(fact)
+
+    @classmethod
+    def from_buffers(cls, symbols: SymbolTable, entities, attributes, values, eav, ave) -> "ColumnarFactStore":
+        """Creates a store over existing columns and sorted permutations.
+
+        The buffers (e.g. memoryviews over a memory-mapped snapshot) must hold
+        only live rows and are used as they are, without copying, until the
+        store is first modified.
+        """
+        store = cls(symbols=symbols)
+        store._entities, store._attributes, store._values = entities, attributes, values
+        store._eav, store._ave = eav, ave
+        store._alive = _AllAlive(len(entities))
+        store._size = len(entities)
+        store._writable = False
+        return store
+
+    def _make_writable(self) -> None:
+        """Copies borrowed buffers into arrays before the first modification."""
+        if self._writable:
+            return
+        for name in ("_entities", "_attributes", "_values", "_eav", "_ave"):
+            setattr(self, name, array("I", getattr(self, name)))
+        if isinstance(self._alive, bytearray):
+            self._alive = bytearray(self._alive)
+        else:
+            self._alive = bytearray(b"\x01") * len(self._entities)
+        self._writable = True
+
+    def frozen(self) -> "ColumnarFactStore":
+        """Returns a copy of the store that later changes to it do not affect.
+
+        The copy shares the columns and the sorted permutations; only the
+        tail is copied. Both stores copy the shared buffers before their next
+        modification.
+        """
+        store = ColumnarFactStore(symbols=self.symbols)
+        for name in ("_entities", "_attributes", "_values", "_alive", "_eav", "_ave", "_size"):
+            setattr(store, name, getattr(self, name))
+        store._tail = dict(self._tail)
+        for name in ("_tail_by_entity_attribute", "_tail_by_attribute_value", "_tail_by_attribute"):
+            setattr(store, name, {key: list(rows) for key, rows in getattr(self, name).items()})
+        store._writable = self._writable = False
+        return store
+
+    def buffers(self) -> Tuple[array, array, array, array, array]:
+        """Returns the columns and the sorted permutations, compacting first.
+
+        Only valid when no fact was ever removed from the store, so that the
+        columns hold live rows only.
+        """
+        if self._tail:
+            self.compact()
+        return self._entities, self._attributes, self._values, self._eav, self._ave
+
+    @property
+    def _sequence(self) -> int:
+        # One more than the highest row, as with FactStore (see OverlayFactStore)
+        return len(self._entities)
+
+    def has_deleted_rows(self) -> bool:
+        return self._size != len(self._entities)
+
+    # Row access
+
+    def _eav_key(self, row: int) -> Tuple[int, int, int]:
+        return self._entities[row], self._attributes[row], self._values[row]
+
+    def _ave_key(self, row: int) -> Tuple[int, int, int]:
+        return self._attributes[row], self._values[row], self._entities[row]
+
+    def _fact(self, row: int) -> Fact:
+        symbol = self.symbols.symbol
+        return Fact(symbol(self._entities[row]), symbol(self._attributes[row]), symbol(self._values[row]))
+
+    def _ids(self, fact: Fact) -> Optional[Tuple[int, int, int]]:
+        """Returns the symbol ids of a fact, or None if a symbol is unknown."""
+        get = self.symbols.get
+        ids = (get(fact.entity), get(fact.attribute), get(fact.value))
+        return None if None in ids else ids
+
+    def _sorted_range(self, permutation: array, key: Callable, prefix: tuple) -> Iterator[int]:
+        """Yields the live rows of a sorted permutation whose key starts with prefix."""
+        size = len(prefix)
+        row_index = _bisect(permutation, key, prefix)
+        alive = self._alive
+        while row_index < len(permutation):
+            row = permutation[row_index]
+            if key(row)[:size] != prefix:
+                break
+            if alive[row]:
+                yield row
+            row_index += 1
+
+    def _find(self, ids: Tuple[int, int, int]) -> Optional[int]:
+        """Returns the live row holding a fact, if any."""
+        row = self._tail.get(ids)
+        if row is not None:
+            return row
+        for row in self._sorted_range(self._eav, self._eav_key, ids):
+            return row
+        return None
+
+    # Mutation
+
+    def add(self, fact: Fact) -> bool:
+        """Adds a fact. Returns False if it was already in the store."""
+        intern = self.symbols.intern
+        ids = (intern(fact.entity), intern(fact.attribute), intern(fact.value))
+        if self._find(ids) is not None:
+            return False
+        self._make_writable()
+        entity, attribute, value = ids
+        row = len(self._entities)
+        self._entities.append(entity)
+        self._attributes.append(attribute)
+        self._values.append(value)
+        self._alive.append(1)
+        self._size += 1
+        self._list = None
+        self._tail[ids] = row
+        self._tail_by_entity_attribute.setdefault((entity, attribute), []).append(row)
+        self._tail_by_attribute_value.setdefault((attribute, value), []).append(row)
+        self._tail_by_attribute.setdefault(attribute, []).append(row)
+        if len(self._tail) * _MERGE_RATIO > len(self._eav) + _MIN_MERGE:
+            self.compact()
+        return True
+
+    def discard(self, fact: Fact) -> bool:
+        """Removes a fact if present. Returns False if it was not in the store.
+
+        The row is only marked as deleted; lookups skip it and the next
+        :meth:`compact` drops it from the indexes.
+        """
+        ids = self._ids(fact)
+        row = None if ids is None else self._find(ids)
+        if row is None:
+            return False
+        self._make_writable()
+        self._alive[row] = 0
+        self._size -= 1
+        self._list = None
+        self._tail.pop(ids, None)
+        return True
+
+    def remove(self, fact: Fact) -> None:
+        """Removes a fact, raising ValueError if it is not in the store."""
+        if not self.discard(fact):
+            raise ValueError(f"{fact} not in store")
+
+    def compact(self) -> None:
+        """Merges the tail into the sorted permutations and drops deleted rows."""
+        self._make_writable()
+        alive = self._alive
+        tail = [row for row in self._tail.values() if alive[row]]
+        for name, key in (("_eav", self._eav_key), ("_ave", self._ave_key)):
+            rows = [row for row in getattr(self, name) if alive[row]]
+            rows.extend(sorted(tail, key=key))
+            # The list is two sorted runs, which the sort detects and merges
+            # in linear time (faster here than heapq.merge)
+            rows.sort(key=key)
+            setattr(self, name, array("I", rows))
+        self._tail.clear()
+        self._tail_by_entity_attribute.clear()
+        self._tail_by_attribute_value.clear()
+        self._tail_by_attribute.clear()
+
+    # Queries
+
+    def sequence(self, fact: Fact) -> int:
+        """Returns the row of a stored fact."""
+        ids = self._ids(fact)
+        row = None if ids is None else self._find(ids)
+        if row is None:
+            raise KeyError(fact)
+        return row
+
+    def _lookup_rows(self, entity: Optional[int], attribute: int, value: Optional[int]) -> List[int]:
+        alive = self._alive
+        if entity is not None and value is not None:
+            row = self._find((entity, attribute, value))
+            return [] if row is None else [row]
+        if entity is not None:
+            rows = list(self._sorted_range(self._eav, self._eav_key, (entity, attribute)))
+            tail = self._tail_by_entity_attribute.get((entity, attribute), ())
+        elif value is not None:
+            rows = list(self._sorted_range(self._ave, self._ave_key, (attribute, value)))
+            tail = self._tail_by_attribute_value.get((attribute, value), ())
+        else:
+            rows = list(self._sorted_range(self._ave, self._ave_key, (attribute,)))
+            tail = self._tail_by_attribute.get(attribute, ())
+        rows.extend(row for row in tail if alive[row])
+        return rows
+
+    def lookup(self, entity: Optional[str] = None, attribute: Optional[str] = None,
+               value: Optional[str] = None) -> List[Fact]:
+        """Returns the stored facts with the given entity, attribute and value.
+
+        ``None`` acts as a wildcard. The most selective index is used.
+        """
+        if attribute is None:
+            return [
+                fact for fact in self
+                if (entity is None or fact.entity == entity) and (value is None or fact.value == value)
+            ]
+        get = self.symbols.get
+        ids = (
+            None if entity is None else get(entity),
+            get(attribute),
+            None if value is None else get(value),
+        )
+        if any(term is not None and symbol_id is None for term, symbol_id in zip((entity, attribute, value), ids)):
+            return []
+        return [self._fact(row) for row in self._lookup_rows(*ids)]
+
+    def candidates(self, condition: Fact) -> List[Fact]:
+        """Returns the facts that may match a condition; variables are wildcards."""
+        return self.lookup(
+            None if condition.entity.startswith("?") else condition.entity,
+            condition.attribute,
+            None if condition.value.startswith("?") else condition.value,
+        )
+
+    def __contains__(self, fact: object) -> bool:
+        if not isinstance(fact, Fact):
+            return False
+        ids = self._ids(fact)
+        return ids is not None and self._find(ids) is not None
+
+    def __iter__(self) -> Iterator[Fact]:
+        alive = self._alive
+        for row in range(len(alive)):
+            if alive[row]:
+                yield self._fact(row)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index):
+        if self._list is None:
+            self._list = list(self)
+        return self._list[index]
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (list, tuple)) or hasattr(other, "candidates"):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+class _AllAlive:
+    """Liveness flags of a store whose rows are all live."""
+
+    def __init__(self, size: int):
+        self._size = size
+
+    def __getitem__(self, row: int) -> int:
+        return 1
+
+    def __len__(self) -> int:
+        return self._size
+
+
+def _bisect(permutation: array, key: Callable, target: tuple) -> int:
+    """Returns the first position whose key is not lower than target."""
+    if sys.version_info >= (3, 10):
+        return bisect.bisect_left(permutation, target, key=key)
+    low, high = 0, len(permutation)
+    while low < high:
+        middle = (low + high) // 2
+        if key(permutation[middle]) < target:
+            low = middle + 1
+        else:
+            high = middle
+    return low
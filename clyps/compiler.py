@@ -0,0 +1,185 @@
+"""Compilation of rules into specialised Python match functions.
+
+For every join order chosen by :func:`clyps.planner.plan`, a rule is turned
+into generated Python source: one nested ``for`` loop per condition over an
+index lookup, constants passed straight to the lookup, variables resolved to
+local slots ahead of time, and bindings yielded as tuples. The generated
+functions are cached on the :class:`CompiledRule`, which is itself cached on
+the :class:`~clyps.rule.Rule` (see :meth:`Rule.compiled`).
+"""
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .fact import Fact
+from .planner import is_variable, plan
+
+
+class CompiledRule:
+    """A rule with its variables resolved to slots and its matchers generated.
+
+    ``variables`` gives the order of the values in the binding tuples.
+    """
+
+    def __init__(self, conditions: Sequence[Fact], actions: Sequence[Fact]):
+        self.conditions = tuple(conditions)
+        self.actions = tuple(actions)
+        self.variables: Tuple[str, ...] = tuple(
+            dict.fromkeys(
+                term for condition in self.conditions
+                for term in (condition.entity, condition.value) if is_variable(term)
+            )
+        )
+        self.has_variables = bool(self.variables)
+        self._matchers: Dict[Tuple[Tuple[int, ...], Optional[int]], Callable] = {}
+        self._plans: Dict[Optional[int], Tuple[int, int, Tuple[int, ...]]] = {}
+        self.derive = self._compile_actions()
+
+    def bindings(self, values: Tuple[str, ...]) -> Dict[str, str]:
+        """Converts a binding tuple to the dict format used by :meth:`Rule.match`."""
+        return dict(zip(self.variables, values))
+
+    def values(self, bindings: Dict[str, str]) -> Tuple[str, ...]:
+        """Converts a binding dict to a binding tuple."""
+        return tuple(bindings[variable] for variable in self.variables)
+
+    def matches(self, store, delta=None, stats=None) -> Iterator[Tuple[Tuple[str, ...], Tuple[Fact, ...]]]:
+        """Yields (binding tuple, matched facts) for every match in the store.
+
+        If ``delta`` is given, only the matches that use at least one of its
+        facts are produced, each of them once. If ``stats`` (a
+        :class:`~clyps.stats.RuleStats`) is given, instrumented match
+        functions update its counters.
+        """
+        if not self.conditions:
+            return
+        counted = stats is not None
+        if delta is None:
+            order = self.plan(store, None)
+            yield from self.matcher(order, None, counted)(store.lookup, None, None, stats)
+            return
+        if not delta:
+            return
+        for pivot in range(len(self.conditions)):
+            order = self.plan(store, pivot)
+            yield from self.matcher(order, pivot, counted)(store.lookup, delta.lookup, delta, stats)
+
+    def fire(self, store, delta=None) -> List[Fact]:
+        """Returns the facts derived by the matches in the store that use a delta fact.
+
+        Without ``delta`` every match is used. The facts are not added to the
+        store and may already be in it.
+        """
+        if self.has_variables:
+            return [fact for values, _ in self.matches(store, delta) for fact in self.derive(values)]
+        conditions = self.conditions
+        if all(condition in store for condition in conditions) and (
+            delta is None or any(condition in delta for condition in conditions)
+        ):
+            return list(self.actions)
+        return []
+
+    def plan(self, store, pivot: Optional[int]) -> Tuple[int, ...]:
+        """Returns the join order for a store, starting at ``pivot`` if it is given.
+
+        Orders are cached per pivot and only planned again for another store
+        or once the size of the store has crossed a power of two, since the
+        cost estimates barely change in between.
+        """
+        key = (id(store), len(store).bit_length())
+        cached = self._plans.get(pivot)
+        if cached is not None and cached[:2] == key:
+            return cached[2]
+        order = tuple(plan(self.conditions, store, first=pivot))
+        self._plans[pivot] = key + (order,)
+        return order
+
+    def matcher(self, order: Tuple[int, ...], pivot: Optional[int], counted: bool = False) -> Callable:
+        """Returns the generated match function for a join order."""
+        key = (order, pivot, counted)
+        function = self._matchers.get(key)
+        if function is None:
+            function = self._matchers[key] = _exec(self.source(order, pivot, counted), "match")
+        return function
+
+    def source(self, order: Sequence[int], pivot: Optional[int] = None, counted: bool = False) -> str:
+        """Generates the source of the match function for a join order.
+
+        The function takes the lookup of the store, the lookup of the delta,
+        the delta itself and a stats object. The condition at ``pivot`` is
+        looked up in the delta, and the conditions written before it must not
+        match delta facts, so that each match is produced for a single pivot.
+        Only ``counted`` functions update the stats object.
+        """
+        slots = {variable: i for i, variable in enumerate(self.variables)}
+        lines = ["def match(lookup, delta_lookup, delta, stats):"]
+        bound = set()
+        depth = 1
+        for index in order:
+            condition = self.conditions[index]
+            arguments = []
+            for term in (condition.entity, condition.value):
+                if not is_variable(term):
+                    arguments.append(repr(term))
+                elif term in bound:
+                    arguments.append(f"v{slots[term]}")
+                else:
+                    arguments.append("None")
+            source = "delta_lookup" if index == pivot else "lookup"
+            if counted:
+                lines.append("    " * depth + "stats.tests += 1")
+            lines.append(
+                "    " * depth
+                + f"for f{index} in {source}({arguments[0]}, {condition.attribute!r}, {arguments[1]}):"
+            )
+            depth += 1
+            pad = "    " * depth
+            if counted:
+                lines.append(f"{pad}stats.combinations += 1")
+            if pivot is not None and index < pivot:
+                lines.append(f"{pad}if f{index} in delta:")
+                lines.append(f"{pad}    continue")
+            bound_here = set()
+            for position, term in (("entity", condition.entity), ("value", condition.value)):
+                if not is_variable(term) or term in bound:
+                    continue
+                slot = f"v{slots[term]}"
+                if term in bound_here:
+                    # Same variable twice in one condition
+                    lines.append(f"{pad}if f{index}.{position} != {slot}:")
+                else:
+                    lines.append(f"{pad}{slot} = f{index}.{position}")
+                    # Variables can only be bound to constants
+                    lines.append(f"{pad}if {slot}[:1] == '?':")
+                    bound_here.add(term)
+                lines.append(f"{pad}    continue")
+            bound |= bound_here
+        values = "".join(f"v{i}, " for i in range(len(self.variables)))
+        facts = "".join(f"f{i}, " for i in range(len(self.conditions)))
+        if counted:
+            lines.append("    " * depth + "stats.bindings += 1")
+        lines.append("    " * depth + f"yield ({values}), ({facts})")
+        return "\n".join(lines) + "\n"
+
+    def _compile_actions(self) -> Callable[[Tuple[str, ...]], List[Fact]]:
+        """Generates the function that builds the facts of the actions.
+
+        Follows :meth:`KnowledgeBase._apply_bindings`: in rules with variables
+        an action is only produced if its entity is a bound variable.
+        """
+        if not self.has_variables:
+            actions = list(self.actions)
+            return lambda values: list(actions)
+        slots = {variable: i for i, variable in enumerate(self.variables)}
+        items = []
+        for action in self.actions:
+            if action.entity not in slots:
+                continue
+            value = f"values[{slots[action.value]}]" if action.value in slots else repr(action.value)
+            items.append(f"Fact(values[{slots[action.entity]}], {action.attribute!r}, {value})")
+        source = "def derive(values):\n    return [" + ", ".join(items) + "]\n"
+        return _exec(source, "derive")
+
+
+def _exec(source: str, name: str) -> Callable:
+    namespace = {"Fact": Fact}
+    exec(compile(source, f"<clyps rule {name}>", "exec"), namespace)
+    return namespace[name]
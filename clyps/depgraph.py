@@ -0,0 +1,75 @@
+"""Dependency graph between rules."""
+from typing import Dict, List, Sequence, Set
+
+from .rule import Rule
+
+
+class DependencyGraph:
+    """Graph with an edge from rule A to rule B when A can derive facts B matches.
+
+    Facts are connected to rules through their attribute: an edge exists
+    when one of A's action attributes is one of B's condition attributes.
+    Rules are referred to by their position in ``rules``.
+    """
+
+    def __init__(self, rules: Sequence[Rule]):
+        self.rules = list(rules)
+        self.inputs: List[Set[str]] = [{c.attribute for c in r.conditions} for r in self.rules]
+        self.outputs: List[Set[str]] = [{a.attribute for a in r.actions} for r in self.rules]
+        self.readers: Dict[str, List[int]] = {}
+        for index, attributes in enumerate(self.inputs):
+            for attribute in attributes:
+                self.readers.setdefault(attribute, []).append(index)
+        self.successors: List[List[int]] = [
+            sorted({reader for attribute in outputs for reader in self.readers.get(attribute, ())})
+            for outputs in self.outputs
+        ]
+
+    def components(self) -> List[List[int]]:
+        """Strongly connected components, in topological order.
+
+        Every rule of a component only depends on rules of the same component
+        or of earlier ones. Uses an iterative version of Tarjan's algorithm.
+        """
+        index_of: Dict[int, int] = {}
+        lowlink: Dict[int, int] = {}
+        on_stack: Set[int] = set()
+        stack: List[int] = []
+        components: List[List[int]] = []
+        counter = 0
+        for root in range(len(self.rules)):
+            if root in index_of:
+                continue
+            work = [(root, 0)]
+            while work:
+                node, child = work.pop()
+                if child == 0:
+                    index_of[node] = lowlink[node] = counter
+                    counter += 1
+                    stack.append(node)
+                    on_stack.add(node)
+                successors = self.successors[node]
+                if child < len(successors):
+                    work.append((node, child + 1))
+                    successor = successors[child]
+                    if successor not in index_of:
+                        work.append((successor, 0))
+                    elif successor in on_stack:
+                        lowlink[node] = min(lowlink[node], index_of[successor])
+                    continue
+                if lowlink[node] == index_of[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(sorted(component))
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+        # Tarjan emits components in reverse topological order
+        components.reverse()
+        return components
+
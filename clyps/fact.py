@@ -1,10 +1,9 @@
-import re
-
-
 class Fact:
     """Represents a fact with entity, attribute, and value.
     Example: (dog has hair)"""
 
+    __slots__ = ("entity", "attribute", "value")
+
     def __init__(self, entity: str, attribute: str, value: str):
         self.entity = entity
         self.attribute = attribute
@@ -13,14 +12,13 @@ class Fact:
     @classmethod
     def from_string(cls, fact_string: str):
         """Parses a fact from a string."""
-        parts = re.findall(r"\(([^)]+)", fact_string)
-        if not parts:
-            raise ValueError(f"Invalid fact string: {fact_string}")
-        # check if the fact length is valid
-        parts = parts[0].split()
-        if len(parts) != 3:
-            raise ValueError(f"Invalid fact string: {fact_string}")
-        return cls(*parts)
+        from .parser import ParseError, parse_fact
+
+        try:
+            fact = parse_fact(fact_string)
+        except ParseError as e:
+            raise ValueError(f"Invalid fact string: {fact_string}") from e
+        return fact if cls is Fact else cls(fact.entity, fact.attribute, fact.value)
 
     def __repr__(self) -> str:
         return f"({self.entity} {self.attribute} {self.value})"
@@ -33,3 +31,6 @@ class Fact:
                 and self.value == __value.value
             )
         return False
+
+    def __hash__(self) -> int:
+        return hash((self.entity, self.attribute, self.value))
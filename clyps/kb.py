@@ -1,53 +1,398 @@
-from typing import List
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
+from .agenda import Agenda
+from .backward import prove, prove_magic
+from .columnar import ColumnarFactStore
+from .depgraph import DependencyGraph
 from .fact import Fact
+from .parallel import parallel_infer
+from .overlay import OverlayFactStore, OverlaySet
+from .parser import parse, parse_fact, parse_file
+from .planner import match_condition, query
+from .rete import ReteNetwork
 from .rule import Rule
+from .sharding import sharded_infer
+from .snapshot import load_snapshot, save_snapshot
+from .sqlite import SQLiteFactStore, sql_infer
+from .stats import InferenceStats
+from .store import FactStore, as_store
+from .subscriptions import DERIVED, RETRACTED, Change, Subscription
+from .tms import TruthMaintenance
+from .versioned import VersionedFactStore
+
+# Smallest round of the semi-naive engine matched with NumPy over a columnar store
+VECTORIZED_DELTA = 20000
 
 
 class KnowledgeBase:
-    """Represents a knowledge base with facts and rules."""
+    """Represents a knowledge base with facts and rules.
+
+    ``engine`` selects the inference algorithm used by :meth:`infer`:
+    ``"naive"`` re-matches every rule against all the facts until nothing
+    changes, ``"seminaive"`` only evaluates the joins that involve a fact
+    derived in the previous round, ``"rete"`` keeps a Rete network up to
+    date as facts are added, and ``"parallel"`` runs semi-naive evaluation
+    with the new facts of each round split over a pool of ``workers``
+    processes (see :mod:`clyps.parallel`). ``"sharded"`` partitions the facts by
+    entity and saturates the shards with the entity-local rules in
+    ``workers`` processes before running the other rules
+    (see :mod:`clyps.sharding`). ``"agenda"`` fires one activation at a time,
+    chosen by rule salience and the conflict resolution ``strategy``
+    (``"depth"``, ``"breadth"`` or ``"lex"``), and only computes the matches
+    it fires (see :mod:`clyps.agenda`). ``"sql"`` runs each rule as SQL
+    statements inside a :class:`~clyps.sqlite.SQLiteFactStore`, the default
+    store for this engine (see :mod:`clyps.sqlite`).
+
+    ``store`` replaces the default :class:`~clyps.store.FactStore`, e.g. with a
+    :class:`~clyps.columnar.ColumnarFactStore` for very large fact sets. With
+    that store and NumPy installed, the semi-naive engine matches the rounds
+    with at least :data:`VECTORIZED_DELTA` new facts with
+    :mod:`clyps.vectorized`.
+
+    With ``truth_maintenance=True``, :meth:`remove_fact` also retracts the
+    derived facts that lose all their support (see :mod:`clyps.tms`).
 
-    def __init__(self):
-        self.facts = []
+    With ``stats=True`` (or by assigning an :class:`~clyps.stats.InferenceStats`
+    to :attr:`stats`), :meth:`infer` records per-rule profiling counters.
+    """
+
+    ENGINES = ("naive", "seminaive", "rete", "parallel", "sharded", "agenda", "sql")
+
+    def __init__(self, engine: str = "naive", store=None, truth_maintenance: bool = False,
+                 workers: Optional[int] = None, stats: bool = False, strategy: str = "depth"):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown inference engine: {engine}")
+        self.engine = engine
+        self.workers = workers
+        self.strategy = strategy
+        if store is None:
+            store = SQLiteFactStore() if engine == "sql" else FactStore()
+        self._facts = store
         self.rules = []
+        self._rete = None
+        self._agenda = None
+        self._graph = None
+        # Facts added since the last semi-naive saturation (None: everything)
+        self._unsaturated: Optional[FactStore] = None
+        self._tms = TruthMaintenance(self) if truth_maintenance else None
+        self.stats: Optional[InferenceStats] = InferenceStats() if stats else None
+        self._subscriptions: List[Subscription] = []
+
+    @property
+    def facts(self) -> FactStore:
+        """The facts of the knowledge base, in insertion order.
+
+        Use :meth:`add_fact` and :meth:`remove_fact` to change them: changing
+        the store directly bypasses the engines, which would then miss the
+        change.
+        """
+        return self._facts
+
+    @facts.setter
+    def facts(self, facts) -> None:
+        self._facts = as_store(facts)
+        self._rete = None
+        self._agenda = None
+        self._unsaturated = None
 
     def add_fact(self, _fact):
         """Adds a fact to the knowledge base."""
-        self.facts.append(_fact)
+        if self._tms is not None:
+            # Asserted facts no longer depend on their derivations
+            self._tms.derived.discard(_fact)
+        if self._facts.add(_fact):
+            if self._rete is not None:
+                self._rete.add_fact(_fact)
+            if self._agenda is not None:
+                self._agenda.add_fact(_fact)
+            if self._unsaturated is not None:
+                self._unsaturated.add(_fact)
 
     def remove_fact(self, _fact):
-        """Removes a fact from the knowledge base."""
-        if _fact in self.facts:
-            self.facts.remove(_fact)
+        """Removes a fact from the knowledge base.
+
+        With truth maintenance, the derived facts that depended on it are
+        removed as well.
+        """
+        added: List[Fact] = []
+        if self._tms is not None:
+            # Facts deleted and rederived during the retraction are not
+            # reported; the new facts are reported once it is over
+            subscriptions, self._subscriptions = self._subscriptions, []
+            try:
+                removed, _, added = self._tms.retract(_fact)
+            finally:
+                self._subscriptions = subscriptions
+        else:
+            removed = [_fact] if self._facts.discard(_fact) else []
+        if self._rete is not None:
+            for removed_fact in removed:
+                self._rete.remove_fact(removed_fact)
+        if self._unsaturated is not None:
+            for removed_fact in removed:
+                self._unsaturated.discard(removed_fact)
+        if self._subscriptions:
+            for removed_fact in removed:
+                self._notify(RETRACTED, removed_fact)
+            for added_fact in added:
+                self._notify(DERIVED, added_fact)
 
     def add_rule(self, _rule):
         """Adds a rule to the knowledge base."""
         self.rules.append(_rule)
+        self._rete = None
+        self._agenda = None
+        self._unsaturated = None
 
     def remove_rule(self, _rule):
         """Removes a rule from the knowledge base."""
         if _rule in self.rules:
             self.rules.remove(_rule)
+            self._rete = None
+            self._agenda = None
+            self._unsaturated = None
+
+    def loads(self, text: str) -> None:
+        """Adds the facts and rules of a CLIPS-style source text.
+
+        See :mod:`clyps.parser` for the syntax. Raises
+        :class:`~clyps.parser.ParseError` with the line and column of the
+        first syntax error; nothing is added in that case.
+        """
+        self._load_items(parse(text))
+
+    def load(self, source) -> None:
+        """Adds the facts and rules of a source file (a path or a text stream)."""
+        self._load_items(parse_file(source))
+
+    def _load_items(self, items) -> None:
+        for item in items:
+            if isinstance(item, Rule):
+                self.add_rule(item)
+            else:
+                self.add_fact(item)
+
+    def query(self, *patterns, limit: Optional[int] = None, offset: int = 0) -> Iterator[Dict[str, str]]:
+        """Streams the bindings of the facts that match all the patterns.
+
+        Patterns are facts with variables, given as :class:`Fact` objects or
+        as strings, e.g. ``kb.query("(?x is mammal)", "(?x has ?covering)")``;
+        a string may hold several patterns. Variables follow the semantics of
+        rule conditions (see :func:`clyps.planner.match_condition`). The
+        patterns are joined through the store indexes and results are
+        produced one at a time; ``offset`` results are skipped and at most
+        ``limit`` are returned. The facts must not change while iterating;
+        to query while another thread runs inference, use :meth:`snapshot`.
+        """
+        return query(self._facts, patterns, limit, offset)
+
+    def prove(self, goal, magic: bool = False) -> List[Dict[str, str]]:
+        """Finds the derivable facts matching a goal without inferring everything.
+
+        ``goal`` is a pattern such as ``"(rex is mammal)"`` or
+        ``"(?x ancestor tom)"``. Returns the bindings of its variables for
+        each matching fact that is stored or that the rules derive, so a goal
+        without variables gives ``[{}]`` if it holds and ``[]`` otherwise.
+        Only the rules and facts relevant to the goal are looked at: it is
+        evaluated backward with tabled subgoals, or, with ``magic=True``,
+        forward over a magic-sets rewrite of the rules (see
+        :mod:`clyps.backward`). The facts of the knowledge base do not change.
+        """
+        if not isinstance(goal, Fact):
+            goal = parse_fact(goal)
+        return (prove_magic if magic else prove)(self._facts, self.rules, goal)
+
+    def fork(self) -> "KnowledgeBase":
+        """Returns a child knowledge base that starts with the facts and rules of this one.
+
+        The child shares the facts through a copy-on-write
+        :class:`~clyps.overlay.OverlayFactStore`, so forking is O(1) and a
+        fork only uses memory for the facts it adds or removes. Changes to
+        the child never affect the parent or the other forks, and vice
+        versa: the parent keeps its own changes in an overlay too. Versioned
+        and columnar stores stay as they are, so the parent can still
+        publish, take snapshots and match large rounds with NumPy; the
+        child's overlay is then over a frozen view of them (see
+        ``VersionedFactStore.frozen`` and ``ColumnarFactStore.frozen``), and
+        a columnar parent copies its columns on its next change. With the
+        semi-naive and agenda engines, the child's inference resumes from
+        the parent's state and only works on the child's own changes; the
+        Rete engine rebuilds its network from all the facts. Subscriptions
+        are not inherited. The sql engine does not support forks.
+        """
+        if self.engine == "sql":
+            raise ValueError("The sql engine does not support forks")
+        child = KnowledgeBase(self.engine, OverlayFactStore(self._share(self._facts)), workers=self.workers,
+                              stats=self.stats is not None, strategy=self.strategy)
+        child.rules = list(self.rules)
+        child._graph = self._graph
+        if self._unsaturated is not None:
+            child._unsaturated = FactStore(self._unsaturated)
+        if self._agenda is not None and not self._agenda:
+            # Every activation of the shared facts has fired already
+            child._agenda = Agenda(child._facts, child.rules, self.strategy, child.stats)
+        if self._tms is not None:
+            child._tms = TruthMaintenance(child)
+            child._tms.derived = OverlaySet(self._share(self._tms.derived))
+        return child
+
+    def _share(self, container):
+        """Returns a version of the facts (or TMS derived set) that no one modifies any more.
+
+        This knowledge base continues with an overlay over it, unless its
+        store can give a frozen view of itself; the overlays of previous
+        forks are reused while they have no changes.
+        """
+        if isinstance(container, (OverlayFactStore, OverlaySet)) and not container.changed():
+            return container.base
+        if hasattr(container, "frozen"):
+            return container.frozen()
+        if container is self._facts:
+            self._facts = OverlayFactStore(container)
+            if self._agenda is not None:
+                self._agenda.rebind(self._facts)
+        else:
+            self._tms.derived = OverlaySet(container)
+        return container
+
+    def subscribe(self, pattern=None, callback: Optional[Callable[[Change], None]] = None,
+                  maxsize: int = 1024) -> Subscription:
+        """Reports the facts matching a pattern as rules derive them or they are retracted.
+
+        ``pattern`` is a fact pattern such as ``"(?x is mammal)"`` or a
+        :class:`Fact`; None matches every fact. Each change is passed to
+        ``callback`` by the thread that runs inference, or queued on the
+        returned :class:`~clyps.subscriptions.Subscription` to be read by
+        iterating over it from another thread or with ``async for``. When
+        ``maxsize`` changes are waiting, inference blocks until the consumer
+        catches up. Close the subscription to stop the deliveries.
+        """
+        if isinstance(pattern, str):
+            pattern = parse_fact(pattern)
+        subscription = Subscription(pattern, callback, maxsize, self._subscriptions)
+        self._subscriptions.append(subscription)
+        return subscription
+
+    def _notify(self, kind: str, _fact) -> None:
+        change = Change(kind, _fact)
+        for subscription in tuple(self._subscriptions):
+            subscription.notify(change)
+
+    def snapshot(self):
+        """Returns an immutable view of the facts that can be read from any thread.
+
+        With a :class:`~clyps.versioned.VersionedFactStore` this is the last
+        published version (see :meth:`publish`) and costs nothing; other
+        stores are copied, so they must not be changed during the call.
+        """
+        if hasattr(self._facts, "snapshot"):
+            return self._facts.snapshot()
+        return VersionedFactStore(self._facts).snapshot()
+
+    def publish(self) -> None:
+        """Makes the current facts visible to new snapshots of a versioned store.
+
+        Called automatically at the end of :meth:`infer`.
+        """
+        if hasattr(self._facts, "publish"):
+            self._facts.publish()
+
+    def save_snapshot(self, path: str) -> None:
+        """Saves the facts and rules to a binary snapshot (see :mod:`clyps.snapshot`)."""
+        save_snapshot(self, path)
+
+    @classmethod
+    def load_snapshot(cls, path: str, use_mmap: bool = True, **kwargs) -> "KnowledgeBase":
+        """Opens a snapshot written by :meth:`save_snapshot`.
+
+        The file is memory-mapped, so facts are paged in lazily; keyword
+        arguments are passed to the constructor.
+        """
+        return load_snapshot(path, use_mmap=use_mmap, **kwargs)
 
-    def infer(self) -> None:
-        """Infers new facts using the current facts and rules."""
+    def infer(self, max_cycles: Optional[int] = None, until=None) -> None:
+        """Infers new facts using the current facts and rules.
+
+        ``max_cycles`` limits the number of rule firings with the agenda and
+        Rete engines, and the number of rounds with the naive and semi-naive
+        ones. Inference also stops as soon as a fact matching ``until`` (a
+        pattern such as ``"(?x is mammal)"`` or a :class:`Fact`) is known.
+        Calling :meth:`infer` again resumes it.
+
+        At the end, the facts are published to readers of a versioned store
+        (see :meth:`snapshot`).
+        """
+        self._infer(max_cycles, until)
+        self.publish()
+
+    def _infer(self, max_cycles: Optional[int] = None, until=None) -> None:
+        if until is not None:
+            if not isinstance(until, Fact):
+                until = parse_fact(until)
+            if self._reached(until):
+                return
+        if self.engine == "rete":
+            self._infer_rete(max_cycles, until)
+            return
+        if self.engine == "agenda":
+            self._infer_agenda(max_cycles, until)
+            return
+        if self.engine == "seminaive":
+            self._infer_seminaive(max_cycles, until)
+            return
+        if self.engine == "parallel":
+            if max_cycles is not None or until is not None:
+                raise ValueError("The parallel engine does not support max_cycles or until")
+            parallel_infer(self, self.workers)
+            return
+        if self.engine == "sharded":
+            if max_cycles is not None or until is not None:
+                raise ValueError("The sharded engine does not support max_cycles or until")
+            sharded_infer(self, self.workers)
+            return
+        if self.engine == "sql":
+            sql_infer(self, max_cycles, until)
+            return
+
+        stats = self.stats
+        graph, _ = self._dependency_graph()
+        # Rules only run again once one of their input attributes has changed
+        step = 0
+        changed_at: Dict[str, int] = {}
+        last_run: Dict[int, int] = {}
+        cycles = 0
         new_facts_added: bool = True
         while new_facts_added:
+            if cycles == max_cycles or (until is not None and cycles and self._reached(until)):
+                break
+            cycles += 1
             # Assume that no new facts will be added in this iteration
             new_facts_added = False
+            if stats is not None:
+                stats.start_cycle()
 
             # Go through all the rules
-            for _rule in self.rules:
+            for rule_index, _rule in enumerate(self.rules):
+                previous = last_run.get(rule_index)
+                if previous is not None and all(
+                    changed_at.get(attribute, -1) < previous for attribute in graph.inputs[rule_index]
+                ):
+                    continue
+                step += 1
+                last_run[rule_index] = step
+                rule_stats = None
+                if stats is not None:
+                    rule_stats = stats.rule(_rule.name)
+                    start = time.perf_counter()
                 # Check if the rule contains variables
-                contains_variables = any(
-                    fact.entity.startswith("?") or fact.value.startswith("?")
-                    for fact in _rule.conditions
-                )
-
-                if contains_variables:
+                if self._has_variables(_rule):
                     # Try to find a match for the rule
-                    bindings = _rule.match(self.facts)
+                    bindings = _rule.match(self.facts, stats=rule_stats)
                     if bindings:
+                        if stats is not None:
+                            for binding in bindings:
+                                stats.fired(_rule.name, binding)
                         for action in _rule.actions:
                             try:
                                 # Apply the bindings to the action
@@ -55,21 +400,273 @@ class KnowledgeBase:
 
                                 # Add the new fact to the list of facts if it isn't already there
                                 for new_fact in new_facts:
-                                    if new_fact not in self.facts:
-                                        self.facts.append(new_fact)
+                                    if self._add_derived(new_fact):
                                         new_facts_added = True
+                                        changed_at[new_fact.attribute] = step
+                                        if rule_stats is not None:
+                                            rule_stats.derived += 1
+                                    elif rule_stats is not None:
+                                        rule_stats.duplicates += 1
 
                             # If there was an error applying the bindings, just move on to the next action
                             except Exception as e:
                                 print(e)
                 else:
+                    if rule_stats is not None:
+                        rule_stats.tests += len(_rule.conditions)
                     # If rule does not contain variables, check if all conditions are present in the facts
                     if all(condition in self.facts for condition in _rule.conditions):
+                        if stats is not None:
+                            rule_stats.bindings += 1
+                            stats.fired(_rule.name, {})
                         # If all conditions are met, add the actions to the facts
                         for action in _rule.actions:
-                            if action not in self.facts:
-                                self.facts.append(action)
+                            if self._add_derived(action):
                                 new_facts_added = True
+                                changed_at[action.attribute] = step
+                                if rule_stats is not None:
+                                    rule_stats.derived += 1
+                            elif rule_stats is not None:
+                                rule_stats.duplicates += 1
+                if rule_stats is not None:
+                    rule_stats.seconds += time.perf_counter() - start
+
+    def _infer_seminaive(self, max_cycles: Optional[int] = None, until: Optional[Fact] = None) -> None:
+        """Delta-driven evaluation: each round only joins against new facts.
+
+        After a complete saturation, the next call starts from the facts
+        added in between; otherwise (first call, rules changed, or stopped
+        early) every fact is new in the first round, and the rules without
+        conditions fire before it.
+        """
+        if self._unsaturated is not None:
+            delta = self._unsaturated
+        else:
+            # Every fact is new: the store itself is the delta, instead of a copy
+            delta = self._facts
+            # Rules without conditions read nothing, so no delta wakes them up
+            for _rule in self.rules:
+                if not _rule.conditions:
+                    for action in _rule.actions:
+                        self._add_derived(action)
+        self._unsaturated = FactStore()
+        if not self._saturate(delta, max_cycles, until):
+            self._unsaturated = None
+
+    def _saturate(self, delta: FactStore, max_cycles: Optional[int] = None, until: Optional[Fact] = None) -> bool:
+        """Runs semi-naive rounds starting from the given new facts.
+
+        Rules are evaluated one strongly connected component of the
+        dependency graph at a time, in topological order, so a component
+        only starts once the components it reads from are saturated. In each
+        round, only the rules that read an attribute of the facts derived in
+        the previous round are woken up. ``delta`` is extended with the
+        derived facts; it can be the store itself when every fact is new.
+
+        Returns False if it stopped before reaching a fixpoint.
+        """
+        graph, components = self._dependency_graph()
+        stats = self.stats
+        cycles = 0
+        for component in components:
+            members = set(component)
+            inputs = {attribute for index in component for attribute in graph.inputs[index]}
+            if not any(delta.lookup(None, attribute, None) for attribute in inputs):
+                continue
+            if delta is self._facts:
+                component_delta = delta
+            else:
+                component_delta = FactStore(
+                    fact for attribute in inputs for fact in delta.lookup(None, attribute, None)
+                )
+            while component_delta:
+                if component_delta is self._facts:
+                    attributes = inputs
+                else:
+                    attributes = {fact.attribute for fact in component_delta}
+                woken = sorted(
+                    {index for attribute in attributes for index in graph.readers.get(attribute, ())} & members
+                )
+                if not woken:
+                    break
+                if cycles == max_cycles:
+                    return False
+                cycles += 1
+                if stats is not None:
+                    stats.start_cycle()
+                derived = FactStore()
+                arrays = self._arrays(component_delta) if stats is None else None
+                for index in woken:
+                    _rule = graph.rules[index]
+                    if arrays is not None and _rule.compiled().has_variables:
+                        for new_fact in arrays.fire(_rule):
+                            if new_fact not in self._facts:
+                                derived.add(new_fact)
+                    else:
+                        self._evaluate(_rule, component_delta, derived)
+
+                # New facts are only visible to the joins of the next round
+                for new_fact in derived:
+                    self._add_derived(new_fact)
+                    delta.add(new_fact)
+                component_delta = derived
+                if until is not None and self._reached(until):
+                    return False
+        return True
+
+    def _arrays(self, delta: FactStore):
+        """Returns the facts as NumPy arrays for a round with a large delta, or None."""
+        if len(delta) < VECTORIZED_DELTA or not isinstance(self._facts, ColumnarFactStore):
+            return None
+        # Imported here: NumPy would slow down the start of every program using clyps
+        from .vectorized import FactArrays
+
+        try:
+            return FactArrays(self._facts, delta)
+        except ImportError:
+            return None
+
+    def _evaluate(self, _rule, delta: FactStore, derived: FactStore) -> None:
+        """Adds to ``derived`` the new facts of the rule's matches that use a delta fact."""
+        stats = self.stats
+        rule_stats = None
+        if stats is not None:
+            rule_stats = stats.rule(_rule.name)
+            start = time.perf_counter()
+        compiled = _rule.compiled()
+        if compiled.has_variables:
+            for values, _ in compiled.matches(self._facts, delta, rule_stats):
+                if rule_stats is not None:
+                    stats.fired(_rule.name, compiled.bindings(values))
+                for new_fact in compiled.derive(values):
+                    if new_fact not in self._facts and derived.add(new_fact):
+                        if rule_stats is not None:
+                            rule_stats.derived += 1
+                    elif rule_stats is not None:
+                        rule_stats.duplicates += 1
+        else:
+            if rule_stats is not None:
+                rule_stats.tests += len(_rule.conditions)
+            if all(condition in self._facts for condition in _rule.conditions) and any(
+                condition in delta for condition in _rule.conditions
+            ):
+                if rule_stats is not None:
+                    rule_stats.bindings += 1
+                    stats.fired(_rule.name, {})
+                for action in _rule.actions:
+                    if action not in self._facts and derived.add(action):
+                        if rule_stats is not None:
+                            rule_stats.derived += 1
+                    elif rule_stats is not None:
+                        rule_stats.duplicates += 1
+        if rule_stats is not None:
+            rule_stats.seconds += time.perf_counter() - start
+
+    def _dependency_graph(self) -> Tuple[DependencyGraph, List[List[int]]]:
+        """The dependency graph of the rules and its components, rebuilt when the rules change."""
+        key = tuple(_rule.compiled() for _rule in self.rules)
+        if self._graph is None or self._graph[0] != key:
+            graph = DependencyGraph(self.rules)
+            self._graph = (key, graph, graph.components())
+        return self._graph[1], self._graph[2]
+
+    def _infer_rete(self, max_cycles: Optional[int] = None, until: Optional[Fact] = None) -> None:
+        """Fires the activations of the Rete network until it is quiescent."""
+        if self._rete is None:
+            # The network is (re)built lazily after the rules change
+            self._rete = ReteNetwork(self.rules)
+            for fact in self.facts:
+                self._rete.add_fact(fact)
+
+        stats = self.stats
+        if stats is not None:
+            stats.start_cycle()
+        if max_cycles == 0:
+            return
+        cycles = 0
+        for _rule, bindings in self._rete.activations():
+            if stats is None:
+                new_facts = [fact for fact in self._derive(_rule, bindings) if self._add_derived(fact)]
+            else:
+                start = time.perf_counter()
+                new_facts = self._fire_counted(_rule, bindings, self._derive(_rule, bindings), start)
+            cycles += 1
+            if cycles == max_cycles or (until is not None and self._stops(new_facts, until)):
+                break
+
+    def _infer_agenda(self, max_cycles: Optional[int] = None, until: Optional[Fact] = None) -> None:
+        """Fires activations one at a time, in conflict resolution order."""
+        if self._agenda is None:
+            # Like the Rete network, the agenda is rebuilt after the rules change
+            self._agenda = Agenda(self._facts, self.rules, self.strategy, self.stats)
+            for fact in self._facts:
+                self._agenda.add_fact(fact)
+
+        stats = self.stats
+        if stats is not None:
+            stats.start_cycle()
+        cycles = 0
+        while cycles != max_cycles:
+            start = time.perf_counter() if stats is not None else None
+            activation = self._agenda.pop()
+            if activation is None:
+                break
+            _rule, values, _ = activation
+            compiled = _rule.compiled()
+            if stats is None:
+                new_facts = [fact for fact in compiled.derive(values) if self._add_derived(fact)]
+            else:
+                new_facts = self._fire_counted(_rule, compiled.bindings(values), compiled.derive(values), start)
+            cycles += 1
+            if until is not None and self._stops(new_facts, until):
+                break
+
+    def _fire_counted(self, _rule, bindings, facts, start: float) -> List[Fact]:
+        """Adds the facts of one firing (matched since ``start``), updating the rule's counters."""
+        stats = self.stats
+        rule_stats = stats.rule(_rule.name)
+        rule_stats.bindings += 1
+        stats.fired(_rule.name, bindings)
+        new_facts = []
+        for new_fact in facts:
+            if self._add_derived(new_fact):
+                rule_stats.derived += 1
+                new_facts.append(new_fact)
+            else:
+                rule_stats.duplicates += 1
+        rule_stats.seconds += time.perf_counter() - start
+        return new_facts
+
+    def _reached(self, until: Fact) -> bool:
+        """Checks whether a fact matching the pattern is known."""
+        return any(match_condition(fact, until) is not None for fact in self._facts.candidates(until))
+
+    @staticmethod
+    def _stops(new_facts: List[Fact], until: Fact) -> bool:
+        return any(match_condition(fact, until) is not None for fact in new_facts)
+
+    def _add_derived(self, _fact) -> bool:
+        """Adds a fact produced by a rule. Returns False if it was already known."""
+        if not self._facts.add(_fact):
+            return False
+        if self._tms is not None:
+            self._tms.derived.add(_fact)
+        if self._rete is not None:
+            self._rete.add_fact(_fact)
+        if self._agenda is not None:
+            self._agenda.add_fact(_fact)
+        if self._subscriptions:
+            self._notify(DERIVED, _fact)
+        return True
+
+    @staticmethod
+    def _has_variables(_rule) -> bool:
+        return _rule.compiled().has_variables
+
+    def _derive(self, _rule, bindings) -> List[Fact]:
+        """Returns the facts produced by firing a rule with one set of bindings."""
+        compiled = _rule.compiled()
+        return compiled.derive(compiled.values(bindings))
 
     def _apply_bindings(self, action, bindings) -> List[Fact]:
         facts = []
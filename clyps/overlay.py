@@ -0,0 +1,288 @@
+"""Copy-on-write layers over fact stores, used by :meth:`KnowledgeBase.fork`.
+
+An :class:`OverlayFactStore` reads through to a base store that is no
+longer modified and keeps its own changes aside: the facts it added, in a
+:class:`~clyps.store.FactStore`, and the base facts it removed, in a set.
+Creating one is O(1) and its memory is proportional to its changes, so many
+overlays can share one large base. :class:`OverlaySet` does the same for
+plain sets.
+
+An overlay over another overlay reads through both, so a knowledge base
+that changes between forks builds a chain of them. Once a chain reaches
+:data:`MAX_DEPTH` overlays, a new overlay starts from a compacted copy of
+it: one overlay over the bottom store with the changes of the whole chain,
+built in time proportional to those changes.
+"""
+from typing import Iterable, Iterator, List, Optional, Set
+
+from .fact import Fact
+from .store import FactStore
+
+# Longest chain of overlays a new overlay is stacked on
+MAX_DEPTH = 4
+
+
+class OverlayFactStore:
+    """Fact store made of a read-only base store and the changes made on top of it.
+
+    The base must not be modified while the overlay is in use. A fact that
+    is removed and added again is stored among the additions, so it gets a
+    newer sequence number than every base fact.
+    """
+
+    def __init__(self, base):
+        if isinstance(base, OverlayFactStore) and base.depth >= MAX_DEPTH:
+            base = base.compacted()
+        self.base = base
+        self.added = FactStore()
+        self.removed: Set[Fact] = set()
+        self._offset: Optional[int] = None
+        # Facts as a list for indexing, built on demand after a change
+        self._list: Optional[List[Fact]] = None
+
+    @property
+    def depth(self) -> int:
+        """Number of overlays in the chain that ends with this one."""
+        base = self.base
+        return base.depth + 1 if isinstance(base, OverlayFactStore) else 1
+
+    def changed(self) -> bool:
+        """Checks whether any fact was added or removed since the overlay was created."""
+        return bool(self.added) or bool(self.removed)
+
+    def compacted(self) -> "OverlayFactStore":
+        """Returns one overlay over the bottom store of the chain, with the same facts.
+
+        Facts keep their sequence numbers. Takes time proportional to the
+        changes made in the chain.
+        """
+        levels = [self]
+        while isinstance(levels[-1].base, OverlayFactStore):
+            levels.append(levels[-1].base)
+        levels.reverse()
+        bottom = levels[0].base
+        compact = OverlayFactStore(bottom)
+        offset = compact._base_end()
+        added, removed = compact.added, compact.removed
+        for level in levels:
+            for fact in level.removed:
+                if not added.discard(fact):
+                    removed.add(fact)
+            start = level._base_end() - offset
+            for fact in level.added:
+                # Keeps the sequence number the fact has in the chain
+                added._sequence = start + level.added.sequence(fact)
+                added.add(fact)
+        added._sequence = self._sequence - offset
+        return compact
+
+    def add(self, fact: Fact) -> bool:
+        """Adds a fact. Returns False if it was already in the store."""
+        if fact in self:
+            return False
+        self._list = None
+        return self.added.add(fact)
+
+    def discard(self, fact: Fact) -> bool:
+        """Removes a fact if present. Returns False if it was not in the store."""
+        if self.added.discard(fact):
+            self._list = None
+            return True
+        if fact in self.removed or fact not in self.base:
+            return False
+        self.removed.add(fact)
+        self._list = None
+        return True
+
+    def remove(self, fact: Fact) -> None:
+        """Removes a fact, raising ValueError if it is not in the store."""
+        if not self.discard(fact):
+            raise ValueError(f"{fact} not in store")
+
+    @property
+    def _sequence(self) -> int:
+        """The sequence number the next added fact gets."""
+        return self._base_end() + self.added._sequence
+
+    def _base_end(self) -> int:
+        if self._offset is None:
+            end = getattr(self.base, "_sequence", None)
+            if end is None:
+                end = max((self.base.sequence(fact) for fact in self.base), default=-1) + 1
+            self._offset = end
+        return self._offset
+
+    def sequence(self, fact: Fact) -> int:
+        """Returns the insertion sequence number of a stored fact."""
+        if fact in self.added:
+            return self._base_end() + self.added.sequence(fact)
+        if fact in self.removed:
+            raise KeyError(fact)
+        return self.base.sequence(fact)
+
+    def lookup(self, entity: Optional[str] = None, attribute: Optional[str] = None,
+               value: Optional[str] = None) -> Iterable[Fact]:
+        """Returns the stored facts with the given entity, attribute and value.
+
+        ``None`` acts as a wildcard.
+        """
+        facts = self.base.lookup(entity, attribute, value)
+        if self.removed:
+            facts = _Filtered(facts, self.removed, (entity, attribute, value))
+        added = self.added.lookup(entity, attribute, value)
+        if not len(added):
+            return facts
+        if not len(facts):
+            return added
+        return _Union(facts, added)
+
+    def candidates(self, condition: Fact) -> Iterable[Fact]:
+        """Returns the facts that may match a condition; variables are wildcards."""
+        return self.lookup(
+            None if condition.entity.startswith("?") else condition.entity,
+            condition.attribute,
+            None if condition.value.startswith("?") else condition.value,
+        )
+
+    def __contains__(self, fact: object) -> bool:
+        if fact in self.added:
+            return True
+        return fact not in self.removed and fact in self.base
+
+    def __iter__(self) -> Iterator[Fact]:
+        removed = self.removed
+        for fact in self.base:
+            if fact not in removed:
+                yield fact
+        yield from self.added
+
+    def __len__(self) -> int:
+        return len(self.base) - len(self.removed) + len(self.added)
+
+    def __getitem__(self, index):
+        if self._list is None:
+            self._list = list(self)
+        return self._list[index]
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (list, tuple)) or hasattr(other, "candidates"):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"OverlayFactStore(added={len(self.added)}, removed={len(self.removed)})"
+
+
+class _Filtered:
+    """Lookup result of the base without the removed facts, filtered while iterating.
+
+    Its length is computed from the removed facts, which are all in the base.
+    """
+
+    __slots__ = ("facts", "removed", "key")
+
+    def __init__(self, facts, removed: Set[Fact], key):
+        self.facts = facts
+        self.removed = removed
+        self.key = key
+
+    def __iter__(self) -> Iterator[Fact]:
+        removed = self.removed
+        for fact in self.facts:
+            if fact not in removed:
+                yield fact
+
+    def __len__(self) -> int:
+        entity, attribute, value = self.key
+        hidden = sum(
+            1 for fact in self.removed
+            if (entity is None or fact.entity == entity)
+            and (attribute is None or fact.attribute == attribute)
+            and (value is None or fact.value == value)
+        )
+        return len(self.facts) - hidden
+
+
+class _Union:
+    """Concatenation of two disjoint lookup results, without copying them."""
+
+    __slots__ = ("first", "second")
+
+    def __init__(self, first, second):
+        self.first = first
+        self.second = second
+
+    def __iter__(self) -> Iterator[Fact]:
+        yield from self.first
+        yield from self.second
+
+    def __len__(self) -> int:
+        return len(self.first) + len(self.second)
+
+
+class OverlaySet:
+    """Set made of a read-only base set and the changes made on top of it."""
+
+    def __init__(self, base=frozenset()):
+        if isinstance(base, OverlaySet) and base.depth >= MAX_DEPTH:
+            base = base.compacted()
+        self.base = base
+        self.added: set = set()
+        self.removed: set = set()
+
+    @property
+    def depth(self) -> int:
+        base = self.base
+        return base.depth + 1 if isinstance(base, OverlaySet) else 1
+
+    def changed(self) -> bool:
+        return bool(self.added) or bool(self.removed)
+
+    def compacted(self) -> "OverlaySet":
+        """Returns one overlay over the bottom set of the chain, with the same items."""
+        levels = [self]
+        while isinstance(levels[-1].base, OverlaySet):
+            levels.append(levels[-1].base)
+        levels.reverse()
+        compact = OverlaySet(levels[0].base)
+        for level in levels:
+            for item in level.removed:
+                if item in compact.added:
+                    compact.added.discard(item)
+                else:
+                    compact.removed.add(item)
+            for item in level.added:
+                if item in compact.removed:
+                    compact.removed.discard(item)
+                else:
+                    compact.added.add(item)
+        return compact
+
+    def add(self, item) -> None:
+        if item in self.base:
+            self.removed.discard(item)
+        else:
+            self.added.add(item)
+
+    def discard(self, item) -> None:
+        self.added.discard(item)
+        if item in self.base:
+            self.removed.add(item)
+
+    def __isub__(self, items) -> "OverlaySet":
+        for item in items:
+            self.discard(item)
+        return self
+
+    def __contains__(self, item) -> bool:
+        return item in self.added or (item in self.base and item not in self.removed)
+
+    def __iter__(self):
+        removed = self.removed
+        for item in self.base:
+            if item not in removed:
+                yield item
+        yield from self.added
+
+    def __len__(self) -> int:
+        return len(self.base) - len(self.removed) + len(self.added)
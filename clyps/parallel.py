@@ -0,0 +1,112 @@
+"""Parallel inference over a process pool.
+
+Semi-naive evaluation is split by data rather than by rules: every round,
+the facts derived in the previous round (at first, all the facts) are cut
+into shards, and each task of a
+:class:`concurrent.futures.ProcessPoolExecutor` matches every rule against
+the whole store using one shard as the delta. A match that uses facts of
+several shards is found by several tasks; the derived facts are merged in
+the parent. Each worker process keeps a replica of the fact store: the
+facts are shipped once, when the pool starts, and afterwards tasks only
+carry the facts derived since the worker's replica was last updated. A
+shard is named by its position in the facts of a round, so it does not
+have to be shipped.
+
+Splitting the rules instead, by strata of their dependency graph, kept at
+most as many workers busy as a stratum has rules, and a recursive program
+usually has a single large stratum.
+"""
+import os
+from typing import Dict, List, Optional, Tuple
+
+from .fact import Fact
+from .store import FactStore
+
+Triple = Tuple[str, str, str]
+
+# State of a worker process
+_replica: Optional[FactStore] = None
+_rules: list = []
+_generation = 0
+_deltas: Dict[int, List[Triple]] = {}
+
+
+def _init_worker(rules, triples: List[Triple]) -> None:
+    global _replica, _rules, _generation, _deltas
+    _rules = rules
+    _replica = FactStore(Fact(*triple) for triple in triples)
+    _generation = 0
+    _deltas = {0: triples}
+
+
+def _match_shard(delta_generation: int, shard: int, shards: int,
+                 updates: List[Tuple[int, List[Triple]]]) -> Tuple[int, int, List[Triple]]:
+    """Worker task: brings the replica up to date and matches the rules against one shard.
+
+    ``updates`` lists the facts of each generation the worker may not have
+    seen yet. The shard is every ``shards``-th fact of ``delta_generation``,
+    starting at ``shard``.
+    """
+    global _generation
+    for generation, triples in updates:
+        if generation > _generation:
+            for triple in triples:
+                _replica.add(Fact(*triple))
+            _deltas[generation] = triples
+            _generation = generation
+    # Only the delta of the latest generation can be asked for again
+    for generation in [g for g in _deltas if g < _generation]:
+        del _deltas[generation]
+
+    delta = FactStore(Fact(*triple) for triple in _deltas[delta_generation][shard::shards])
+    derived = set()
+    for _rule in _rules:
+        derived.update(_rule.compiled().fire(_replica, delta))
+    return os.getpid(), _generation, [(f.entity, f.attribute, f.value) for f in derived if f not in _replica]
+
+
+def parallel_infer(kb, workers: Optional[int] = None) -> None:
+    """Saturates a knowledge base using a pool of worker processes.
+
+    The resulting facts are the same as with sequential semi-naive inference.
+    """
+    # Imported here: multiprocessing would slow down the start of every program using clyps
+    from concurrent.futures import ProcessPoolExecutor
+
+    if not kb.rules:
+        return
+    workers = workers or os.cpu_count() or 1
+    # Rules without conditions only fire once, and no shard would wake them up
+    for _rule in kb.rules:
+        if not _rule.conditions:
+            for action in _rule.actions:
+                kb._add_derived(action)
+    triples = [(f.entity, f.attribute, f.value) for f in kb.facts]
+    # Facts derived in each generation, until every worker has seen them
+    log: Dict[int, List[Triple]] = {}
+    seen: Dict[int, int] = {}
+    generation = 0
+    size = len(triples)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(kb.rules, triples)) as pool:
+        while size:
+            # Workers that never ran a task still need the whole log
+            floor = min(seen.values()) if len(seen) == workers else 0
+            updates = sorted((g, facts) for g, facts in log.items() if g > floor)
+            # One task per worker, even with fewer facts than workers, keeps every replica up to date
+            futures = [pool.submit(_match_shard, generation, shard, workers, updates) for shard in range(workers)]
+            new_facts = FactStore()
+            for future in futures:
+                pid, worker_generation, derived = future.result()
+                seen[pid] = worker_generation
+                for triple in derived:
+                    fact = Fact(*triple)
+                    if fact not in kb.facts:
+                        new_facts.add(fact)
+            for generation_floor in [g for g in log if g <= floor]:
+                del log[generation_floor]
+            for fact in new_facts:
+                kb._add_derived(fact)
+            generation += 1
+            log[generation] = [(f.entity, f.attribute, f.value) for f in new_facts]
+            size = len(new_facts)
@@ -0,0 +1,273 @@
+"""Single-pass lexer and recursive-descent parser for CLIPS-style sources.
+
+A source is a sequence of top-level forms::
+
+    ; comments run to the end of the line
+    (dog has hair)                                  ; a fact
+    (assert (cat has hair) (cat is vertebrate))     ; several facts
+    (deffacts animals (cow has hair) (cow gives milk))
+    (defrule mammalRule (?x has hair) => (?x is mammal))
+    (defrule urgent (declare (salience 10)) (?x is sick) => (?x needs vet))
+
+Rule actions may also be wrapped in ``(assert ...)``.
+"""
+import re
+from typing import IO, Iterator, List, Optional, Tuple, Union
+
+from .fact import Fact
+from .rule import Rule
+
+_SYMBOL = r'[^\s();"]+|"(?:[^"\\\n]|\\.)*"'
+# Whitespace and comments between tokens
+_SKIP = re.compile(r"(?:\s+|;[^\n]*)*")
+_TOKEN = re.compile(r'(\()|(\))|("(?:[^"\\\n]|\\.)*")|([^\s();"]+)|(")')
+# Fast path for the most common form, a fact written on its own
+_FACT = re.compile(rf"\(\s*({_SYMBOL})\s+({_SYMBOL})\s+({_SYMBOL})\s*\)")
+_NEXT_FACT = re.compile(rf"(?:\s+|;[^\n]*)*{_FACT.pattern}")
+_DECLARE = re.compile(r"\(\s*declare[\s()]")
+
+LPAREN, RPAREN, STRING, SYMBOL, ERROR = range(1, 6)
+
+Token = Tuple[int, str, int]
+
+
+class ParseError(ValueError):
+    """Syntax error in a CLIPS-style source, with its line and column (1-based)."""
+
+    def __init__(self, message: str, line: int, column: int):
+        super().__init__(f"{message} at line {line}, column {column}")
+        self.message = message
+        self.line = line
+        self.column = column
+
+
+def tokenize(text: str) -> Iterator[Token]:
+    """Yields (kind, text, offset) tokens, skipping whitespace and comments."""
+    position = _SKIP.match(text, 0).end()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match.lastindex == ERROR:
+            raise _error(text, position, "Unterminated string")
+        yield match.lastindex, match.group(match.lastindex), position
+        position = _SKIP.match(text, match.end()).end()
+
+
+def _error(text: str, offset: int, message: str) -> ParseError:
+    line = text.count("\n", 0, offset) + 1
+    column = offset - text.rfind("\n", 0, offset)
+    return ParseError(message, line, column)
+
+
+class Parser:
+    """Recursive-descent parser that scans a source text once.
+
+    The parser keeps a position in the text and reads one token at a time
+    with anchored regular expressions; facts are recognised in one step.
+    Line and column numbers are only computed when an error is reported.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self._position = 0
+        self._current: Optional[Token] = None
+        self._advance()
+
+    def _advance(self) -> Optional[Token]:
+        previous = self._current
+        text = self.text
+        position = _SKIP.match(text, self._position).end()
+        if position >= len(text):
+            self._current = None
+            self._position = position
+            return previous
+        match = _TOKEN.match(text, position)
+        if match.lastindex == ERROR:
+            raise _error(text, position, "Unterminated string")
+        self._current = (match.lastindex, match.group(match.lastindex), position)
+        self._position = match.end()
+        return previous
+
+    def _fast_fact(self) -> Optional[Fact]:
+        """Reads a whole fact at the current '(' token, if it is a plain one."""
+        if self._current is None or self._current[0] != LPAREN:
+            return None
+        match = _FACT.match(self.text, self._current[2])
+        if match is None:
+            return None
+        self._position = match.end()
+        self._advance()
+        return Fact(*match.groups())
+
+    def _error(self, message: str) -> ParseError:
+        offset = len(self.text) if self._current is None else self._current[2]
+        return _error(self.text, offset, message)
+
+    def _expect(self, kind: int, what: str) -> Token:
+        if self._current is None or self._current[0] != kind:
+            found = "end of input" if self._current is None else repr(self._current[1])
+            raise self._error(f"Expected {what}, found {found}")
+        return self._advance()
+
+    def _symbol(self, what: str) -> str:
+        if self._current is not None and self._current[0] in (SYMBOL, STRING):
+            return self._advance()[1]
+        found = "end of input" if self._current is None else repr(self._current[1])
+        raise self._error(f"Expected {what}, found {found}")
+
+    def _at(self, kind: int) -> bool:
+        return self._current is not None and self._current[0] == kind
+
+    def at_end(self) -> bool:
+        return self._current is None
+
+    def items(self) -> Iterator[Union[Fact, Rule]]:
+        """Parses top-level forms until the end of the text."""
+        text = self.text
+        next_fact = _NEXT_FACT.match
+        while self._current is not None:
+            # Runs of plain facts are read without going through tokens
+            position = self._current[2]
+            match = next_fact(text, position)
+            if match is None:
+                yield from self.form()
+                continue
+            while match is not None:
+                yield Fact(*match.groups())
+                position = match.end()
+                match = next_fact(text, position)
+            self._position = position
+            self._advance()
+
+    def form(self) -> List[Union[Fact, Rule]]:
+        """form := defrule | deffacts | assert | fact"""
+        self._expect(LPAREN, "'('")
+        keyword = self._current[1] if self._current is not None and self._current[0] == SYMBOL else None
+        if keyword == "defrule":
+            self._advance()
+            return [self._defrule_body()]
+        if keyword == "deffacts":
+            self._advance()
+            self._symbol("deffacts name")
+            return self._facts_until_close()
+        if keyword == "assert":
+            self._advance()
+            return self._facts_until_close()
+        return [self._fact_body()]
+
+    def fact(self) -> Fact:
+        """fact := '(' symbol symbol symbol ')'"""
+        fact = self._fast_fact()
+        if fact is not None:
+            return fact
+        self._expect(LPAREN, "'('")
+        return self._fact_body()
+
+    def _fact_body(self) -> Fact:
+        entity = self._symbol("fact entity")
+        attribute = self._symbol("fact attribute")
+        value = self._symbol("fact value")
+        self._expect(RPAREN, "')' closing the fact")
+        return Fact(entity, attribute, value)
+
+    def _facts_until_close(self) -> List[Fact]:
+        facts = []
+        while not self._at(RPAREN):
+            facts.append(self.fact())
+        self._advance()
+        return facts
+
+    def rule(self) -> Rule:
+        """rule := '(' 'defrule' name condition* '=>' action* ')'"""
+        self._expect(LPAREN, "'('")
+        if self._current is None or self._current[1] != "defrule":
+            raise self._error("Expected 'defrule'")
+        self._advance()
+        return self._defrule_body()
+
+    def _defrule_body(self) -> Rule:
+        if not self._at(SYMBOL):
+            raise self._error("Rule name not found!")
+        name = self._advance()[1]
+        if self._at(STRING):
+            # Optional documentation string
+            self._advance()
+        salience = 0
+        if self._at(LPAREN) and _DECLARE.match(self.text, self._current[2]):
+            salience = self._declare()
+        conditions = []
+        while not (self._at(SYMBOL) and self._current[1] == "=>"):
+            if self._current is None or self._at(RPAREN):
+                raise self._error("Expected '=>' in rule")
+            conditions.append(self.fact())
+        self._advance()
+        actions: List[Fact] = []
+        while not self._at(RPAREN):
+            if self._current is None:
+                raise self._error("Expected ')' closing the rule")
+            self._expect(LPAREN, "'('")
+            if self._at(SYMBOL) and self._current[1] == "assert":
+                self._advance()
+                actions.extend(self._facts_until_close())
+            else:
+                actions.append(self._fact_body())
+        self._advance()
+        return Rule(name, conditions, actions, salience)
+
+    def _declare(self) -> int:
+        """declare := '(' 'declare' '(' 'salience' integer ')' ')'"""
+        self._expect(LPAREN, "'('")
+        self._advance()
+        salience = 0
+        while not self._at(RPAREN):
+            self._expect(LPAREN, "'('")
+            if not (self._at(SYMBOL) and self._current[1] == "salience"):
+                raise self._error("Expected 'salience'")
+            self._advance()
+            if self._current is None or not re.fullmatch(r"[+-]?\d+", self._current[1]):
+                raise self._error("Expected an integer salience")
+            salience = int(self._advance()[1])
+            self._expect(RPAREN, "')' closing the property")
+        self._advance()
+        return salience
+
+
+def parse(text: str) -> List[Union[Fact, Rule]]:
+    """Parses a whole source text into facts and rules, in source order."""
+    return list(Parser(text).items())
+
+
+def parse_file(source: Union[str, IO[str]]) -> List[Union[Fact, Rule]]:
+    """Parses a source file, given as a path or as a text stream."""
+    if hasattr(source, "read"):
+        return parse(source.read())
+    with open(source, encoding="utf-8") as stream:
+        return parse(stream.read())
+
+
+def parse_fact(text: str) -> Fact:
+    """Parses a single fact such as ``(dog has hair)``."""
+    match = _FACT.fullmatch(text.strip())
+    if match is not None:
+        return Fact(*match.groups())
+    parser = Parser(text)
+    fact = parser.fact()
+    if not parser.at_end():
+        raise parser._error("Unexpected text after the fact")
+    return fact
+
+
+def parse_rule(text: str) -> Rule:
+    """Parses a single ``defrule``."""
+    parser = Parser(text)
+    rule = parser.rule()
+    if not parser.at_end():
+        raise parser._error("Unexpected text after the rule")
+    return rule
+
+
+def format_rule(rule: Rule) -> str:
+    """Writes a rule back in the syntax read by :func:`parse_rule`."""
+    conditions = " ".join(map(repr, rule.conditions))
+    actions = " ".join(map(repr, rule.actions))
+    declare = f" (declare (salience {rule.salience}))" if rule.salience else ""
+    return f"(defrule {rule.name}{declare} {conditions} => {actions})"
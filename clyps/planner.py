@@ -0,0 +1,155 @@
+"""Join planning for the conditions of a rule.
+
+Conditions are evaluated in order of selectivity instead of in the order they
+were written. Each condition is looked up in the fact store with the variables
+bound so far substituted in, so the (entity, attribute) and (attribute, value)
+indexes act as hash tables keyed on the shared variables, and bindings stream
+through the nested lookups without materialising intermediate results.
+"""
+import itertools
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from .fact import Fact
+from .store import FactStore
+
+
+def is_variable(term: str) -> bool:
+    return term.startswith("?")
+
+
+def match_condition(fact: Fact, condition: Fact) -> Optional[Dict[str, str]]:
+    """Returns the bindings that make a condition match a fact, or None.
+
+    Variables can only be bound to constants, and a variable used twice in the
+    same condition must be bound to the same value.
+    """
+    bindings = {}
+    if is_variable(condition.entity):
+        if is_variable(fact.entity):
+            return None
+        bindings[condition.entity] = fact.entity
+    elif condition.entity != fact.entity:
+        return None
+    if condition.attribute != fact.attribute:
+        return None
+    if is_variable(condition.value):
+        if is_variable(fact.value):
+            return None
+        if bindings.get(condition.value, fact.value) != fact.value:
+            return None
+        bindings[condition.value] = fact.value
+    elif condition.value != fact.value:
+        return None
+    return bindings
+
+
+def _variables(condition: Fact) -> Set[str]:
+    return {term for term in (condition.entity, condition.value) if is_variable(term)}
+
+
+def _estimate(store: FactStore, condition: Fact) -> int:
+    """Number of facts an index lookup for the condition's constants returns."""
+    candidates = store.candidates(condition)
+    return len(candidates) if hasattr(candidates, "__len__") else len(list(candidates))
+
+
+def plan(conditions: Sequence[Fact], store: FactStore, first: Optional[int] = None,
+         bound: Iterable[str] = ()) -> List[int]:
+    """Orders the conditions of a rule for evaluation.
+
+    Conditions with fewer unbound variables go first, which keeps joins
+    connected through shared variables; ties are broken by the number of
+    candidate facts and then by the written order. ``first`` forces the
+    condition evaluated first (used to start from the delta in semi-naive
+    evaluation) and ``bound`` lists variables that are bound beforehand.
+    """
+    remaining = list(range(len(conditions)))
+    order: List[int] = []
+    bound = set(bound)
+    sizes = [_estimate(store, condition) for condition in conditions]
+    if first is not None:
+        remaining.remove(first)
+        order.append(first)
+        bound |= _variables(conditions[first])
+    while remaining:
+        best = min(remaining, key=lambda i: (len(_variables(conditions[i]) - bound), sizes[i], i))
+        remaining.remove(best)
+        order.append(best)
+        bound |= _variables(conditions[best])
+    return order
+
+
+def join(conditions: Sequence[Fact], store: FactStore, delta: Optional[FactStore] = None,
+         bindings: Optional[Dict[str, str]] = None) -> Iterator[Tuple[Dict[str, str], Tuple[Fact, ...]]]:
+    """Yields every (bindings, facts) pair that satisfies all the conditions.
+
+    ``facts`` holds the fact matched by each condition, in condition order.
+    If ``delta`` (a subset of ``store``) is given, only the matches that use
+    at least one delta fact are produced, each of them exactly once.
+    ``bindings`` fixes the value of some variables before joining.
+    """
+    if not conditions:
+        return
+    bindings = dict(bindings or {})
+    matched: List[Optional[Fact]] = [None] * len(conditions)
+    if delta is None:
+        order = plan(conditions, store, bound=bindings)
+        yield from _join(conditions, order, 0, store, None, None, bindings, matched)
+        return
+    if not delta:
+        return
+    # Each match is produced with its first delta condition as pivot
+    for pivot in range(len(conditions)):
+        order = plan(conditions, store, first=pivot, bound=bindings)
+        yield from _join(conditions, order, 0, store, delta, pivot, bindings, matched)
+
+
+def _join(conditions: Sequence[Fact], order: List[int], depth: int, store: FactStore,
+          delta: Optional[FactStore], pivot: Optional[int], bindings: Dict[str, str],
+          matched: List[Optional[Fact]]) -> Iterator[Tuple[Dict[str, str], Tuple[Fact, ...]]]:
+    if depth == len(order):
+        yield dict(bindings), tuple(matched)
+        return
+
+    index = order[depth]
+    condition = conditions[index]
+    # Substitute the variables bound so far to use the narrowest index
+    pattern = Fact(
+        bindings.get(condition.entity, condition.entity),
+        condition.attribute,
+        bindings.get(condition.value, condition.value),
+    )
+    candidates: Iterable[Fact] = delta.candidates(pattern) if index == pivot else store.candidates(pattern)
+    for fact in candidates:
+        if pivot is not None and index < pivot and fact in delta:
+            continue
+        local_bindings = match_condition(fact, condition)
+        if local_bindings is None:
+            continue
+        if any(bindings.get(k, v) != v for k, v in local_bindings.items()):
+            continue
+        matched[index] = fact
+        yield from _join(conditions, order, depth + 1, store, delta, pivot, {**bindings, **local_bindings}, matched)
+
+
+def query(store: FactStore, patterns: Iterable, limit: Optional[int] = None,
+          offset: int = 0) -> Iterator[Dict[str, str]]:
+    """Streams the bindings of the facts of a store that match all the patterns.
+
+    Patterns are :class:`Fact` objects or strings holding one or more fact
+    patterns. ``offset`` results are skipped and at most ``limit`` returned.
+    """
+    from .parser import parse
+
+    conditions: List[Fact] = []
+    for pattern in patterns:
+        if isinstance(pattern, Fact):
+            conditions.append(pattern)
+            continue
+        for item in parse(pattern):
+            if not isinstance(item, Fact):
+                raise ValueError(f"Not a fact pattern: {item}")
+            conditions.append(item)
+    results = (bindings for bindings, _ in join(conditions, store))
+    stop = None if limit is None else offset + limit
+    return itertools.islice(results, offset, stop)
@@ -0,0 +1,295 @@
+"""Rete network used by :class:`~clyps.kb.KnowledgeBase` when ``engine="rete"``.
+
+Every condition pattern gets an alpha memory holding the facts that pass its
+constant tests. Rules are compiled into chains of join nodes; rules whose
+conditions start with the same patterns share the join nodes of that common
+prefix. Asserting a fact only propagates tokens through the nodes it reaches,
+so the work done per fact is proportional to the matches it takes part in.
+"""
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .fact import Fact
+from .rule import Rule
+
+
+def _is_variable(term: str) -> bool:
+    return term.startswith("?")
+
+
+def _canonical_conditions(conditions: List[Fact]) -> Tuple[List[Tuple[str, str, str]], Dict[str, str]]:
+    """Renames the variables of a rule in order of appearance (?0, ?1, ...).
+
+    Two rules whose conditions only differ in variable names get the same
+    canonical conditions, which is what allows them to share join nodes.
+    Returns the canonical triples and the mapping canonical name -> rule name.
+    """
+    names: Dict[str, str] = {}
+    canonical = []
+    for condition in conditions:
+        terms = []
+        for term in (condition.entity, condition.attribute, condition.value):
+            if _is_variable(term):
+                if term not in names:
+                    names[term] = f"?{len(names)}"
+                term = names[term]
+            terms.append(term)
+        canonical.append(tuple(terms))
+    return canonical, {v: k for k, v in names.items()}
+
+
+class Token:
+    """A partial match: the facts matched so far and the resulting bindings."""
+
+    __slots__ = ("parent", "fact", "bindings", "node", "children")
+
+    def __init__(self, parent: Optional["Token"], fact: Optional[Fact], bindings: Dict[str, str],
+                 node: Optional["JoinNode"] = None):
+        self.parent = parent
+        self.fact = fact
+        self.bindings = bindings
+        self.node = node
+        self.children: Dict[Token, None] = {}
+
+    def facts(self) -> List[Fact]:
+        """Returns the facts of the match, in condition order."""
+        facts = []
+        token = self
+        while token is not None and token.fact is not None:
+            facts.append(token.fact)
+            token = token.parent
+        facts.reverse()
+        return facts
+
+
+class AlphaMemory:
+    """Facts matching the constant part of a condition pattern."""
+
+    def __init__(self, entity: Optional[str], attribute: str, value: Optional[str], same: bool):
+        self.entity = entity
+        self.attribute = attribute
+        self.value = value
+        self.same = same
+        self.facts: Dict[Tuple[str, str, str], Fact] = {}
+        self.successors: List["JoinNode"] = []
+
+    def test(self, fact: Fact) -> bool:
+        if self.entity is None:
+            # Variables can only be bound to constants
+            if _is_variable(fact.entity):
+                return False
+        elif fact.entity != self.entity:
+            return False
+        if self.value is None:
+            if _is_variable(fact.value):
+                return False
+        elif fact.value != self.value:
+            return False
+        return not self.same or fact.entity == fact.value
+
+    def activate(self, key: Tuple[str, str, str], fact: Fact) -> None:
+        self.facts[key] = fact
+        for node in self.successors:
+            node.right_activate(fact)
+
+    def retract(self, key: Tuple[str, str, str]) -> None:
+        fact = self.facts.pop(key, None)
+        if fact is not None:
+            for node in self.successors:
+                node.right_retract(fact)
+
+
+class JoinNode:
+    """Joins the tokens of its parent with the facts of an alpha memory.
+
+    Both inputs are hashed on the values of the variables the condition shares
+    with the earlier conditions, so each activation only visits compatible
+    partners.
+    """
+
+    def __init__(self, network: "ReteNetwork", parent: Optional["JoinNode"], alpha: AlphaMemory,
+                 condition: Tuple[str, str, str], bound: frozenset):
+        self.network = network
+        self.parent = parent
+        self.alpha = alpha
+        # Positions (0 = entity, 2 = value) that bind a variable
+        self.slots = [(pos, term) for pos, term in ((0, condition[0]), (2, condition[2])) if _is_variable(term)]
+        self.join_vars = tuple(dict.fromkeys(term for _, term in self.slots if term in bound))
+        self.new_vars = [(pos, term) for pos, term in self.slots if term not in bound]
+        positions = {term: pos for pos, term in self.slots}
+        self.join_positions = tuple(positions[var] for var in self.join_vars)
+        self.left_index: Dict[tuple, Dict[Token, None]] = {}
+        self.right_index: Dict[tuple, Dict[Tuple[str, str, str], Fact]] = {}
+        self.tokens_by_fact: Dict[Tuple[str, str, str], List[Token]] = {}
+        self.children: List[JoinNode] = []
+        self.terminals: List[TerminalNode] = []
+
+    def _fact_key(self, fact: Fact) -> tuple:
+        terms = (fact.entity, fact.attribute, fact.value)
+        return tuple(terms[pos] for pos in self.join_positions)
+
+    def right_activate(self, fact: Fact) -> None:
+        key = self._fact_key(fact)
+        self.right_index.setdefault(key, {})[_triple(fact)] = fact
+        if self.parent is None:
+            self._emit(self.network.root, fact)
+        else:
+            for token in list(self.left_index.get(key, ())):
+                self._emit(token, fact)
+
+    def left_activate(self, token: Token) -> None:
+        key = tuple(token.bindings[var] for var in self.join_vars)
+        self.left_index.setdefault(key, {})[token] = None
+        for fact in list(self.right_index.get(key, {}).values()):
+            self._emit(token, fact)
+
+    def _emit(self, parent: Token, fact: Fact) -> None:
+        bindings = dict(parent.bindings)
+        terms = (fact.entity, fact.attribute, fact.value)
+        for pos, var in self.new_vars:
+            bindings[var] = terms[pos]
+        token = Token(parent, fact, bindings, self)
+        parent.children[token] = None
+        self.tokens_by_fact.setdefault(_triple(fact), []).append(token)
+        for child in self.children:
+            child.left_activate(token)
+        for terminal in self.terminals:
+            terminal.activate(token)
+
+    def right_retract(self, fact: Fact) -> None:
+        key = self._fact_key(fact)
+        bucket = self.right_index.get(key)
+        if bucket is not None:
+            bucket.pop(_triple(fact), None)
+            if not bucket:
+                del self.right_index[key]
+        for token in self.tokens_by_fact.pop(_triple(fact), []):
+            self._drop_children(token)
+            token.parent.children.pop(token, None)
+
+    def left_retract(self, token: Token) -> None:
+        key = tuple(token.bindings[var] for var in self.join_vars)
+        bucket = self.left_index.get(key)
+        if bucket is not None:
+            bucket.pop(token, None)
+            if not bucket:
+                del self.left_index[key]
+
+    def _drop_children(self, token: Token) -> None:
+        """Removes a token of this node and everything built on top of it."""
+        for child in self.children:
+            child.left_retract(token)
+        for terminal in self.terminals:
+            terminal.retract(token)
+        for child_token in token.children:
+            node = child_token.node
+            tokens = node.tokens_by_fact.get(_triple(child_token.fact), [])
+            if child_token in tokens:
+                tokens.remove(child_token)
+            node._drop_children(child_token)
+        token.children = {}
+
+
+class TerminalNode:
+    """Turns the complete matches of a rule into pending activations."""
+
+    def __init__(self, network: "ReteNetwork", rule: Rule, names: Dict[str, str]):
+        self.network = network
+        self.rule = rule
+        self.names = names
+
+    def activate(self, token: Token) -> None:
+        bindings = {self.names[var]: value for var, value in token.bindings.items()}
+        self.network.agenda[(self, token)] = (self.rule, bindings)
+
+    def retract(self, token: Token) -> None:
+        self.network.agenda.pop((self, token), None)
+
+
+def _triple(fact: Fact) -> Tuple[str, str, str]:
+    return fact.entity, fact.attribute, fact.value
+
+
+class ReteNetwork:
+    """Discrimination network built from a list of rules."""
+
+    def __init__(self, rules: List[Rule]):
+        self.root = Token(None, None, {})
+        self.facts: Dict[Tuple[str, str, str], Fact] = {}
+        self.alpha_memories: Dict[tuple, AlphaMemory] = {}
+        self.alpha_by_attribute: Dict[str, List[AlphaMemory]] = {}
+        self.join_nodes: Dict[tuple, JoinNode] = {}
+        self.agenda: "OrderedDict[tuple, Tuple[Rule, Dict[str, str]]]" = OrderedDict()
+        for rule in rules:
+            self.add_rule(rule)
+
+    def _alpha_memory(self, condition: Tuple[str, str, str]) -> AlphaMemory:
+        entity, attribute, value = condition
+        key = (
+            None if _is_variable(entity) else entity,
+            attribute,
+            None if _is_variable(value) else value,
+            _is_variable(entity) and entity == value,
+        )
+        memory = self.alpha_memories.get(key)
+        if memory is None:
+            memory = AlphaMemory(*key)
+            self.alpha_memories[key] = memory
+            self.alpha_by_attribute.setdefault(attribute, []).append(memory)
+        return memory
+
+    def add_rule(self, rule: Rule) -> None:
+        """Adds the nodes of a rule, reusing the join nodes of shared prefixes.
+
+        Rules must be added before any fact is asserted. A rule without
+        conditions is activated once, right away.
+        """
+        conditions, names = _canonical_conditions(rule.conditions)
+        if not conditions:
+            self.agenda[(TerminalNode(self, rule, names), self.root)] = (rule, {})
+            return
+        parent = None
+        bound: set = set()
+        for i, condition in enumerate(conditions):
+            prefix = tuple(conditions[: i + 1])
+            node = self.join_nodes.get(prefix)
+            if node is None:
+                alpha = self._alpha_memory(condition)
+                node = JoinNode(self, parent, alpha, condition, frozenset(bound))
+                alpha.successors.append(node)
+                if parent is not None:
+                    parent.children.append(node)
+                self.join_nodes[prefix] = node
+            bound.update(term for term in (condition[0], condition[2]) if _is_variable(term))
+            parent = node
+        parent.terminals.append(TerminalNode(self, rule, names))
+
+    def add_fact(self, fact: Fact) -> bool:
+        """Propagates a new fact. Returns False if the fact was already known."""
+        key = _triple(fact)
+        if key in self.facts:
+            return False
+        self.facts[key] = fact
+        for memory in self.alpha_by_attribute.get(fact.attribute, ()):
+            if memory.test(fact):
+                memory.activate(key, fact)
+        return True
+
+    def remove_fact(self, fact: Fact) -> bool:
+        """Removes a fact and every partial match that used it."""
+        key = _triple(fact)
+        if self.facts.pop(key, None) is None:
+            return False
+        for memory in self.alpha_by_attribute.get(fact.attribute, ()):
+            memory.retract(key)
+        return True
+
+    def activations(self) -> Iterator[Tuple[Rule, Dict[str, str]]]:
+        """Pops pending activations in the order they were created.
+
+        Activations created while the caller consumes the iterator are
+        yielded too, so the loop ends when the network is quiescent.
+        """
+        while self.agenda:
+            _, activation = self.agenda.popitem(last=False)
+            yield activation
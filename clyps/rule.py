@@ -1,17 +1,61 @@
-import itertools
 import re
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from .fact import Fact
+from .compiler import CompiledRule
+from .planner import match_condition
+from .store import as_store
+
+
+class _Facts(tuple):
+    """Immutable sequence of facts that also compares equal to a list of the same facts."""
+
+    __slots__ = ()
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, list):
+            return list(self) == other
+        return tuple.__eq__(self, other)
+
+    def __ne__(self, other: object) -> bool:
+        return not self == other
+
+    __hash__ = tuple.__hash__
 
 
 class Rule:
-    """Represents a rule with conditions and actions."""
+    """Represents a rule with conditions and actions.
 
-    def __init__(self, name, conditions, actions):
+    Rules with a higher ``salience`` fire first with the agenda engine. The
+    conditions and actions cannot be changed once the rule is created.
+    """
+
+    def __init__(self, name, conditions, actions, salience: int = 0):
         self.name = name
-        self.conditions = conditions
-        self.actions = actions
+        self._conditions = _Facts(conditions)
+        self._actions = _Facts(actions)
+        self.salience = salience
+        self._compiled: Optional[CompiledRule] = None
+
+    @property
+    def conditions(self) -> Tuple[Fact, ...]:
+        return self._conditions
+
+    @property
+    def actions(self) -> Tuple[Fact, ...]:
+        return self._actions
+
+    def compiled(self) -> CompiledRule:
+        """Returns the compiled form of the rule, compiling it on first use."""
+        if self._compiled is None:
+            self._compiled = CompiledRule(self._conditions, self._actions)
+        return self._compiled
+
+    def __getstate__(self):
+        # Generated match functions cannot be pickled; they are rebuilt on use
+        state = self.__dict__.copy()
+        state["_compiled"] = None
+        return state
 
     @staticmethod
     def extract_parts(s):
@@ -53,13 +97,12 @@ class Rule:
     @classmethod
     def from_string(cls, rule_string):
         """Parses a rule from a string.
-        Example: (defrule mammalRule (animal has hair) => (animal is mammal))"""
-        rule_name, conditions_str, actions_str = Rule.parse_rule_parts(rule_string)
-        conditions, actions = Rule.parse_rule_conditions_and_actions(
-            conditions_str, actions_str
-        )
+        Example: (defrule mammalRule (animal has hair) => (animal is mammal))
+        Raises :class:`clyps.parser.ParseError` (a ValueError) on syntax errors."""
+        from .parser import parse_rule
 
-        return cls(rule_name, conditions, actions)
+        rule = parse_rule(rule_string)
+        return rule if cls is Rule else cls(rule.name, rule.conditions, rule.actions, rule.salience)
 
     def __eq__(self, other):
         if not isinstance(other, Rule):
@@ -75,36 +118,34 @@ class Rule:
         actions_str = ", ".join(map(str, self.actions))
         return f"({conditions_str} => {actions_str})"
 
-    def match(self, facts: List[Fact]) -> List[Dict[str, Any]]:
-        all_bindings = []  # Lista para almacenar todos los sets de bindings encontrados
-
-        # Generar todas las combinaciones posibles de hechos (para manejar múltiples coincidencias)
-        for fact_combination in itertools.combinations(facts, len(self.conditions)):
-            bindings = {}
-            matched_conditions = 0  # Contador de condiciones coincidentes
-
-            # Para cada condición en la regla:
-            for condition, fact in zip(self.conditions, fact_combination):
-                local_bindings = self._match_condition(fact, condition)
-
-                # Si el hecho coincide con la condición
-                if local_bindings is not None:
-                    # Verificar que no se estén sobrescribiendo los bindings existentes
-                    conflicting_bindings = any(
-                        k in bindings and bindings[k] != v
-                        for k, v in local_bindings.items()
-                    )
-                    if not conflicting_bindings:
-                        bindings.update(local_bindings)
-                        matched_conditions += 1
-                    else:
-                        break  # Rompe el bucle si hay conflictos, y no considerar esta combinación
-
-            # Si todas las condiciones coinciden, añadir los bindings a la lista
-            if matched_conditions == len(self.conditions) and bindings:
-                all_bindings.append(bindings)
-
-        return all_bindings
+    def match(self, facts: Iterable[Fact], delta: Optional[Iterable[Fact]] = None,
+              stats=None) -> List[Dict[str, Any]]:
+        """Returns every set of bindings for which the conditions are met.
+
+        Conditions are joined in the order chosen by :func:`clyps.planner.plan`
+        through the indexes of a :class:`~clyps.store.FactStore`, using the
+        match functions generated by :meth:`compiled`; plain lists are indexed
+        first. Unlike the original matching over combinations of distinct
+        facts taken in list order, the same fact may match several conditions
+        and the order of the facts does not matter, as in CLIPS.
+
+        If ``delta`` is given (a subset of ``facts``), only the matches that use
+        at least one fact of ``delta`` are returned.
+
+        If ``stats`` (a :class:`~clyps.stats.RuleStats`) is given, the
+        combinations examined, condition tests and bindings are counted in it.
+        """
+        return [bindings for bindings, _ in self.iter_matches(facts, delta, stats) if bindings]
+
+    def iter_matches(self, facts: Iterable[Fact], delta: Optional[Iterable[Fact]] = None,
+                     stats=None) -> Iterator[Tuple[Dict[str, str], Tuple[Fact, ...]]]:
+        """Streams (bindings, matched facts) pairs; see :meth:`match`."""
+        store = as_store(facts)
+        if delta is not None:
+            delta = as_store(delta)
+        compiled = self.compiled()
+        for values, matched in compiled.matches(store, delta, stats):
+            yield compiled.bindings(values), matched
 
     def _match_condition(self, fact: Fact, condition: Fact) -> Optional[Dict[str, str]]:
         """
@@ -112,26 +153,4 @@ class Rule:
         Example: (dog has hair) matches (?animal has hair)
         If condition starts with ? it is a variable and will be bound to the fact value.
         """
-        bindings = {}  # Make a dictionary to store variable bindings
-        if condition.entity.startswith("?"):  # If the condition entity is a variable
-            if fact.entity.startswith("?"):  # If the fact entity is also a variable
-                return None  # We can't match two variables
-            # Bind the condition variable to the fact entity
-            bindings[condition.entity] = fact.entity
-        # If the condition entity is not a variable, it must match the fact entity
-        elif condition.entity != fact.entity:
-            return None  # If they don't match, the fact doesn't match the condition
-        # If the condition attribute doesn't match the fact attribute
-        if condition.attribute != fact.attribute:
-            return None  # The fact doesn't match the condition
-
-        if condition.value.startswith("?"):  # If the condition value is a variable
-            if fact.value.startswith("?"):  # If the fact value is also a variable
-                return None  # We can't match two variables
-            # Bind the condition variable to the fact value
-            bindings[condition.value] = fact.value
-        # If the condition value is not a variable, it must match the fact value
-        elif condition.value != fact.value:
-            return None  # If they don't match, the fact doesn't match the condition
-
-        return bindings  # If we get here, the fact matches the condition, so return the variable bindings
+        return match_condition(fact, condition)
@@ -0,0 +1,196 @@
+"""One rule set evaluated against many small, independent fact sets.
+
+A :class:`RuleSet` parses and compiles its rules once and saturates the
+background facts of its source once. :meth:`RuleSet.run` then infers the
+facts of one batch (e.g. one customer record) on top of those, without the
+setup of a :class:`~clyps.kb.KnowledgeBase`: a batch gets a copy-on-write
+layer over the background facts (see :mod:`clyps.overlay`) and semi-naive
+evaluation only wakes the rules that read the attributes of new facts.
+:meth:`RuleSet.run_many` does the same for a stream of batches, spread in
+chunks over a process pool.
+"""
+import os
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .depgraph import DependencyGraph
+from .fact import Fact
+from .overlay import OverlayFactStore
+from .parser import parse, parse_file
+from .planner import plan
+from .rule import Rule
+from .store import FactStore
+
+Triple = Tuple[str, str, str]
+
+# Rule set of a worker process
+_worker_rules: Optional["RuleSet"] = None
+
+
+class RuleSet:
+    """Rules and background facts shared by every batch they are run against.
+
+    ``facts`` are saturated with the rules when the rule set is created; the
+    results of :meth:`run` do not repeat them or the facts they derive. The
+    rules and facts must not change afterwards.
+    """
+
+    def __init__(self, rules: Iterable[Rule], facts: Iterable[Fact] = ()):
+        self.rules = list(rules)
+        graph = DependencyGraph(self.rules)
+        self._readers: Dict[str, List[int]] = graph.readers
+        self.facts = FactStore(facts)
+        # The background facts are saturated with the rules as they are
+        self._matchers: List[Optional[List[Tuple[str, Callable]]]] = [None] * len(self.rules)
+        self._saturate(self.facts, None, [])
+        self._prepare()
+
+    def _prepare(self) -> None:
+        """Plans the semi-naive joins of every rule once, instead of once per batch and round.
+
+        Batches are small, so the join orders only depend on the bound
+        variables of each condition and on the sizes of the background facts.
+        """
+        self._matchers = []
+        for _rule in self.rules:
+            compiled = _rule.compiled()
+            if not compiled.has_variables:
+                self._matchers.append(None)
+                continue
+            self._matchers.append([
+                (condition.attribute, compiled.matcher(tuple(plan(compiled.conditions, self.facts, first=pivot)), pivot))
+                for pivot, condition in enumerate(compiled.conditions)
+            ])
+
+    @classmethod
+    def loads(cls, text: str) -> "RuleSet":
+        """Creates a rule set from the rules and facts of a CLIPS-style source text."""
+        return cls._from_items(parse(text))
+
+    @classmethod
+    def load(cls, source) -> "RuleSet":
+        """Creates a rule set from a source file (a path or a text stream)."""
+        return cls._from_items(parse_file(source))
+
+    @classmethod
+    def _from_items(cls, items) -> "RuleSet":
+        return cls([item for item in items if isinstance(item, Rule)],
+                   [item for item in items if not isinstance(item, Rule)])
+
+    def run(self, facts: Iterable[Fact]) -> List[Fact]:
+        """Returns the facts the rules derive from a batch, in the order they are derived."""
+        store = OverlayFactStore(self.facts) if self.facts else FactStore()
+        delta = FactStore(fact for fact in facts if store.add(fact))
+        derived: List[Fact] = []
+        if delta:
+            self._saturate(store, delta, derived)
+        return derived
+
+    def _saturate(self, store, delta: Optional[FactStore], derived: List[Fact]) -> None:
+        """Runs semi-naive rounds from the facts of ``delta``, appending the new facts to ``derived``.
+
+        Every match without a delta fact must already be in the store. If
+        ``delta`` is None, the first round evaluates the rules over all the
+        facts.
+        """
+        woken: Iterable[int] = range(len(self.rules))
+        while True:
+            new_facts = FactStore()
+            for index in woken:
+                for fact in self._fire(index, store, delta):
+                    if fact not in store:
+                        new_facts.add(fact)
+            if not new_facts:
+                return
+            for fact in new_facts:
+                store.add(fact)
+            derived.extend(new_facts)
+            delta = new_facts
+            woken = sorted({index for attribute in {fact.attribute for fact in delta}
+                            for index in self._readers.get(attribute, ())})
+
+    def _fire(self, index: int, store, delta: Optional[FactStore]) -> Iterator[Fact]:
+        """Facts derived by one rule from the matches that use the delta."""
+        matchers = self._matchers[index] if delta is not None else None
+        if matchers is None:
+            yield from self.rules[index].compiled().fire(store, delta)
+            return
+        derive = self.rules[index].compiled().derive
+        for attribute, match in matchers:
+            if delta.lookup(None, attribute, None):
+                for values, _ in match(store.lookup, delta.lookup, delta, None):
+                    yield from derive(values)
+
+    def run_many(self, batches: Iterable[Iterable[Fact]], workers: Optional[int] = None,
+                 chunksize: int = 64) -> Iterator[List[Fact]]:
+        """Yields the result of :meth:`run` for every batch, in the order of the batches.
+
+        Batches are sent to a pool of ``workers`` processes (by default one
+        per CPU) in chunks of ``chunksize``. The batches are read lazily: at
+        most two chunks per worker are in flight, so ``batches`` can be an
+        unbounded stream. With ``workers=1`` the batches are run in this
+        process.
+        """
+        workers = workers or os.cpu_count() or 1
+        if workers == 1:
+            for batch in batches:
+                yield self.run(batch)
+            return
+        # Imported here: multiprocessing would slow down the start of every program using clyps
+        from concurrent.futures import ProcessPoolExecutor
+
+        chunks = _chunks(batches, chunksize)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self,)) as pool:
+            pending: Deque = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(_run_chunk, chunk))
+                if len(pending) >= 2 * workers:
+                    yield from _results(pending.popleft())
+            while pending:
+                yield from _results(pending.popleft())
+
+    def __getstate__(self):
+        # Generated match functions cannot be pickled; the facts are shipped
+        # to the workers as triples, which pickle faster
+        state = self.__dict__.copy()
+        del state["_matchers"]
+        state["facts"] = [(fact.entity, fact.attribute, fact.value) for fact in self.facts]
+        return state
+
+    def __setstate__(self, state) -> None:
+        self.__dict__.update(state)
+        self.facts = FactStore(Fact(*triple) for triple in state["facts"])
+        self._prepare()
+
+    def __repr__(self) -> str:
+        return f"RuleSet(rules={len(self.rules)}, facts={len(self.facts)})"
+
+
+def _chunks(batches: Iterable[Iterable[Fact]], size: int) -> Iterator[List[List[Triple]]]:
+    chunk: List[List[Triple]] = []
+    for batch in batches:
+        chunk.append([(fact.entity, fact.attribute, fact.value) for fact in batch])
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _results(future) -> Iterator[List[Fact]]:
+    for triples in future.result():
+        yield [Fact(*triple) for triple in triples]
+
+
+def _init_worker(rule_set: RuleSet) -> None:
+    global _worker_rules
+    _worker_rules = rule_set
+
+
+def _run_chunk(chunk: List[List[Triple]]) -> List[List[Triple]]:
+    """Worker task: runs the rule set against a chunk of batches."""
+    results = []
+    for triples in chunk:
+        derived = _worker_rules.run(Fact(*triple) for triple in triples)
+        results.append([(fact.entity, fact.attribute, fact.value) for fact in derived])
+    return results
@@ -0,0 +1,256 @@
+"""Network service sharing one knowledge base between many clients.
+
+The server speaks JSON lines over TCP or a Unix socket. Every request is a
+JSON object on its own line with an ``op`` and an optional ``id`` that is
+echoed in the responses::
+
+    {"id": 1, "op": "assert", "facts": ["(dog has hair)", ["cat", "has", "hair"]]}
+    {"id": 2, "op": "retract", "facts": ["(dog has hair)"]}
+    {"id": 3, "op": "run", "max_cycles": 100, "until": "(?x is mammal)"}
+    {"id": 4, "op": "query", "patterns": ["(?x is mammal)"], "limit": 10, "offset": 0}
+    {"id": 5, "op": "load", "source": "(defrule r (?x has hair) => (?x is mammal))"}
+
+Every request gets one final response, ``{"id": ..., "ok": true, ...}`` or
+``{"id": ..., "ok": false, "error": "..."}``. Query results are streamed
+before it, one ``{"id": ..., "bindings": {...}}`` line per result.
+
+Requests of one connection are handled in order; connections are served
+concurrently. Assertions arriving within ``batch_delay`` seconds of each
+other, from any client, are added together and followed by a single
+inference pass.
+"""
+import asyncio
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from .fact import Fact
+from .parser import parse_fact
+
+
+class KnowledgeBaseServer:
+    """Serves a :class:`~clyps.kb.KnowledgeBase` over the JSON lines protocol.
+
+    Access to the knowledge base is serialised with a lock. Changes and
+    inference run in the loop's default executor, so other connections are
+    still read and answered while they run; query results are streamed
+    while holding the lock, since the facts must not change under an open
+    query.
+    """
+
+    def __init__(self, kb, batch_delay: float = 0.002, chunk_size: int = 256):
+        self.kb = kb
+        self.batch_delay = batch_delay
+        self.chunk_size = chunk_size
+        self._lock = asyncio.Lock()
+        self._pending: List[tuple] = []
+        self._flusher: Optional[asyncio.Future] = None
+        self.batches = 0
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0, path: Optional[str] = None):
+        """Starts listening on a TCP port, or on a Unix socket if ``path`` is given."""
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle, path=path)
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serves one connection until the client closes it."""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                request_id = None
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("A request must be a JSON object")
+                    request_id = request.get("id")
+                    response = await self.dispatch(request, writer)
+                except Exception as error:
+                    response = {"ok": False, "error": str(error)}
+                response["id"] = request_id
+                _write(writer, response)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, request: Dict[str, Any], writer: asyncio.StreamWriter) -> Dict[str, Any]:
+        op = request.get("op")
+        if op == "assert":
+            added, derived = await self.assert_facts(_facts(request))
+            return {"ok": True, "added": added, "derived": derived}
+        if op == "retract":
+            facts = _facts(request)
+            async with self._lock:
+                before = len(self.kb.facts)
+                await _in_thread(_remove_facts, self.kb, facts)
+                return {"ok": True, "removed": before - len(self.kb.facts)}
+        if op == "run":
+            async with self._lock:
+                before = len(self.kb.facts)
+                await _in_thread(self.kb.infer, request.get("max_cycles"), request.get("until"))
+                return {"ok": True, "derived": len(self.kb.facts) - before}
+        if op == "query":
+            patterns = request.get("patterns") or [request["pattern"]]
+            count = 0
+            async with self._lock:
+                results = self.kb.query(*patterns, limit=request.get("limit"), offset=request.get("offset", 0))
+                for bindings in results:
+                    _write(writer, {"id": request.get("id"), "bindings": bindings})
+                    count += 1
+                    if count % self.chunk_size == 0:
+                        await writer.drain()
+            return {"ok": True, "count": count}
+        if op == "load":
+            async with self._lock:
+                await _in_thread(self.kb.loads, request["source"])
+                return {"ok": True, "facts": len(self.kb.facts), "rules": len(self.kb.rules)}
+        raise ValueError(f"Unknown op: {op!r}")
+
+    async def assert_facts(self, facts: List[Fact]):
+        """Adds facts as part of the next batch; returns (facts added, facts derived).
+
+        The derived count covers the whole batch the facts were part of.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((facts, future))
+        if self._flusher is None:
+            self._flusher = asyncio.ensure_future(self._flush())
+        return await future
+
+    async def _flush(self) -> None:
+        try:
+            await asyncio.sleep(self.batch_delay)
+            async with self._lock:
+                batch, self._pending = self._pending, []
+                try:
+                    counts, derived = await _in_thread(_add_batch, self.kb, [facts for facts, _ in batch])
+                    self.batches += 1
+                    for (_, future), added in zip(batch, counts):
+                        if not future.done():
+                            future.set_result((added, derived))
+                except Exception as error:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(error)
+        finally:
+            self._flusher = None
+        if self._pending:
+            self._flusher = asyncio.ensure_future(self._flush())
+
+
+def _add_batch(kb, batch: List[List[Fact]]) -> Tuple[List[int], int]:
+    """Adds the facts of a batch and runs inference; returns the facts added per request and derived."""
+    counts = []
+    for facts in batch:
+        added = 0
+        for fact in facts:
+            if fact not in kb.facts:
+                kb.add_fact(fact)
+                added += 1
+        counts.append(added)
+    before = len(kb.facts)
+    kb.infer()
+    return counts, len(kb.facts) - before
+
+
+def _remove_facts(kb, facts: List[Fact]) -> None:
+    for fact in facts:
+        kb.remove_fact(fact)
+
+
+async def _in_thread(function, *args):
+    """Runs a blocking call in the default executor of the running loop."""
+    return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+
+def _facts(request: Dict[str, Any]) -> List[Fact]:
+    items = request.get("facts")
+    if items is None:
+        items = [request["fact"]]
+    return [Fact(*item) if isinstance(item, list) else parse_fact(item) for item in items]
+
+
+def _write(writer: asyncio.StreamWriter, message: Dict[str, Any]) -> None:
+    writer.write(json.dumps(message).encode("utf-8") + b"\n")
+
+
+async def serve_forever(kb, host: str = "127.0.0.1", port: int = 7070, path: Optional[str] = None, **kwargs) -> None:
+    """Runs a server until it is cancelled."""
+    server = await KnowledgeBaseServer(kb, **kwargs).start(host, port, path)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if path is not None and os.path.exists(path):
+            os.unlink(path)
+
+
+class Client:
+    """Minimal asyncio client for :class:`KnowledgeBaseServer`, e.g. for load tests."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self._next_id = 0
+
+    @classmethod
+    async def connect(cls, host: str = "127.0.0.1", port: int = 7070, path: Optional[str] = None) -> "Client":
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def request(self, op: str, **fields) -> Dict[str, Any]:
+        """Sends a request and returns its final response; raises ValueError on errors."""
+        responses = [response async for response in self.stream(op, **fields)]
+        return responses[-1]
+
+    async def stream(self, op: str, **fields):
+        """Sends a request and yields every response line, the final one last."""
+        self._next_id += 1
+        request_id = self._next_id
+        _write(self.writer, {"id": request_id, "op": op, **fields})
+        await self.writer.drain()
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                raise ConnectionError("Connection closed by the server")
+            response = json.loads(line)
+            if "ok" in response and not response["ok"]:
+                raise ValueError(response["error"])
+            yield response
+            if "ok" in response:
+                return
+
+    async def assert_facts(self, *facts) -> Dict[str, Any]:
+        return await self.request("assert", facts=[_encode(fact) for fact in facts])
+
+    async def retract(self, *facts) -> Dict[str, Any]:
+        return await self.request("retract", facts=[_encode(fact) for fact in facts])
+
+    async def run(self, **options) -> Dict[str, Any]:
+        return await self.request("run", **options)
+
+    async def load(self, source: str) -> Dict[str, Any]:
+        return await self.request("load", source=source)
+
+    async def query(self, *patterns, limit: Optional[int] = None, offset: int = 0):
+        """Yields the bindings of a query as they arrive."""
+        async for response in self.stream("query", patterns=list(patterns), limit=limit, offset=offset):
+            if "bindings" in response:
+                yield response["bindings"]
+
+    async def close(self) -> None:
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+def _encode(fact) -> Any:
+    return [fact.entity, fact.attribute, fact.value] if isinstance(fact, Fact) else fact
@@ -0,0 +1,101 @@
+"""Inference sharded by entity over a process pool.
+
+A rule is *entity-local* when every condition has the same variable as its
+entity and every action derives facts about that entity, like
+``(defrule mammalRule (?animal has hair) => (?animal is mammal))``. Its
+matches only involve the facts of one entity, so the facts can be
+hash-partitioned by entity and each shard saturated with the entity-local
+rules independently of the others. :func:`sharded_infer` does this in a
+:class:`concurrent.futures.ProcessPoolExecutor`, shipping each worker only
+the facts of its shard that entity-local rules read, and merges the derived
+facts back. The other rules then run in the parent process: once over all
+the facts, and afterwards semi-naively, together with the entity-local
+rules, over the facts derived from then on.
+"""
+import os
+from typing import Iterable, List, Optional, Tuple
+
+from .fact import Fact
+from .planner import is_variable
+from .store import FactStore
+
+Triple = Tuple[str, str, str]
+
+
+def is_entity_local(_rule) -> bool:
+    """Checks whether all the conditions and actions of a rule share one entity variable."""
+    conditions = _rule.conditions
+    if not conditions:
+        return False
+    entity = conditions[0].entity
+    if not is_variable(entity):
+        return False
+    return all(
+        fact.entity == entity and not is_variable(fact.attribute)
+        for fact in list(conditions) + list(_rule.actions)
+    )
+
+
+def _saturate_shard(rules, triples: List[Triple]) -> List[Triple]:
+    """Worker task: saturates one shard semi-naively. Returns the derived facts."""
+    store = FactStore(Fact(*triple) for triple in triples)
+    derived: List[Triple] = []
+    delta = None
+    while True:
+        new_facts = FactStore()
+        for _rule in rules:
+            for fact in _rule.compiled().fire(store, delta):
+                if fact not in store:
+                    new_facts.add(fact)
+        if not new_facts:
+            return derived
+        for fact in new_facts:
+            store.add(fact)
+            derived.append((fact.entity, fact.attribute, fact.value))
+        delta = new_facts
+
+
+def _shards(facts: Iterable[Fact], count: int) -> List[List[Triple]]:
+    shards: List[List[Triple]] = [[] for _ in range(count)]
+    for fact in facts:
+        shards[hash(fact.entity) % count].append((fact.entity, fact.attribute, fact.value))
+    return shards
+
+
+def sharded_infer(kb, workers: Optional[int] = None) -> None:
+    """Saturates a knowledge base, evaluating the entity-local rules per shard in parallel.
+
+    The resulting facts are the same as with sequential semi-naive inference.
+    """
+    local = [_rule for _rule in kb.rules if is_entity_local(_rule)]
+    if local:
+        workers = workers or os.cpu_count() or 1
+        attributes = {condition.attribute for _rule in local for condition in _rule.conditions}
+        shards = _shards(
+            (fact for attribute in attributes for fact in kb.facts.lookup(None, attribute, None)), workers
+        )
+        if workers == 1:
+            results: Iterable[List[Triple]] = [_saturate_shard(local, shards[0])]
+        else:
+            # Imported here: multiprocessing would slow down the start of every program using clyps
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_saturate_shard, [local] * workers, shards))
+        for triples in results:
+            for triple in triples:
+                kb._add_derived(Fact(*triple))
+
+    # The facts are now closed under the entity-local rules: only the other
+    # rules can have matches that were not evaluated yet
+    derived = FactStore()
+    for _rule in kb.rules:
+        if not is_entity_local(_rule):
+            for fact in _rule.compiled().fire(kb.facts):
+                if fact not in kb.facts:
+                    derived.add(fact)
+    if not derived:
+        return
+    for fact in derived:
+        kb._add_derived(fact)
+    kb._saturate(derived)
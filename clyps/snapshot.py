@@ -0,0 +1,282 @@
+"""Binary snapshots of a knowledge base.
+
+A snapshot stores an interned symbol table, the facts as packed integer
+triples (one ``uint32`` column per field, plus the two sorted permutations
+used by :class:`~clyps.columnar.ColumnarFactStore` as indexes) and the rules
+in CLIPS syntax. Every section is aligned to 8 bytes, so that loading can
+memory-map the file and use the sections in place: opening a snapshot only
+reads the header and the rules, and the facts are paged in by the operating
+system when they are first accessed.
+
+Layout (little or big endian, as recorded in the header)::
+
+    header   magic, version, byte order, flags, symbol count, fact count
+    table    (offset, length) of each section
+    sections symbol offsets (uint64), symbol bytes (UTF-8), symbol ids in
+             the byte order of the symbols, entities, attributes, values,
+             (e, a, v) order, (a, v, e) order (uint32), derived flags (one
+             byte per fact), rules (UTF-8)
+
+Symbols are looked up by name with a binary search over their sorted ids,
+and the derived flags of truth maintenance are read from the file when a
+fact is checked, so neither is loaded into memory as a whole. Version 1
+snapshots, without the sorted ids, can still be loaded.
+"""
+import mmap
+import struct
+import sys
+from array import array
+from typing import Dict, Optional
+
+from .columnar import ColumnarFactStore
+from .fact import Fact
+from .overlay import OverlaySet
+from .parser import format_rule, parse
+from .symbols import SymbolTable
+
+MAGIC = b"CLYPSNAP"
+VERSION = 2
+SECTIONS = ("symbol_offsets", "symbols", "symbol_order", "entities", "attributes", "values", "eav", "ave",
+            "derived", "rules")
+# Sections of each version that can be loaded
+_SECTIONS = {1: tuple(name for name in SECTIONS if name != "symbol_order"), 2: SECTIONS}
+_HEADER = struct.Struct("<8sIIIIQQ")
+_SECTION = struct.Struct("<QQ")
+_HAS_DERIVED = 1
+
+
+class SnapshotError(ValueError):
+    """The file is not a valid snapshot."""
+
+
+class MappedSymbolTable(SymbolTable):
+    """Symbol table read lazily from the symbol sections of a snapshot.
+
+    Symbols are decoded when first needed. ``order`` lists the symbol ids
+    sorted by the bytes of their symbols; symbols are looked up by name with
+    a binary search over it, and the ids found are remembered. Without it,
+    every symbol is decoded at the first lookup. New symbols are appended
+    after the stored ones.
+    """
+
+    def __init__(self, offsets, data, order=None):
+        super().__init__()
+        self._offsets = offsets
+        self._data = data
+        self._order = order
+        self._count = len(offsets) - 1
+        self._decoded: Dict[int, str] = {}
+        self._indexed = False
+
+    def _bytes(self, symbol_id: int) -> bytes:
+        start, end = self._offsets[symbol_id], self._offsets[symbol_id + 1]
+        return bytes(self._data[start:end])
+
+    def _stored(self, symbol_id: int) -> str:
+        symbol = self._decoded.get(symbol_id)
+        if symbol is None:
+            symbol = self._decoded[symbol_id] = self._bytes(symbol_id).decode("utf-8")
+        return symbol
+
+    def _index(self) -> None:
+        if not self._indexed:
+            for symbol_id in range(self._count):
+                self._ids.setdefault(self._stored(symbol_id), symbol_id)
+            self._indexed = True
+
+    def _search(self, symbol: str) -> Optional[int]:
+        """Looks a stored symbol up in the sorted ids."""
+        try:
+            key = symbol.encode("utf-8")
+        except UnicodeEncodeError:
+            return None
+        order = self._order
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            symbol_id = order[middle]
+            stored = self._bytes(symbol_id)
+            if stored < key:
+                low = middle + 1
+            elif stored > key:
+                high = middle
+            else:
+                return symbol_id
+        return None
+
+    def intern(self, symbol: str) -> int:
+        symbol_id = self.get(symbol)
+        if symbol_id is None:
+            symbol_id = self._ids[symbol] = self._count + len(self._symbols)
+            self._symbols.append(symbol)
+        return symbol_id
+
+    def get(self, symbol: str) -> Optional[int]:
+        symbol_id = self._ids.get(symbol)
+        if symbol_id is not None:
+            return symbol_id
+        if self._order is None:
+            self._index()
+            return self._ids.get(symbol)
+        symbol_id = self._search(symbol)
+        if symbol_id is not None:
+            self._ids[symbol] = symbol_id
+        return symbol_id
+
+    def symbol(self, symbol_id: int) -> str:
+        if symbol_id < self._count:
+            return self._stored(symbol_id)
+        return self._symbols[symbol_id - self._count]
+
+    def __contains__(self, symbol: object) -> bool:
+        return isinstance(symbol, str) and self.get(symbol) is not None
+
+    def __iter__(self):
+        for symbol_id in range(len(self)):
+            yield self.symbol(symbol_id)
+
+    def __len__(self) -> int:
+        return self._count + len(self._symbols)
+
+
+class _MappedDerived:
+    """Read-only set of the facts flagged as derived in a snapshot.
+
+    ``store`` is a store over the columns of the snapshot that is never
+    modified; a fact is looked up in it to find its flag.
+    """
+
+    def __init__(self, store: ColumnarFactStore, flags):
+        self._store = store
+        self._flags = flags
+        self._size: Optional[int] = None
+
+    def __contains__(self, fact: object) -> bool:
+        if not isinstance(fact, Fact):
+            return False
+        try:
+            row = self._store.sequence(fact)
+        except KeyError:
+            return False
+        return bool(self._flags[row])
+
+    def __iter__(self):
+        fact = self._store._fact
+        for row, flag in enumerate(self._flags):
+            if flag:
+                yield fact(row)
+
+    def __len__(self) -> int:
+        if self._size is None:
+            self._size = bytes(self._flags).count(1)
+        return self._size
+
+
+def save_snapshot(kb, path: str) -> None:
+    """Writes the facts and rules of a knowledge base to a snapshot file."""
+    store = kb.facts
+    if not isinstance(store, ColumnarFactStore) or store.has_deleted_rows():
+        store = ColumnarFactStore(store)
+    entities, attributes, values, eav, ave = store.buffers()
+
+    symbols = [store.symbols.symbol(i) for i in range(len(store.symbols))]
+    encoded = [symbol.encode("utf-8") for symbol in symbols]
+    offsets = array("Q", [0])
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    order = array("I", sorted(range(len(encoded)), key=encoded.__getitem__))
+
+    flags = 0
+    derived = b""
+    if kb._tms is not None:
+        flags |= _HAS_DERIVED
+        derived = bytes(
+            fact in kb._tms.derived for fact in (store._fact(row) for row in range(len(entities)))
+        )
+    rules = "\n".join(format_rule(rule) for rule in kb.rules).encode("utf-8")
+
+    sections = [
+        offsets.tobytes(), b"".join(encoded), order.tobytes(), entities.tobytes(), attributes.tobytes(), values.tobytes(),
+        array("I", eav).tobytes(), array("I", ave).tobytes(), derived, rules,
+    ]
+    position = _HEADER.size + _SECTION.size * len(SECTIONS)
+    table = []
+    for data in sections:
+        position = _align(position)
+        table.append((position, len(data)))
+        position += len(data)
+
+    byteorder = 0 if sys.byteorder == "little" else 1
+    with open(path, "wb") as stream:
+        stream.write(_HEADER.pack(MAGIC, VERSION, byteorder, flags, 0, len(symbols), len(entities)))
+        for entry in table:
+            stream.write(_SECTION.pack(*entry))
+        for (offset, _), data in zip(table, sections):
+            stream.write(b"\0" * (offset - stream.tell()))
+            stream.write(data)
+
+
+def load_snapshot(path: str, use_mmap: bool = True, **kwargs):
+    """Opens a snapshot as a new :class:`~clyps.kb.KnowledgeBase`.
+
+    The facts are kept in a :class:`~clyps.columnar.ColumnarFactStore` whose
+    columns are views over the memory-mapped file (or over its contents read
+    into memory if ``use_mmap`` is False). Other keyword arguments are passed
+    to the ``KnowledgeBase`` constructor.
+    """
+    from .kb import KnowledgeBase
+
+    with open(path, "rb") as stream:
+        if use_mmap:
+            buffer = memoryview(mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ))
+        else:
+            buffer = memoryview(stream.read())
+
+    if len(buffer) < _HEADER.size:
+        raise SnapshotError(f"{path} is not a CLYPS snapshot")
+    magic, version, byteorder, flags, _, symbol_count, fact_count = _HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise SnapshotError(f"{path} is not a CLYPS snapshot")
+    if version not in _SECTIONS:
+        raise SnapshotError(f"Unsupported snapshot version: {version}")
+    swap = byteorder != (0 if sys.byteorder == "little" else 1)
+    section: Dict[str, memoryview] = {}
+    for i, name in enumerate(_SECTIONS[version]):
+        offset, length = _SECTION.unpack_from(buffer, _HEADER.size + i * _SECTION.size)
+        if offset + length > len(buffer):
+            raise SnapshotError(f"{path} is truncated")
+        section[name] = buffer[offset:offset + length]
+
+    def column(name: str, typecode: str):
+        if not swap:
+            return section[name].cast(typecode)
+        # Foreign byte order: the section has to be copied and swapped
+        values = array(typecode, section[name].tobytes())
+        values.byteswap()
+        return values
+
+    order = column("symbol_order", "I") if "symbol_order" in section else None
+    symbols = MappedSymbolTable(column("symbol_offsets", "Q"), section["symbols"], order)
+    if len(symbols) != symbol_count:
+        raise SnapshotError(f"{path} has an inconsistent symbol table")
+    columns = [column(name, "I") for name in ("entities", "attributes", "values", "eav", "ave")]
+    if any(len(values) != fact_count for values in columns):
+        raise SnapshotError(f"{path} has inconsistent fact columns")
+    store = ColumnarFactStore.from_buffers(symbols, *columns)
+
+    if flags & _HAS_DERIVED:
+        kwargs.setdefault("truth_maintenance", True)
+    kb = KnowledgeBase(store=store, **kwargs)
+    for rule in parse(bytes(section["rules"]).decode("utf-8")):
+        kb.add_rule(rule)
+    if kb._tms is not None and flags & _HAS_DERIVED:
+        if len(section["derived"]) != fact_count:
+            raise SnapshotError(f"{path} has inconsistent derived flags")
+        # The flags stay in the file; changes made from now on are kept in memory
+        kb._tms.derived = OverlaySet(_MappedDerived(ColumnarFactStore.from_buffers(symbols, *columns),
+                                                    section["derived"]))
+    return kb
+
+
+def _align(position: int) -> int:
+    return (position + 7) & ~7
@@ -0,0 +1,340 @@
+"""Fact storage in SQLite, with rule matching pushed down to SQL.
+
+:class:`SQLiteFactStore` keeps the facts in one table of (entity, attribute,
+value) triples with a unique index on (entity, attribute, value), an index
+on (attribute, value, entity) and one on (attribute, id), so fact sets much
+larger than memory can be kept in a database file. It offers the interface
+of :class:`~clyps.store.FactStore` and works with every engine.
+
+With ``KnowledgeBase(engine="sql")`` inference runs inside SQLite: the
+conditions of each rule become one join over the fact table, shared
+variables become equality predicates, and every action becomes an
+``INSERT ... SELECT ... WHERE NOT EXISTS`` statement that derives all its
+new facts at once. Rounds are repeated until one derives nothing. The first
+round evaluates every rule over all the facts; later rounds are
+semi-naive: facts get increasing ids, so each join is evaluated once per
+condition with that condition restricted to the facts of the previous
+round. After a complete saturation the store remembers its highest id, and
+the next inference with the same rules treats the facts added since as the
+previous round, instead of joining all the facts again.
+"""
+import sqlite3
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .fact import Fact
+from .planner import is_variable
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS facts (
+    id INTEGER PRIMARY KEY,
+    entity TEXT NOT NULL,
+    attribute TEXT NOT NULL,
+    value TEXT NOT NULL,
+    UNIQUE (entity, attribute, value)
+);
+CREATE INDEX IF NOT EXISTS facts_ave ON facts (attribute, value, entity);
+CREATE INDEX IF NOT EXISTS facts_attribute ON facts (attribute);
+"""
+
+# Rows fetched at a time when iterating over the facts
+_FETCH_SIZE = 1024
+
+
+class SQLiteFactStore:
+    """Fact store backed by a SQLite database.
+
+    ``path`` is a database file, created if needed, or ``":memory:"``.
+    Changes are committed by :meth:`publish`, which
+    :meth:`KnowledgeBase.infer <clyps.kb.KnowledgeBase.infer>` calls at the
+    end of every inference; file databases use write-ahead logging, so other
+    connections can read the last committed facts meanwhile. The facts must
+    not be changed while iterating over the store. The connection can be
+    used from any thread, one at a time (e.g. by
+    :class:`~clyps.server.KnowledgeBaseServer`, which runs inference in
+    worker threads behind a lock).
+    """
+
+    def __init__(self, path: str = ":memory:", facts: Iterable[Fact] = ()):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(_SCHEMA)
+        (self._size,) = self.connection.execute("SELECT count(*) FROM facts").fetchone()
+        # Facts as a list for indexing, built on demand after a change
+        self._list: Optional[List[Fact]] = None
+        # Rules the facts up to an id were saturated with (see sql_infer)
+        self._saturated: Optional[Tuple[tuple, int]] = None
+        self.add_many(facts)
+
+    def add(self, fact: Fact) -> bool:
+        """Adds a fact. Returns False if it was already in the store."""
+        cursor = self.connection.execute(
+            "INSERT OR IGNORE INTO facts (entity, attribute, value) VALUES (?, ?, ?)",
+            (fact.entity, fact.attribute, fact.value),
+        )
+        self._size += cursor.rowcount
+        if cursor.rowcount:
+            self._list = None
+        return cursor.rowcount == 1
+
+    def add_many(self, facts: Iterable[Fact]) -> int:
+        """Adds several facts with one statement. Returns the number of new facts."""
+        cursor = self.connection.executemany(
+            "INSERT OR IGNORE INTO facts (entity, attribute, value) VALUES (?, ?, ?)",
+            ((fact.entity, fact.attribute, fact.value) for fact in facts),
+        )
+        added = max(cursor.rowcount, 0)
+        self._size += added
+        if added:
+            self._list = None
+        return added
+
+    def discard(self, fact: Fact) -> bool:
+        """Removes a fact if present. Returns False if it was not in the store."""
+        cursor = self.connection.execute(
+            "DELETE FROM facts WHERE entity = ? AND attribute = ? AND value = ?",
+            (fact.entity, fact.attribute, fact.value),
+        )
+        self._size -= cursor.rowcount
+        if cursor.rowcount:
+            self._list = None
+            if self._saturated is not None:
+                # SQLite reuses the highest id once it is deleted
+                rules, last_id = self._saturated
+                self._saturated = rules, min(last_id, self.last_id())
+        return cursor.rowcount == 1
+
+    def remove(self, fact: Fact) -> None:
+        """Removes a fact, raising ValueError if it is not in the store."""
+        if not self.discard(fact):
+            raise ValueError(f"{fact} not in store")
+
+    def sequence(self, fact: Fact) -> int:
+        """Returns the id of a stored fact; facts added later have higher ids."""
+        row = self.connection.execute(
+            "SELECT id FROM facts WHERE entity = ? AND attribute = ? AND value = ?",
+            (fact.entity, fact.attribute, fact.value),
+        ).fetchone()
+        if row is None:
+            raise KeyError(fact)
+        return row[0]
+
+    def last_id(self) -> int:
+        """Returns the highest fact id, 0 if the store is empty."""
+        return self.connection.execute("SELECT max(id) FROM facts").fetchone()[0] or 0
+
+    def since(self, last_id: int) -> List[Fact]:
+        """Returns the facts with an id higher than ``last_id``."""
+        rows = self.connection.execute(
+            "SELECT entity, attribute, value FROM facts WHERE id > ? ORDER BY id", (last_id,)
+        )
+        return [Fact(*row) for row in rows]
+
+    def lookup(self, entity: Optional[str] = None, attribute: Optional[str] = None,
+               value: Optional[str] = None) -> List[Fact]:
+        """Returns the stored facts with the given entity, attribute and value.
+
+        ``None`` acts as a wildcard.
+        """
+        where, params = [], []
+        for column, term in (("entity", entity), ("attribute", attribute), ("value", value)):
+            if term is not None:
+                where.append(f"{column} = ?")
+                params.append(term)
+        sql = "SELECT entity, attribute, value FROM facts"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return [Fact(*row) for row in self.connection.execute(sql, params)]
+
+    def candidates(self, condition: Fact) -> List[Fact]:
+        """Returns the facts that may match a condition; variables are wildcards."""
+        return self.lookup(
+            None if is_variable(condition.entity) else condition.entity,
+            condition.attribute,
+            None if is_variable(condition.value) else condition.value,
+        )
+
+    def publish(self) -> None:
+        """Commits the changes, making them visible to other connections."""
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.connection.commit()
+        self.connection.close()
+
+    def __contains__(self, fact: object) -> bool:
+        if not isinstance(fact, Fact):
+            return False
+        return self.connection.execute(
+            "SELECT 1 FROM facts WHERE entity = ? AND attribute = ? AND value = ?",
+            (fact.entity, fact.attribute, fact.value),
+        ).fetchone() is not None
+
+    def __iter__(self) -> Iterator[Fact]:
+        cursor = self.connection.execute("SELECT entity, attribute, value FROM facts ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(_FETCH_SIZE)
+            if not rows:
+                return
+            for row in rows:
+                yield Fact(*row)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index):
+        if self._list is None:
+            self._list = list(self)
+        return self._list[index]
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (list, tuple)) or hasattr(other, "candidates"):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"SQLiteFactStore({self.path!r}, facts={self._size})"
+
+
+def _statements(_rule, low: Optional[int] = None) -> List[Tuple[str, list]]:
+    """Translates a rule into one INSERT statement per action and join.
+
+    Without ``low`` there is one join over all the facts. Otherwise there is
+    one join per condition, which only uses facts with an id above ``low``
+    in that condition and facts with an id up to ``low`` in the conditions
+    before it, so every match using a newer fact is produced exactly once.
+    Actions follow :meth:`KnowledgeBase._apply_bindings`: in rules with
+    variables, an action whose entity is not a variable of the conditions
+    derives nothing.
+    """
+    conditions = _rule.conditions
+    has_variables = _rule.compiled().has_variables
+    if low is None:
+        pivots: List[Optional[int]] = [None]
+    else:
+        pivots = list(range(len(conditions)))
+    statements = []
+    for pivot in pivots:
+        tables, where, where_params, columns = _join(conditions, low, pivot)
+        for action in _rule.actions:
+            if has_variables and action.entity not in columns:
+                continue
+            select, select_params = [], []
+            for term in (action.entity, action.attribute, action.value):
+                if term in columns:
+                    select.append(columns[term])
+                else:
+                    select.append("?")
+                    select_params.append(term)
+            entity, attribute, value = select
+            exists = f"NOT EXISTS (SELECT 1 FROM facts d WHERE d.entity = {entity} " \
+                     f"AND d.attribute = {attribute} AND d.value = {value})"
+            sql = "INSERT OR IGNORE INTO facts (entity, attribute, value) SELECT DISTINCT " + ", ".join(select)
+            if tables:
+                sql += " FROM " + ", ".join(tables)
+            sql += " WHERE " + " AND ".join(where + [exists])
+            statements.append((sql, select_params + where_params + select_params))
+    return statements
+
+
+def _join(conditions, low: Optional[int], pivot: Optional[int]) -> Tuple[List[str], List[str], list, Dict[str, str]]:
+    """Tables, predicates and parameters of the join of the conditions.
+
+    Also returns the column each variable is bound to.
+    """
+    tables, where, params = [], [], []
+    columns: Dict[str, str] = {}
+    for index, condition in enumerate(conditions):
+        alias = f"c{index}"
+        tables.append(f"facts {alias}")
+        where.append(f"{alias}.attribute = ?")
+        params.append(condition.attribute)
+        for position, term in (("entity", condition.entity), ("value", condition.value)):
+            column = f"{alias}.{position}"
+            if not is_variable(term):
+                where.append(f"{column} = ?")
+                params.append(term)
+            elif term in columns:
+                where.append(f"{column} = {columns[term]}")
+            else:
+                columns[term] = column
+                # Variables are only bound to constants
+                where.append(f"substr({column}, 1, 1) <> '?'")
+        # Hints for the query planner: start from the (few) new facts of the
+        # pivot through the (attribute, id) index and do not use an index for
+        # the old facts of the other conditions
+        if pivot is not None and index == pivot:
+            where.append(f"likelihood({alias}.id > ?, 0.001)")
+            params.append(low)
+        elif pivot is not None and index < pivot:
+            where.append(f"+{alias}.id <= ?")
+            params.append(low)
+    return tables, where, params, columns
+
+
+def sql_infer(kb, max_cycles: Optional[int] = None, until: Optional[Fact] = None) -> None:
+    """Saturates a knowledge base whose facts are in a :class:`SQLiteFactStore`.
+
+    ``max_cycles`` limits the number of rounds; inference also stops after
+    the round that derives a fact matching ``until``. After a complete
+    saturation, the next call with the same rules starts from the facts
+    added in between.
+    """
+    from .subscriptions import DERIVED
+
+    store = kb.facts
+    if not isinstance(store, SQLiteFactStore):
+        raise ValueError("The sql engine needs a SQLiteFactStore")
+    stats = kb.stats
+    graph, _ = kb._dependency_graph()
+    connection = store.connection
+    rules = tuple(_rule.compiled() for _rule in kb.rules)
+    low: Optional[int] = None
+    changed = None
+    if store._saturated is not None and store._saturated[0] == rules:
+        # The first round joins against the facts added since the last saturation
+        low = store._saturated[1]
+        changed = _attributes_since(connection, low)
+    store._saturated = None
+    cycles = 0
+    while True:
+        if cycles == max_cycles or (until is not None and cycles and kb._reached(until)):
+            break
+        cycles += 1
+        if stats is not None:
+            stats.start_cycle()
+        high = store.last_id()
+        derived = 0
+        for rule_index, _rule in enumerate(kb.rules):
+            if changed is not None and not changed & graph.inputs[rule_index]:
+                continue
+            start = time.perf_counter()
+            count = 0
+            for sql, params in _statements(_rule, low):
+                count += connection.execute(sql, params).rowcount
+            derived += count
+            if stats is not None:
+                rule_stats = stats.rule(_rule.name)
+                rule_stats.derived += count
+                rule_stats.seconds += time.perf_counter() - start
+        store._size += derived
+        if not derived:
+            store._saturated = rules, high
+            break
+        store._list = None
+        if kb._tms is not None or kb._subscriptions:
+            for fact in store.since(high):
+                if kb._tms is not None:
+                    kb._tms.derived.add(fact)
+                if kb._subscriptions:
+                    kb._notify(DERIVED, fact)
+        # The next round joins against the facts derived in this one
+        low = high
+        changed = _attributes_since(connection, high)
+
+
+def _attributes_since(connection, last_id: int) -> set:
+    """Returns the attributes of the facts with an id higher than ``last_id``."""
+    return {row[0] for row in connection.execute("SELECT DISTINCT attribute FROM facts WHERE id > ?", (last_id,))}
@@ -0,0 +1,108 @@
+"""Opt-in profiling counters for inference.
+
+Assign an :class:`InferenceStats` to ``KnowledgeBase.stats`` (or pass
+``stats=True`` to the constructor) to record, for every rule and every
+inference cycle, how much matching work the rule did and how long it took.
+When ``stats`` is None the engines skip all bookkeeping and use the plain
+generated match functions, so the overhead is a few attribute checks per
+rule and cycle.
+"""
+from typing import Callable, Dict, List, Optional
+
+
+class RuleStats:
+    """Counters of one rule, for one cycle or accumulated over several.
+
+    * ``combinations``: candidate facts examined while extending partial matches
+    * ``tests``: condition tests, i.e. index probes for one condition under
+      the bindings of a partial match (or membership tests for ground rules)
+    * ``bindings``: complete matches produced
+    * ``derived``: new facts added by the rule
+    * ``duplicates``: facts produced by the rule that were already known
+    * ``seconds``: time spent matching the rule and applying its actions
+    """
+
+    FIELDS = ("combinations", "tests", "bindings", "derived", "duplicates", "seconds")
+
+    __slots__ = ("name",) + FIELDS
+
+    def __init__(self, name: str):
+        self.name = name
+        self.combinations = 0
+        self.tests = 0
+        self.bindings = 0
+        self.derived = 0
+        self.duplicates = 0
+        self.seconds = 0.0
+
+    def add(self, other: "RuleStats") -> None:
+        for field in self.FIELDS:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+
+    def as_dict(self) -> Dict[str, float]:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __repr__(self) -> str:
+        counters = ", ".join(f"{field}={getattr(self, field)}" for field in self.FIELDS[:-1])
+        return f"RuleStats({self.name}, {counters}, seconds={self.seconds:.6f})"
+
+
+class InferenceStats:
+    """Per-rule counters of every inference cycle.
+
+    A cycle is an iteration of the naive loop, a semi-naive round, or one
+    :meth:`KnowledgeBase.infer` call with the Rete engine (whose join work
+    happens when facts are added and is shared between rules, so only
+    bindings, derived facts, duplicates and time are recorded for it). The
+    parallel engine is not instrumented, and the sharded one only records the
+    semi-naive rounds that follow its first pass over the other rules.
+
+    If ``watch`` is set, it is called with the rule name and the bindings of
+    every firing, like CLIPS' ``(watch rules)``.
+    """
+
+    def __init__(self, watch: Optional[Callable[[str, Dict[str, str]], None]] = None):
+        self.watch = watch
+        self.cycles: List[Dict[str, RuleStats]] = []
+        self.firings = 0
+
+    def start_cycle(self) -> None:
+        self.cycles.append({})
+
+    def rule(self, name: str) -> RuleStats:
+        """Counters of a rule in the current cycle."""
+        if not self.cycles:
+            self.start_cycle()
+        cycle = self.cycles[-1]
+        stats = cycle.get(name)
+        if stats is None:
+            stats = cycle[name] = RuleStats(name)
+        return stats
+
+    def fired(self, name: str, bindings: Dict[str, str]) -> None:
+        self.firings += 1
+        if self.watch is not None:
+            self.watch(name, bindings)
+
+    @property
+    def rules(self) -> Dict[str, RuleStats]:
+        """Counters of every rule, accumulated over all cycles."""
+        totals: Dict[str, RuleStats] = {}
+        for cycle in self.cycles:
+            for name, stats in cycle.items():
+                totals.setdefault(name, RuleStats(name)).add(stats)
+        return totals
+
+    def reset(self) -> None:
+        self.cycles.clear()
+        self.firings = 0
+
+    def report(self) -> str:
+        """Table of the accumulated counters, slowest rules first."""
+        header = f"{'rule':<24}" + "".join(f"{field:>14}" for field in RuleStats.FIELDS)
+        lines = [header]
+        for stats in sorted(self.rules.values(), key=lambda stats: stats.seconds, reverse=True):
+            counters = "".join(f"{getattr(stats, field):>14}" for field in RuleStats.FIELDS[:-1])
+            lines.append(f"{stats.name:<24}{counters}{stats.seconds:>14.6f}")
+        lines.append(f"{len(self.cycles)} cycles, {self.firings} firings")
+        return "\n".join(lines)
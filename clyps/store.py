@@ -0,0 +1,121 @@
+"""Indexed storage for the facts of a knowledge base."""
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .fact import Fact
+
+
+class FactStore:
+    """Ordered, deduplicated collection of facts with secondary indexes.
+
+    Membership tests, insertion and removal are O(1). Facts are also indexed
+    by attribute, by (entity, attribute) and by (attribute, value) so that the
+    facts matching a condition can be found without scanning the whole store.
+    Iteration follows insertion order, and the read API of a list
+    (``in``, ``len``, iteration, indexing) is kept for existing callers.
+    """
+
+    def __init__(self, facts: Iterable[Fact] = ()):
+        self._facts: Dict[Fact, int] = {}
+        self._by_attribute: Dict[str, Dict[Fact, None]] = {}
+        self._by_entity_attribute: Dict[Tuple[str, str], Dict[Fact, None]] = {}
+        self._by_attribute_value: Dict[Tuple[str, str], Dict[Fact, None]] = {}
+        self._sequence = 0
+        # Facts as a list for indexing, built on demand after a change
+        self._list: Optional[List[Fact]] = None
+        for fact in facts:
+            self.add(fact)
+
+    def add(self, fact: Fact) -> bool:
+        """Adds a fact. Returns False if it was already in the store."""
+        if fact in self._facts:
+            return False
+        self._facts[fact] = self._sequence
+        self._sequence += 1
+        self._list = None
+        self._by_attribute.setdefault(fact.attribute, {})[fact] = None
+        self._by_entity_attribute.setdefault((fact.entity, fact.attribute), {})[fact] = None
+        self._by_attribute_value.setdefault((fact.attribute, fact.value), {})[fact] = None
+        return True
+
+    def discard(self, fact: Fact) -> bool:
+        """Removes a fact if present. Returns False if it was not in the store."""
+        if self._facts.pop(fact, None) is None:
+            return False
+        self._list = None
+        _unindex(self._by_attribute, fact.attribute, fact)
+        _unindex(self._by_entity_attribute, (fact.entity, fact.attribute), fact)
+        _unindex(self._by_attribute_value, (fact.attribute, fact.value), fact)
+        return True
+
+    def remove(self, fact: Fact) -> None:
+        """Removes a fact, raising ValueError if it is not in the store."""
+        if not self.discard(fact):
+            raise ValueError(f"{fact} not in store")
+
+    def sequence(self, fact: Fact) -> int:
+        """Returns the insertion sequence number of a stored fact."""
+        return self._facts[fact]
+
+    def lookup(self, entity: Optional[str] = None, attribute: Optional[str] = None,
+               value: Optional[str] = None) -> Iterable[Fact]:
+        """Returns the stored facts with the given entity, attribute and value.
+
+        ``None`` acts as a wildcard. The most selective index is used.
+        """
+        if attribute is None:
+            return [
+                fact for fact in self._facts
+                if (entity is None or fact.entity == entity)
+                and (value is None or fact.value == value)
+            ]
+        if entity is not None and value is not None:
+            fact = Fact(entity, attribute, value)
+            return (fact,) if fact in self._facts else ()
+        if entity is not None:
+            return self._by_entity_attribute.get((entity, attribute), {}).keys()
+        if value is not None:
+            return self._by_attribute_value.get((attribute, value), {}).keys()
+        return self._by_attribute.get(attribute, {}).keys()
+
+    def candidates(self, condition: Fact) -> Iterable[Fact]:
+        """Returns the facts that may match a condition; variables are wildcards."""
+        return self.lookup(
+            None if condition.entity.startswith("?") else condition.entity,
+            condition.attribute,
+            None if condition.value.startswith("?") else condition.value,
+        )
+
+    def __contains__(self, fact: object) -> bool:
+        return fact in self._facts
+
+    def __iter__(self) -> Iterator[Fact]:
+        return iter(self._facts)
+
+    def __len__(self) -> int:
+        return len(self._facts)
+
+    def __getitem__(self, index):
+        if self._list is None:
+            self._list = list(self._facts)
+        return self._list[index]
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (FactStore, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self._facts))
+
+
+def as_store(facts: Iterable[Fact]):
+    """Returns ``facts`` if it is already a fact store, else an indexed copy."""
+    return facts if hasattr(facts, "candidates") else FactStore(facts)
+
+
+def _unindex(index: dict, key, fact: Fact) -> None:
+    bucket = index.get(key)
+    if bucket is not None:
+        bucket.pop(fact, None)
+        if not bucket:
+            del index[key]
@@ -0,0 +1,184 @@
+"""Subscriptions to the facts derived and retracted by a knowledge base.
+
+:meth:`KnowledgeBase.subscribe <clyps.kb.KnowledgeBase.subscribe>` returns a
+:class:`Subscription` that receives a :class:`Change` for every fact
+matching its pattern as soon as a rule derives it or it is retracted.
+Changes go either to a callback, called synchronously by the thread that
+runs inference, or to a bounded queue read by iterating over the
+subscription (from another thread) or with ``async for``. When the queue is
+full, inference waits for the consumer, so a slow consumer slows down the
+producer instead of making the queue grow. ``async for`` does not hold a
+thread while it waits: the producer wakes it up through
+``loop.call_soon_threadsafe``.
+"""
+import queue
+import threading
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from .fact import Fact
+from .planner import match_condition
+
+DERIVED = "derived"
+RETRACTED = "retracted"
+
+# How often a producer blocked on a full queue checks whether the subscription was closed
+_POLL_INTERVAL = 0.1
+
+
+class Change:
+    """A fact that was derived or retracted; ``kind`` is ``"derived"`` or ``"retracted"``."""
+
+    __slots__ = ("kind", "fact")
+
+    def __init__(self, kind: str, fact: Fact):
+        self.kind = kind
+        self.fact = fact
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Change):
+            return NotImplemented
+        return self.kind == other.kind and self.fact == other.fact
+
+    def __hash__(self) -> int:
+        return hash((self.kind, self.fact))
+
+    def __repr__(self) -> str:
+        return f"Change({self.kind!r}, {self.fact})"
+
+
+class Subscription:
+    """Delivers the changes of the facts matching a pattern.
+
+    ``pattern`` is a fact pattern such as ``Fact("?x", "is", "mammal")``, or
+    None for every fact. Without ``callback``, changes are queued (at most
+    ``maxsize`` of them) until they are read. Closing the subscription stops
+    the deliveries and ends the iteration once the queued changes are read.
+    """
+
+    def __init__(self, pattern: Optional[Fact] = None, callback: Optional[Callable[[Change], None]] = None,
+                 maxsize: int = 1024, subscribers: Optional[List["Subscription"]] = None):
+        self.pattern = pattern
+        self.callback = callback
+        self.closed = False
+        self._queue: "queue.Queue[Optional[Change]]" = queue.Queue(maxsize)
+        self._subscribers = subscribers
+        # Futures of the async readers waiting for a change, with their loops
+        self._waiters: List[Tuple[object, object]] = []
+        self._waiters_lock = threading.Lock()
+
+    def matches(self, fact: Fact) -> bool:
+        return self.pattern is None or match_condition(fact, self.pattern) is not None
+
+    def notify(self, change: Change) -> None:
+        """Delivers a change, waiting while the queue is full."""
+        if self.closed or not self.matches(change.fact):
+            return
+        if self.callback is not None:
+            self.callback(change)
+            return
+        while not self.closed:
+            try:
+                self._queue.put(change, timeout=_POLL_INTERVAL)
+                self._wake_async()
+                return
+            except queue.Full:
+                continue
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Change]:
+        """Returns the next change, or None once the subscription is closed and drained.
+
+        Raises :class:`queue.Empty` if ``timeout`` seconds pass without changes.
+        """
+        if self.closed and self._queue.empty():
+            return None
+        change = self._queue.get(timeout=timeout)
+        if change is None:
+            # Let other readers wake up as well
+            self._wake()
+        return change
+
+    def pending(self) -> List[Change]:
+        """Returns the queued changes without waiting."""
+        changes = []
+        while True:
+            try:
+                change = self._queue.get_nowait()
+            except queue.Empty:
+                return changes
+            if change is None:
+                self._wake()
+                return changes
+            changes.append(change)
+
+    def close(self) -> None:
+        """Stops the deliveries and wakes up the readers."""
+        if self.closed:
+            return
+        self.closed = True
+        if self._subscribers is not None and self in self._subscribers:
+            self._subscribers.remove(self)
+        self._wake()
+
+    def _wake(self) -> None:
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            # Readers are not waiting; they find the subscription closed after draining it
+            pass
+        self._wake_async()
+
+    def _wake_async(self) -> None:
+        with self._waiters_lock:
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                # The loop of the reader is closed
+                pass
+
+    def __iter__(self) -> Iterator[Change]:
+        while True:
+            change = self.get()
+            if change is None:
+                return
+            yield change
+
+    def __aiter__(self) -> "Subscription":
+        return self
+
+    async def __anext__(self) -> Change:
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                change = self._queue.get_nowait()
+            except queue.Empty:
+                if self.closed:
+                    raise StopAsyncIteration
+                future = loop.create_future()
+                with self._waiters_lock:
+                    self._waiters.append((loop, future))
+                # A change queued before the waiter was registered did not wake it up
+                if self._queue.empty() and not self.closed:
+                    await future
+                continue
+            if change is None:
+                self._wake()
+                raise StopAsyncIteration
+            return change
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        return f"Subscription({self.pattern}, closed={self.closed})"
+
+
+def _resolve(future) -> None:
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,42 @@
+"""Symbol interning."""
+from typing import Dict, List, Optional
+
+
+class SymbolTable:
+    """Maps symbols (entity, attribute and value strings) to integer ids.
+
+    Every distinct symbol is stored once; facts can then be represented by
+    three integers, and comparing symbols becomes an integer comparison.
+    """
+
+    def __init__(self, symbols=()):
+        self._ids: Dict[str, int] = {}
+        self._symbols: List[str] = []
+        for symbol in symbols:
+            self.intern(symbol)
+
+    def intern(self, symbol: str) -> int:
+        """Returns the id of a symbol, assigning a new one if needed."""
+        symbol_id = self._ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = len(self._symbols)
+            self._ids[symbol] = symbol_id
+            self._symbols.append(symbol)
+        return symbol_id
+
+    def get(self, symbol: str) -> Optional[int]:
+        """Returns the id of a symbol, or None if it was never interned."""
+        return self._ids.get(symbol)
+
+    def symbol(self, symbol_id: int) -> str:
+        """Returns the symbol with the given id."""
+        return self._symbols[symbol_id]
+
+    def __contains__(self, symbol: object) -> bool:
+        return symbol in self._ids
+
+    def __iter__(self):
+        return iter(self._symbols)
+
+    def __len__(self) -> int:
+        return len(self._symbols)
@@ -0,0 +1,115 @@
+"""Truth maintenance for retractions (delete and rederive)."""
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from .fact import Fact
+from .planner import is_variable, join
+from .store import FactStore
+
+
+class TruthMaintenance:
+    """Keeps derived facts consistent when a fact is retracted.
+
+    Uses the DRed algorithm: first every derived fact with a derivation that
+    uses the retracted fact is deleted (transitively), then the deleted facts
+    that can still be derived from what remains are put back, and inference
+    resumes from them. Both phases only join against the facts that changed,
+    so the cost is proportional to the affected part of the derivation graph.
+
+    Only the set of derived facts is tracked; justifications are recomputed
+    through the indexes when needed.
+    """
+
+    def __init__(self, kb):
+        self.kb = kb
+        self.derived: Set[Fact] = set()
+
+    def retract(self, fact: Fact) -> Tuple[Set[Fact], Set[Fact], List[Fact]]:
+        """Retracts a fact and the derived facts that lose all their support.
+
+        Returns the facts removed from the knowledge base, the facts that
+        were deleted and then rederived from an alternative support, and the
+        facts that were not known before and were derived while inference
+        resumed (only possible if the knowledge base was not saturated).
+        """
+        store = self.kb.facts
+        if fact not in store:
+            return set(), set(), []
+
+        # 1. Overdelete everything derived through the retracted fact
+        deleted = FactStore([fact])
+        delta = FactStore([fact])
+        while delta:
+            affected = FactStore()
+            for _rule in self.kb.rules:
+                for consequence in self._consequences(_rule, store, delta):
+                    if consequence in self.derived and consequence in store and consequence not in deleted:
+                        affected.add(consequence)
+            for consequence in affected:
+                deleted.add(consequence)
+            delta = affected
+
+        for deleted_fact in deleted:
+            store.discard(deleted_fact)
+
+        # 2. Put back the facts that still have a derivation
+        rederived = FactStore(
+            deleted_fact for deleted_fact in deleted if deleted_fact != fact and self._derivable(deleted_fact)
+        )
+        for rederived_fact in rederived:
+            store.add(rederived_fact)
+        restored = len(rederived)
+        # Extends rederived with the facts derived from now on
+        self.kb._saturate(rederived)
+        added = [new_fact for new_fact in islice(rederived, restored, None) if new_fact not in deleted]
+
+        self.derived.discard(fact)
+        removed = {deleted_fact for deleted_fact in deleted if deleted_fact not in store}
+        self.derived -= removed
+        return removed, set(deleted) - removed, added
+
+    def _consequences(self, _rule, store, delta) -> Iterator[Fact]:
+        """Facts the rule derives from matches that use at least one delta fact."""
+        if self.kb._has_variables(_rule):
+            for bindings, _ in _rule.iter_matches(store, delta):
+                yield from self.kb._derive(_rule, bindings)
+        elif any(condition in delta for condition in _rule.conditions) and all(
+            condition in store for condition in _rule.conditions
+        ):
+            yield from _rule.actions
+
+    def _derivable(self, fact: Fact) -> bool:
+        """Checks whether some rule derives the fact from the current facts."""
+        store = self.kb.facts
+        for _rule in self.kb.rules:
+            if not self.kb._has_variables(_rule):
+                if fact in _rule.actions and all(condition in store for condition in _rule.conditions):
+                    return True
+                continue
+            variables = {
+                term for condition in _rule.conditions
+                for term in (condition.entity, condition.value) if is_variable(term)
+            }
+            for action in _rule.actions:
+                bindings = _unify(action, fact, variables)
+                if bindings is not None and next(join(_rule.conditions, store, bindings=bindings), None):
+                    return True
+        return False
+
+
+def _unify(action: Fact, fact: Fact, variables: Set[str]) -> Optional[Dict[str, str]]:
+    """Bindings under which a rule action produces the fact, or None.
+
+    Mirrors :meth:`KnowledgeBase._apply_bindings`: the action entity must be a
+    variable bound by the conditions, and unbound terms are copied verbatim.
+    """
+    if action.entity not in variables or action.attribute != fact.attribute:
+        return None
+    bindings = {action.entity: fact.entity}
+    if action.value in variables:
+        if bindings.get(action.value, fact.value) != fact.value:
+            return None
+        bindings[action.value] = fact.value
+    elif action.value != fact.value:
+        return None
+    return bindings
@@ -0,0 +1,221 @@
+"""Vectorised rule matching over columnar facts with NumPy.
+
+:class:`FactArrays` holds the interned facts of a
+:class:`~clyps.columnar.ColumnarFactStore` as NumPy arrays of symbol ids,
+grouped by attribute. A rule is matched a condition at a time instead of a
+fact at a time: each condition selects a slice of its attribute's rows and
+narrows it with boolean masks on its constants (and on repeated
+variables), and the per-condition tables are joined on their shared
+variables with a sort-merge join (``argsort`` plus ``searchsorted``).
+
+Given the facts derived in the last round, :meth:`FactArrays.fire` does a
+semi-naive round the same way. The semi-naive engine uses it for large
+deltas over a :class:`~clyps.columnar.ColumnarFactStore` (see
+:meth:`KnowledgeBase._saturate <clyps.kb.KnowledgeBase._saturate>`).
+
+This pays off for rules with few conditions over very large fact sets; for
+small ones the pure Python matchers of :mod:`clyps.compiler` are faster.
+NumPy is optional: it is only imported by this module.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from .columnar import ColumnarFactStore
+from .fact import Fact
+from .planner import is_variable
+
+# A table of partial matches: the symbol ids bound to each variable and the number of rows
+_Table = Tuple[Dict[str, "np.ndarray"], int]
+
+
+class FactArrays:
+    """The facts of a store as NumPy columns of symbol ids.
+
+    ``facts`` is a :class:`~clyps.columnar.ColumnarFactStore`, whose columns
+    and symbol table are reused, or any iterable of facts. The arrays are a
+    copy: later changes to the store are not seen. If ``delta`` is given,
+    its facts, which must be in ``facts`` (or be the same store), are the
+    new facts of :meth:`fire`.
+    """
+
+    def __init__(self, facts: Iterable[Fact], delta: Optional[Iterable[Fact]] = None):
+        if np is None:
+            raise ImportError("clyps.vectorized requires numpy")
+        store = facts if isinstance(facts, ColumnarFactStore) else ColumnarFactStore(facts)
+        self.symbols = store.symbols
+        # Join keys pack two symbol ids into an int64
+        if len(self.symbols) >= 2 ** 31:
+            raise ValueError("clyps.vectorized supports at most 2**31 symbols")
+        entities, attributes, values = (
+            np.frombuffer(column, dtype=np.uint32) for column in (store._entities, store._attributes, store._values)
+        )
+        rows = np.arange(len(entities))
+        if store.has_deleted_rows():
+            alive = np.frombuffer(store._alive, dtype=np.bool_)
+            entities, attributes, values, rows = entities[alive], attributes[alive], values[alive], rows[alive]
+        # Rows sorted by attribute, so that every attribute is a contiguous slice
+        order = np.argsort(attributes, kind="stable")
+        self.entities = entities[order]
+        self.attributes = attributes[order]
+        self.values = values[order]
+        self.new: Optional["np.ndarray"] = None
+        if delta is store:
+            self.new = np.ones(len(self.entities), dtype=np.bool_)
+        elif delta is not None:
+            new = np.zeros(len(store._entities), dtype=np.bool_)
+            new[np.fromiter((store.sequence(fact) for fact in delta), dtype=np.int64)] = True
+            self.new = new[rows[order]]
+        self._variables = np.fromiter(
+            (symbol.startswith("?") for symbol in self.symbols), dtype=np.bool_, count=len(self.symbols)
+        )
+        self._strings: Optional["np.ndarray"] = None
+
+    def __len__(self) -> int:
+        return len(self.entities)
+
+    def match(self, rule) -> List[Dict[str, str]]:
+        """Returns the same bindings as :meth:`Rule.match`, in no particular order."""
+        columns = self.match_ids(rule)
+        if not columns:
+            return []
+        if self._strings is None:
+            self._strings = np.array(list(self.symbols), dtype=object)
+        names = list(columns)
+        strings = [self._strings[columns[name]].tolist() for name in names]
+        return [dict(zip(names, row)) for row in zip(*strings)]
+
+    def match_ids(self, rule, new: bool = False) -> Dict[str, "np.ndarray"]:
+        """Returns the symbol ids bound to each variable, one array element per match.
+
+        With ``new``, only the matches that use a delta fact are returned,
+        each of them once. Rules without variables have no bindings and
+        give an empty dict.
+        """
+        variables = rule.compiled().variables
+        if not variables:
+            return {}
+        conditions = rule.conditions
+        if not new:
+            return self._match_ids(variables, [(condition, None) for condition in conditions])
+        # The pivot matches a delta fact and the conditions before it only old facts
+        parts = [
+            self._match_ids(variables, [(condition, index == pivot if index <= pivot else None)
+                                        for index, condition in enumerate(conditions)])
+            for pivot in range(len(conditions))
+        ]
+        return {variable: np.concatenate([part[variable] for part in parts]) for variable in variables}
+
+    def fire(self, rule) -> List[Fact]:
+        """Returns the facts derived by the matches of a rule that use a delta fact.
+
+        Same as :meth:`CompiledRule.fire <clyps.compiler.CompiledRule.fire>`
+        for rules with variables.
+        """
+        compiled = rule.compiled()
+        columns = self.match_ids(rule, new=True)
+        if not columns or not len(columns[compiled.variables[0]]):
+            return []
+        if self._strings is None:
+            self._strings = np.array(list(self.symbols), dtype=object)
+        strings = [self._strings[columns[variable]].tolist() for variable in compiled.variables]
+        derive = compiled.derive
+        return [fact for values in zip(*strings) for fact in derive(values)]
+
+    def _match_ids(self, variables, conditions: List[Tuple[Fact, Optional[bool]]]) -> Dict[str, "np.ndarray"]:
+        tables = []
+        for condition, new in conditions:
+            table = self._select(condition, new)
+            if not table[1]:
+                return {variable: np.empty(0, dtype=np.uint32) for variable in variables}
+            if table[0]:
+                tables.append(table)
+        columns, _ = _join_all(tables)
+        return {variable: columns[variable] for variable in variables}
+
+    def _select(self, condition: Fact, new: Optional[bool] = None) -> _Table:
+        """Returns the rows matching one condition, only the delta or old ones if ``new`` is given."""
+        get = self.symbols.get
+        attribute = get(condition.attribute)
+        if attribute is None:
+            return {}, 0
+        start = np.searchsorted(self.attributes, attribute, "left")
+        end = np.searchsorted(self.attributes, attribute, "right")
+        mask = np.ones(end - start, dtype=np.bool_) if new is None else self.new[start:end] == new
+        columns: Dict[str, "np.ndarray"] = {}
+        for term, column in ((condition.entity, self.entities[start:end]), (condition.value, self.values[start:end])):
+            if not is_variable(term):
+                symbol_id = get(term)
+                if symbol_id is None:
+                    return {}, 0
+                mask &= column == symbol_id
+                continue
+            # Variables are only bound to constants
+            mask &= ~self._variables[column]
+            if term in columns:
+                mask &= columns[term] == column
+            else:
+                columns[term] = column
+        size = int(np.count_nonzero(mask))
+        if not columns:
+            # A condition without variables only checks that its fact exists
+            return {}, min(size, 1)
+        return {variable: column[mask] for variable, column in columns.items()}, size
+
+
+def _join_all(tables: List[_Table]) -> _Table:
+    """Joins the tables, starting from the smallest one and following shared variables."""
+    remaining = sorted(tables, key=lambda table: table[1])
+    result = remaining.pop(0)
+    while remaining and result[1]:
+        bound = result[0]
+        best = min(range(len(remaining)),
+                   key=lambda i: (-sum(variable in bound for variable in remaining[i][0]), remaining[i][1]))
+        result = _join(result, remaining.pop(best))
+    return result
+
+
+def _join(left: _Table, right: _Table) -> _Table:
+    """Sort-merge join of two tables on their shared variables."""
+    left_columns, left_size = left
+    right_columns, right_size = right
+    shared = [variable for variable in right_columns if variable in left_columns]
+    if not shared:
+        left_index = np.repeat(np.arange(left_size), right_size)
+        right_index = np.tile(np.arange(right_size), left_size)
+    else:
+        left_key = _key(left_columns, shared)
+        right_key = _key(right_columns, shared)
+        order = np.argsort(right_key, kind="stable")
+        sorted_key = right_key[order]
+        starts = np.searchsorted(sorted_key, left_key, "left")
+        counts = np.searchsorted(sorted_key, left_key, "right") - starts
+        left_index = np.repeat(np.arange(left_size), counts)
+        # Position of every output row within the run of equal keys of its left row
+        offsets = np.arange(len(left_index)) - np.repeat(np.cumsum(counts) - counts, counts)
+        right_index = order[np.repeat(starts, counts) + offsets]
+    columns = {variable: column[left_index] for variable, column in left_columns.items()}
+    for variable, column in right_columns.items():
+        if variable not in columns:
+            columns[variable] = column[right_index]
+    return columns, len(left_index)
+
+
+def _key(columns: Dict[str, "np.ndarray"], variables: List[str]) -> "np.ndarray":
+    """Combines the symbol ids of the shared variables into one int64 key per row.
+
+    A condition has at most two variables, so at most two are shared, and
+    their ids fit since there are fewer than 2**31 symbols.
+    """
+    key = columns[variables[0]].astype(np.int64)
+    for variable in variables[1:]:
+        key = (key << 32) | columns[variable].astype(np.int64)
+    return key
+
+
+def match(rule, facts: Iterable[Fact]) -> List[Dict[str, str]]:
+    """Matches a rule against facts with NumPy; see :meth:`FactArrays.match`."""
+    return FactArrays(facts).match(rule)
@@ -0,0 +1,305 @@
+"""Multi-version fact storage for concurrent readers.
+
+A :class:`VersionedFactStore` keeps its facts in append-only segments. The
+writer (e.g. a thread running :meth:`KnowledgeBase.infer`) adds facts to an
+active segment that only it can see; :meth:`~VersionedFactStore.publish`
+seals that segment and atomically installs a new :class:`FactSnapshot`: a
+generation number, the tuple of sealed segments and the tombstones of the
+removed facts. Readers take the current snapshot with
+:meth:`~VersionedFactStore.snapshot` and query it without locks; sealed
+segments are never modified, so a snapshot stays valid (and unchanged)
+however long the writer keeps working.
+
+Every fact carries a global sequence number. A tombstone records the
+sequence number at which a fact was removed and hides the copies of the
+fact with a lower one, so a fact can be removed and added again. Sealed
+segments are merged by :meth:`publish` itself, on the writer's thread and
+before the new snapshot is installed, like a binary counter: this keeps
+their number logarithmic in the number of facts, and readers never wait
+for a merge.
+"""
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .fact import Fact
+
+# Tombstones are dropped by merging every segment once there are this many
+# of them and they exceed a fraction (1/_TOMBSTONE_RATIO) of the facts.
+_MIN_TOMBSTONES = 1024
+_TOMBSTONE_RATIO = 8
+
+
+class Segment:
+    """Facts with their sequence numbers and attribute indexes.
+
+    Segments are only modified while they are the active segment of a
+    :class:`VersionedFactStore`; sealed segments are read-only.
+    """
+
+    __slots__ = ("facts", "by_attribute", "by_entity_attribute", "by_attribute_value")
+
+    def __init__(self, facts: Iterable[Tuple[Fact, int]] = ()):
+        self.facts: Dict[Fact, int] = {}
+        self.by_attribute: Dict[str, Dict[Fact, None]] = {}
+        self.by_entity_attribute: Dict[Tuple[str, str], Dict[Fact, None]] = {}
+        self.by_attribute_value: Dict[Tuple[str, str], Dict[Fact, None]] = {}
+        for fact, sequence in facts:
+            self.add(fact, sequence)
+
+    def add(self, fact: Fact, sequence: int) -> None:
+        self.facts[fact] = sequence
+        self.by_attribute.setdefault(fact.attribute, {})[fact] = None
+        self.by_entity_attribute.setdefault((fact.entity, fact.attribute), {})[fact] = None
+        self.by_attribute_value.setdefault((fact.attribute, fact.value), {})[fact] = None
+
+    def discard(self, fact: Fact) -> None:
+        del self.facts[fact]
+        for index, key in (
+            (self.by_attribute, fact.attribute),
+            (self.by_entity_attribute, (fact.entity, fact.attribute)),
+            (self.by_attribute_value, (fact.attribute, fact.value)),
+        ):
+            bucket = index[key]
+            del bucket[fact]
+            if not bucket:
+                del index[key]
+
+    def bucket(self, entity: Optional[str], attribute: str, value: Optional[str]) -> Iterable[Fact]:
+        if entity is not None:
+            return self.by_entity_attribute.get((entity, attribute), ())
+        if value is not None:
+            return self.by_attribute_value.get((attribute, value), ())
+        return self.by_attribute.get(attribute, ())
+
+    def __len__(self) -> int:
+        return len(self.facts)
+
+
+class _SegmentReader(ABC):
+    """Read API of a fact store made of segments and tombstones."""
+
+    _tombstones: Dict[Fact, int]
+    # Facts as a list for indexing, built on demand after a change
+    _list: Optional[List[Fact]] = None
+
+    @abstractmethod
+    def _segments(self) -> Sequence[Segment]:
+        """Returns the segments, oldest first."""
+
+    def _visible(self, fact: Fact, sequence: int) -> bool:
+        removed = self._tombstones.get(fact)
+        return removed is None or sequence > removed
+
+    def _find(self, fact: Fact) -> Optional[int]:
+        """Returns the sequence number of the visible copy of a fact, if any."""
+        for segment in reversed(self._segments()):
+            sequence = segment.facts.get(fact)
+            if sequence is not None:
+                return sequence if self._visible(fact, sequence) else None
+        return None
+
+    def sequence(self, fact: Fact) -> int:
+        """Returns the sequence number of a stored fact."""
+        sequence = self._find(fact)
+        if sequence is None:
+            raise KeyError(fact)
+        return sequence
+
+    def lookup(self, entity: Optional[str] = None, attribute: Optional[str] = None,
+               value: Optional[str] = None) -> List[Fact]:
+        """Returns the stored facts with the given entity, attribute and value.
+
+        ``None`` acts as a wildcard. The most selective index is used.
+        """
+        if attribute is None:
+            return [
+                fact for fact in self
+                if (entity is None or fact.entity == entity) and (value is None or fact.value == value)
+            ]
+        if entity is not None and value is not None:
+            fact = Fact(entity, attribute, value)
+            return [fact] if self._find(fact) is not None else []
+        facts = []
+        tombstones = self._tombstones
+        for segment in self._segments():
+            bucket = segment.bucket(entity, attribute, value)
+            if not tombstones:
+                facts.extend(bucket)
+                continue
+            sequences = segment.facts
+            facts.extend(fact for fact in bucket if self._visible(fact, sequences[fact]))
+        return facts
+
+    def candidates(self, condition: Fact) -> List[Fact]:
+        """Returns the facts that may match a condition; variables are wildcards."""
+        return self.lookup(
+            None if condition.entity.startswith("?") else condition.entity,
+            condition.attribute,
+            None if condition.value.startswith("?") else condition.value,
+        )
+
+    def __contains__(self, fact: object) -> bool:
+        return isinstance(fact, Fact) and self._find(fact) is not None
+
+    def __iter__(self) -> Iterator[Fact]:
+        for segment in self._segments():
+            for fact, sequence in list(segment.facts.items()):
+                if self._visible(fact, sequence):
+                    yield fact
+
+    def __getitem__(self, index):
+        if self._list is None:
+            self._list = list(self)
+        return self._list[index]
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (list, tuple)) or hasattr(other, "candidates"):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+class FactSnapshot(_SegmentReader):
+    """Immutable view of the facts of a :class:`VersionedFactStore` at one generation."""
+
+    def __init__(self, generation: int, segments: Tuple[Segment, ...], tombstones: Dict[Fact, int], size: int,
+                 sequence: int = 0):
+        self.generation = generation
+        self._segment_tuple = segments
+        self._tombstones = tombstones
+        self._size = size
+        # Next sequence number of the store; overlays number their facts from it
+        self._sequence = sequence
+
+    def _segments(self) -> Sequence[Segment]:
+        return self._segment_tuple
+
+    def query(self, *patterns, limit: Optional[int] = None, offset: int = 0) -> Iterator[Dict[str, str]]:
+        """Streams the bindings of a conjunctive query; see :meth:`KnowledgeBase.query`."""
+        from .planner import query
+
+        return query(self, patterns, limit, offset)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __repr__(self) -> str:
+        return f"FactSnapshot(generation={self.generation}, facts={self._size})"
+
+
+class VersionedFactStore(_SegmentReader):
+    """Fact store whose published versions can be read while it is modified.
+
+    The store itself has the interface of :class:`~clyps.store.FactStore`
+    and must only be used by one writer at a time; :meth:`snapshot` may be
+    called from any thread. :class:`~clyps.kb.KnowledgeBase` publishes a new
+    version at the end of every :meth:`~clyps.kb.KnowledgeBase.infer`.
+    """
+
+    def __init__(self, facts: Iterable[Fact] = ()):
+        self._sealed: Tuple[Segment, ...] = ()
+        self._active = Segment()
+        self._tombstones: Dict[Fact, int] = {}
+        self._tombstones_changed = False
+        self._sequence = 0
+        self._size = 0
+        self._version = FactSnapshot(0, (), {}, 0)
+        for fact in facts:
+            self.add(fact)
+        self.publish()
+
+    def _segments(self) -> Sequence[Segment]:
+        return self._sealed + (self._active,)
+
+    def add(self, fact: Fact) -> bool:
+        """Adds a fact. Returns False if it was already in the store."""
+        if self._find(fact) is not None:
+            return False
+        self._active.add(fact, self._sequence)
+        self._sequence += 1
+        self._size += 1
+        self._list = None
+        return True
+
+    def discard(self, fact: Fact) -> bool:
+        """Removes a fact if present. Returns False if it was not in the store."""
+        if self._find(fact) is None:
+            return False
+        if fact in self._active.facts:
+            # Not published yet: older copies, if any, already have a tombstone
+            self._active.discard(fact)
+        else:
+            self._tombstones[fact] = self._sequence
+            self._sequence += 1
+            self._tombstones_changed = True
+        self._size -= 1
+        self._list = None
+        return True
+
+    def remove(self, fact: Fact) -> None:
+        """Removes a fact, raising ValueError if it is not in the store."""
+        if not self.discard(fact):
+            raise ValueError(f"{fact} not in store")
+
+    def publish(self) -> FactSnapshot:
+        """Seals the active segment and makes the current facts visible to readers."""
+        version = self._version
+        if not self._active.facts and not self._tombstones_changed and version.generation:
+            return version
+        segments = list(self._sealed)
+        if self._active.facts:
+            segments.append(self._active)
+            self._active = Segment()
+        tombstones = self._tombstones
+        if len(tombstones) >= _MIN_TOMBSTONES and len(tombstones) * _TOMBSTONE_RATIO > self._size:
+            segments = [self._merge(segments)] if segments else []
+            self._tombstones = tombstones = {}
+        else:
+            # Merge the newest segments while they are not much smaller than the previous one
+            while len(segments) > 1 and len(segments[-2]) <= 2 * len(segments[-1]):
+                segments[-2:] = [self._merge(segments[-2:])]
+        self._sealed = tuple(segments)
+        if self._tombstones_changed or tombstones is not version._tombstones:
+            # Readers get their own copy; the writer keeps changing this dict
+            version_tombstones = dict(tombstones)
+        else:
+            version_tombstones = version._tombstones
+        self._tombstones_changed = False
+        # A single attribute assignment: readers see the old or the new version
+        self._version = FactSnapshot(version.generation + 1, self._sealed, version_tombstones, self._size,
+                                     self._sequence)
+        return self._version
+
+    def frozen(self) -> FactSnapshot:
+        """Returns a view of the current facts, published or not, that later changes do not affect.
+
+        Unlike :meth:`publish`, this does not change what readers see: the
+        view copies the active segment and the tombstones when they changed
+        since the last version, and has that version's generation number.
+        """
+        version = self._version
+        if not self._active.facts and not self._tombstones_changed:
+            return version
+        segments = self._sealed + ((Segment(self._active.facts.items()),) if self._active.facts else ())
+        tombstones = dict(self._tombstones) if self._tombstones_changed else version._tombstones
+        return FactSnapshot(version.generation, segments, tombstones, self._size, self._sequence)
+
+    def _merge(self, segments: List[Segment]) -> Segment:
+        """Merges segments into a new one, leaving out the facts hidden by tombstones."""
+        return Segment(
+            (fact, sequence) for segment in segments for fact, sequence in segment.facts.items()
+            if self._visible(fact, sequence)
+        )
+
+    def snapshot(self) -> FactSnapshot:
+        """Returns the last published version. Safe to call from any thread."""
+        return self._version
+
+    @property
+    def generation(self) -> int:
+        return self._version.generation
+
+    def __len__(self) -> int:
+        return self._size
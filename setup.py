@@ -17,14 +17,13 @@ test_requirements = ['pytest>=3', ]
 setup(
     author="Javi Palanca",
     author_email='jpalanca@gmail.com',
-    python_requires='>=3.6',
+    python_requires='>=3.7',
     classifiers=[
         'Development Status :: 2 - Pre-Alpha',
         'Intended Audience :: Developers',
         'License :: OSI Approved :: MIT License',
         'Natural Language :: English',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
     ],
@@ -35,6 +34,7 @@ setup(
         ],
     },
     install_requires=requirements,
+    extras_require={'numpy': ['numpy']},
     license="MIT license",
     long_description=readme + '\n\n' + history,
     include_package_data=True,
@@ -0,0 +1,167 @@
+import pytest
+
+from clyps.agenda import Agenda
+from clyps.fact import Fact
+from clyps.kb import KnowledgeBase
+from clyps.rule import Rule
+from clyps.stats import InferenceStats
+
+
+def chain_kb(engine="agenda", length=20, **kwargs):
+    kb = KnowledgeBase(engine=engine, **kwargs)
+    kb.add_rule(Rule("base", [Fact("?x", "parent", "?y")], [Fact("?x", "ancestor", "?y")]))
+    kb.add_rule(Rule("step", [Fact("?x", "parent", "?y"), Fact("?y", "ancestor", "?z")],
+                     [Fact("?x", "ancestor", "?z")]))
+    for i in range(length):
+        kb.add_fact(Fact(f"n{i}", "parent", f"n{i + 1}"))
+    return kb
+
+
+def firings(kb, **kwargs):
+    fired = []
+    kb.stats = InferenceStats(watch=lambda name, bindings: fired.append((name, bindings)))
+    kb.infer(**kwargs)
+    return fired
+
+
+@pytest.mark.parametrize("strategy", ["depth", "breadth", "lex"])
+def test_agenda_reaches_the_same_closure(strategy):
+    kb = chain_kb(strategy=strategy)
+    kb.infer()
+    expected = chain_kb("seminaive")
+    expected.infer()
+    assert set(kb.facts) == set(expected.facts)
+    assert len(kb.facts.lookup(None, "ancestor", None)) == 20 * 21 // 2
+
+
+def test_each_activation_fires_once():
+    kb = chain_kb(length=6)
+    fired = firings(kb)
+    keys = [(name, tuple(sorted(bindings.items()))) for name, bindings in fired]
+    assert len(keys) == len(set(keys))
+    # 6 base firings and one step firing per pair of chained ancestors
+    assert len(keys) == 6 + 15
+
+
+def test_salience_orders_firings():
+    kb = KnowledgeBase(engine="agenda")
+    kb.add_rule(Rule("low", [Fact("?x", "is", "sick")], [Fact("?x", "gets", "rest")], salience=-1))
+    kb.add_rule(Rule("high", [Fact("?x", "is", "sick")], [Fact("?x", "needs", "vet")], salience=10))
+    kb.add_rule(Rule("normal", [Fact("?x", "is", "sick")], [Fact("?x", "is", "noted")]))
+    kb.add_fact(Fact("rex", "is", "sick"))
+    kb.add_fact(Fact("tom", "is", "sick"))
+    names = [name for name, _ in firings(kb)]
+    assert names == ["high", "high", "normal", "normal", "low", "low"]
+
+
+@pytest.mark.parametrize("strategy, first", [("depth", "b"), ("breadth", "a"), ("lex", "b")])
+def test_strategies(strategy, first):
+    kb = KnowledgeBase(engine="agenda", strategy=strategy)
+    kb.add_rule(Rule("r", [Fact("?x", "is", "item")], [Fact("?x", "is", "seen")]))
+    kb.add_fact(Fact("a", "is", "item"))
+    kb.add_fact(Fact("b", "is", "item"))
+    fired = firings(kb, max_cycles=1)
+    assert fired == [("r", {"?x": first})]
+
+
+def test_lex_prefers_recent_facts_across_conditions():
+    kb = KnowledgeBase(engine="agenda", strategy="lex")
+    kb.add_rule(Rule("pair", [Fact("?x", "likes", "?y"), Fact("?y", "is", "here")], [Fact("?x", "meets", "?y")]))
+    kb.add_fact(Fact("old", "likes", "b"))
+    kb.add_fact(Fact("b", "is", "here"))
+    kb.add_fact(Fact("c", "is", "here"))
+    kb.add_fact(Fact("new", "likes", "c"))
+    kb.add_fact(Fact("old2", "likes", "b"))
+    assert [b["?x"] for _, b in firings(kb)] == ["old2", "new", "old"]
+
+
+def test_lex_orders_the_matches_of_one_fact():
+    kb = KnowledgeBase(engine="agenda", strategy="lex")
+    kb.add_rule(Rule("go", [Fact("?x", "is", "here"), Fact("go", "is", "now")], [Fact("?x", "is", "gone")]))
+    for name in ("a", "b", "c"):
+        kb.add_fact(Fact(name, "is", "here"))
+    # Every match has this fact as its most recent one
+    kb.add_fact(Fact("go", "is", "now"))
+    assert [b["?x"] for _, b in firings(kb)] == ["c", "b", "a"]
+
+
+def test_lex_skips_matches_of_facts_added_again():
+    kb = KnowledgeBase(engine="agenda", strategy="lex")
+    kb.add_rule(Rule("pair", [Fact("?x", "likes", "?y"), Fact("?y", "is", "here")], [Fact("?x", "meets", "?y")]))
+    # The agenda is built by the first inference and then follows the changes
+    kb.infer()
+    kb.add_fact(Fact("a", "likes", "b"))
+    kb.add_fact(Fact("b", "is", "here"))
+    kb.remove_fact(Fact("a", "likes", "b"))
+    kb.add_fact(Fact("a", "likes", "b"))
+    assert firings(kb) == [("pair", {"?x": "a", "?y": "b"})]
+
+
+def test_unknown_strategy():
+    with pytest.raises(ValueError):
+        Agenda([], [], strategy="random")
+
+
+def test_max_cycles_and_resume():
+    kb = chain_kb(length=5)
+    assert len(firings(kb, max_cycles=3)) == 3
+    assert len(kb.facts) == 5 + 3
+    kb.infer()
+    assert len(kb.facts.lookup(None, "ancestor", None)) == 15
+
+
+def test_until_stops_early_and_skips_matching_work():
+    kb = chain_kb(length=200, stats=True)
+    kb.infer(until="(n190 ancestor n200)")
+    assert Fact("n190", "ancestor", "n200") in kb.facts
+    assert len(kb.facts) < 300
+    combinations = sum(stats.combinations for stats in kb.stats.rules.values())
+
+    full = chain_kb(length=200, stats=True)
+    full.infer()
+    assert combinations * 10 < sum(stats.combinations for stats in full.stats.rules.values())
+
+
+@pytest.mark.parametrize("engine", ["naive", "seminaive", "rete", "agenda"])
+def test_until_with_variables(engine):
+    kb = chain_kb(engine, length=30)
+    kb.infer(until=Fact("?x", "ancestor", "n30"))
+    assert kb.facts.lookup(None, "ancestor", "n30")
+    assert len(kb.facts.lookup(None, "ancestor", None)) < 30 * 31 // 2
+    kb.infer()
+    assert len(kb.facts.lookup(None, "ancestor", None)) == 30 * 31 // 2
+
+
+def test_until_already_satisfied():
+    kb = chain_kb(length=3)
+    kb.infer(until="(?x parent n1)")
+    assert len(kb.facts) == 3
+
+
+def test_max_cycles_counts_rounds_with_seminaive():
+    kb = chain_kb("seminaive", length=10)
+    kb.infer(max_cycles=2)
+    assert len(kb.facts.lookup(None, "ancestor", None)) == 10 + 9
+
+
+def test_removed_facts_do_not_fire():
+    kb = chain_kb(length=3)
+    kb.infer(max_cycles=0)
+    kb.remove_fact(Fact("n0", "parent", "n1"))
+    kb.infer()
+    assert not kb.facts.lookup("n0", None, None)
+    assert Fact("n1", "ancestor", "n3") in kb.facts
+
+
+def test_added_rule_sees_existing_facts():
+    kb = chain_kb(length=3)
+    kb.infer()
+    kb.add_rule(Rule("root", [Fact("?x", "ancestor", "n3")], [Fact("?x", "reaches", "n3")]))
+    kb.infer()
+    assert len(kb.facts.lookup(None, "reaches", None)) == 3
+
+
+def test_parallel_rejects_stop_conditions():
+    kb = chain_kb("parallel", length=2)
+    with pytest.raises(ValueError):
+        kb.infer(max_cycles=1)
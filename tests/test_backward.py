@@ -0,0 +1,138 @@
+import random
+import time
+
+import pytest
+
+from clyps.backward import _Tables, magic_sets, prove, prove_magic
+from clyps.fact import Fact
+from clyps.kb import KnowledgeBase
+from clyps.rule import Rule
+from clyps.store import FactStore
+
+
+def _ancestors_kb(length, chains=1):
+    kb = KnowledgeBase()
+    kb.add_rule(Rule("base", [Fact("?x", "parent", "?y")], [Fact("?x", "ancestor", "?y")]))
+    kb.add_rule(Rule("step", [Fact("?x", "parent", "?y"), Fact("?y", "ancestor", "?z")],
+                     [Fact("?x", "ancestor", "?z")]))
+    for chain in range(chains):
+        for i in range(length):
+            kb.add_fact(Fact(f"c{chain}n{i}", "parent", f"c{chain}n{i + 1}"))
+    return kb
+
+
+def _key(results):
+    return sorted(tuple(sorted(bindings.items())) for bindings in results)
+
+
+def _forward(kb, goal):
+    closure = KnowledgeBase()
+    closure.rules = list(kb.rules)
+    for fact in kb.facts:
+        closure.add_fact(fact)
+    closure.infer()
+    return _key(closure.query(goal))
+
+
+@pytest.mark.parametrize("magic", [False, True])
+def test_ground_goals(magic):
+    kb = _ancestors_kb(6)
+    assert kb.prove("(c0n1 ancestor c0n5)", magic=magic) == [{}]
+    assert kb.prove("(c0n5 ancestor c0n1)", magic=magic) == []
+    assert kb.prove("(c0n0 parent c0n1)", magic=magic) == [{}]
+    assert kb.prove("(c0n0 unknown c0n1)", magic=magic) == []
+
+
+@pytest.mark.parametrize("magic", [False, True])
+@pytest.mark.parametrize("goal", [
+    "(c0n2 ancestor ?z)", "(?x ancestor c0n4)", "(?x ancestor ?y)", "(?x ancestor ?x)", "(?x parent ?y)",
+])
+def test_goals_match_forward_inference(goal, magic):
+    kb = _ancestors_kb(8, chains=2)
+    kb.add_fact(Fact("c1n8", "parent", "c1n0"))
+    assert _key(kb.prove(goal, magic=magic)) == _forward(kb, goal)
+
+
+@pytest.mark.parametrize("magic", [False, True])
+def test_random_programs_match_forward_inference(magic):
+    rng = random.Random(3)
+    terms = ["?x", "?y", "?z", "a", "b"]
+    for _ in range(30):
+        kb = KnowledgeBase()
+        for index in range(4):
+            conditions = [Fact(rng.choice(terms), f"r{rng.randrange(3)}", rng.choice(terms))
+                          for _ in range(rng.randint(1, 2))]
+            actions = [Fact(rng.choice(terms), f"r{rng.randrange(3)}", rng.choice(terms))]
+            kb.add_rule(Rule(f"rule{index}", conditions, actions))
+        for _ in range(12):
+            kb.add_fact(Fact(rng.choice("abcd"), f"r{rng.randrange(3)}", rng.choice("abcd")))
+        for goal in ("(?x r0 ?y)", "(a r1 ?y)", "(?x r2 b)", "(c r0 d)"):
+            assert _key(kb.prove(goal, magic=magic)) == _forward(kb, goal)
+
+
+@pytest.mark.parametrize("magic", [False, True])
+def test_action_entity_outside_the_conditions_derives_nothing(magic):
+    kb = KnowledgeBase()
+    kb.add_rule(Rule("odd", [Fact("?x", "is", "dog")], [Fact("?other", "is", "animal"), Fact("?x", "barks", "yes")]))
+    kb.add_fact(Fact("rex", "is", "dog"))
+    assert kb.prove("(?a is animal)", magic=magic) == []
+    assert kb.prove("(?a barks yes)", magic=magic) == [{"?a": "rex"}]
+
+
+@pytest.mark.parametrize("magic", [False, True])
+def test_prove_leaves_the_knowledge_base_unchanged(magic):
+    kb = _ancestors_kb(5)
+    before = list(kb.facts)
+    assert kb.prove("(c0n0 ancestor ?z)", magic=magic)
+    assert list(kb.facts) == before
+    kb.infer()
+    assert len(kb.facts) == len(before) + 15
+
+
+def test_tables_only_evaluate_relevant_subgoals():
+    kb = _ancestors_kb(20, chains=50)
+    tables = _Tables(kb.facts, kb.rules)
+    tables.solve(Fact("c3n15", "ancestor", "?z"))
+    derived = sum(len(table) for key, table in tables.tables.items() if key[1] == "ancestor")
+    # The ancestors of c3n15..c3n19, none of the other chains
+    assert derived == 5 + 4 + 3 + 2 + 1
+    assert {key[0] for key in tables.tables} <= {f"c3n{i}" for i in range(15, 21)}
+
+
+def test_magic_sets_only_derive_relevant_facts():
+    kb = _ancestors_kb(20, chains=50)
+    seed, program = magic_sets(kb.rules, Fact("c3n15", "ancestor", "?z"))
+    assert seed == Fact("c3n15", "magic ancestor bf", "*")
+    start = time.perf_counter()
+    assert len(kb.prove("(c3n15 ancestor ?z)", magic=True)) == 5
+    fast = time.perf_counter() - start
+    start = time.perf_counter()
+    _forward(kb, "(c3n15 ancestor ?z)")
+    slow = time.perf_counter() - start
+    assert fast < slow
+
+
+def test_deep_recursion():
+    kb = _ancestors_kb(3000)
+    # A chain of 3000 subgoals, deeper than the Python stack
+    assert prove(kb.facts, kb.rules, Fact("c0n0", "ancestor", "c0n3000")) == [{}]
+    results = prove(kb.facts, kb.rules, Fact("c0n2900", "ancestor", "?z"))
+    assert _key(results) == _key({"?z": f"c0n{i}"} for i in range(2901, 3001))
+    assert prove_magic(FactStore(kb.facts), kb.rules, Fact("c0n2990", "ancestor", "?z")) == [
+        {"?z": f"c0n{i}"} for i in range(2991, 3001)
+    ]
+
+
+def test_tables_join_each_answer_once():
+    kb = _ancestors_kb(60)
+    tables = _Tables(kb.facts, kb.rules)
+    joined = []
+    extend = tables._extend
+
+    def counted(consumer, facts):
+        joined.extend((id(consumer), fact) for fact in facts)
+        extend(consumer, facts)
+
+    tables._extend = counted
+    assert len(tables.solve(Fact("c0n0", "ancestor", "?z"))) == 60
+    assert len(joined) == len(set(joined))
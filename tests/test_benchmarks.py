@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+from benchmarks.runner import compare, execute, main, run
+from benchmarks.workloads import WORKLOADS, transitive_closure
+from clyps.fact import Fact
+
+
+def test_transitive_closure_size():
+    kb = execute(transitive_closure(10, chains=2), "seminaive")
+    assert len(kb.facts.lookup(None, "ancestor", None)) == 2 * 10 * 11 // 2
+
+
+@pytest.mark.parametrize("name", sorted(WORKLOADS))
+def test_engines_agree_on_workloads(name):
+    workload = WORKLOADS[name](6)
+    results = [set(execute(workload, engine).facts) for engine in ("naive", "seminaive", "rete", "sql")]
+    assert results[0] == results[1] == results[2] == results[3]
+    assert len(results[0]) > len(set(workload.facts))
+
+
+def test_manners_seats_reachable_guests():
+    kb = execute(WORKLOADS["manners"](8), "seminaive")
+    assert Fact("guest0", "seated", "yes") in kb.facts
+    assert Fact("guest1", "seated", "yes") in kb.facts
+
+
+def test_run_report_and_compare(tmp_path):
+    report = run(["fan_out"], ["seminaive"], [5])
+    (result,) = report["results"]
+    assert result["facts"] == 5 + 5 * 20 * 2
+    assert result["peak_memory_bytes"] > 0
+    assert len(compare(report, report)) == 1
+
+    output = tmp_path / "results.json"
+    main(["--workload", "waltz", "--sizes", "3", "--no-memory", "--output", str(output)])
+    saved = json.loads(output.read_text())
+    assert [r["engine"] for r in saved["results"]] == ["seminaive", "rete"]
+    assert saved["results"][0]["peak_memory_bytes"] is None
@@ -0,0 +1,55 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("click")
+
+from click.testing import CliRunner  # noqa: E402
+
+from clyps.cli import main  # noqa: E402
+
+RULES = "(defrule mammal (?x has hair) => (?x is mammal))\n(defrule warm (?x is mammal) => (?x is warm))\n"
+
+
+@pytest.fixture
+def rules(tmp_path):
+    path = tmp_path / "rules.clp"
+    path.write_text(RULES)
+    return str(path)
+
+
+def _lines(output):
+    return [json.loads(line) for line in output.splitlines()]
+
+
+def test_run_writes_derived_facts(rules, tmp_path):
+    facts = tmp_path / "facts.jsonl"
+    facts.write_text('["dog", "has", "hair"]\n\n"(cat has hair)"\n')
+    result = CliRunner().invoke(main, ["run", rules, "--facts", str(facts)])
+    assert result.exit_code == 0, result.output
+    assert sorted(_lines(result.output)) == [
+        ["cat", "is", "mammal"], ["cat", "is", "warm"], ["dog", "is", "mammal"], ["dog", "is", "warm"],
+    ]
+
+
+def test_run_stream_reads_stdin_in_chunks(rules):
+    stdin = '["dog", "has", "hair"]\n["dog", "has", "hair"]\n["cat", "has", "hair"]\n'
+    result = CliRunner().invoke(main, ["run", rules, "--stream", "--chunk-size", "2"], input=stdin)
+    assert result.exit_code == 0, result.output
+    assert _lines(result.output) == [
+        ["dog", "is", "mammal"], ["dog", "is", "warm"], ["cat", "is", "mammal"], ["cat", "is", "warm"],
+    ]
+
+
+def test_run_reports_invalid_facts(rules):
+    result = CliRunner().invoke(main, ["run", rules, "--facts", "-"], input='["dog", "has"]\n')
+    assert result.exit_code == 1
+    assert "Invalid fact on line 1" in result.output
+
+
+def test_import_does_not_load_interactive_dependencies():
+    code = "import sys, clyps.cli; print(sorted({'prompt_toolkit', 'asyncio'} & set(sys.modules)))"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "[]"
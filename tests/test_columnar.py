@@ -0,0 +1,82 @@
+import tracemalloc
+
+from clyps.columnar import ColumnarFactStore
+from clyps.fact import Fact
+from clyps.kb import KnowledgeBase
+from clyps.rule import Rule
+from clyps.store import FactStore
+from clyps.symbols import SymbolTable
+
+
+def test_symbol_table():
+    symbols = SymbolTable(["dog", "has"])
+    assert symbols.intern("dog") == 0
+    assert symbols.intern("hair") == 2
+    assert symbols.get("cat") is None
+    assert symbols.symbol(1) == "has"
+    assert len(symbols) == 3
+
+
+def test_columnar_store_add_and_contains():
+    store = ColumnarFactStore()
+    assert store.add(Fact("dog", "has", "hair"))
+    assert not store.add(Fact("dog", "has", "hair"))
+    assert Fact("dog", "has", "hair") in store
+    assert Fact("cat", "has", "hair") not in store
+    assert len(store) == 1
+
+
+def test_columnar_store_lookup_before_and_after_compact():
+    facts = [Fact(f"e{i % 7}", f"a{i % 3}", f"v{i % 5}") for i in range(60)]
+    store = ColumnarFactStore(facts)
+    expected = FactStore(facts)
+    for compacted in (False, True):
+        if compacted:
+            store.compact()
+        assert list(store) == list(expected)
+        assert set(store.lookup(attribute="a1")) == set(expected.lookup(attribute="a1"))
+        assert set(store.lookup(entity="e2", attribute="a2")) == set(expected.lookup(entity="e2", attribute="a2"))
+        assert set(store.lookup(attribute="a0", value="v3")) == set(expected.lookup(attribute="a0", value="v3"))
+        assert store.lookup(attribute="missing") == []
+
+
+def test_columnar_store_discard():
+    store = ColumnarFactStore([Fact("dog", "has", "hair"), Fact("cat", "has", "hair")])
+    store.compact()
+    assert store.discard(Fact("dog", "has", "hair"))
+    assert not store.discard(Fact("dog", "has", "hair"))
+    assert list(store.lookup(attribute="has")) == [Fact("cat", "has", "hair")]
+    assert store.add(Fact("dog", "has", "hair"))
+    assert len(store) == 2
+
+
+def test_knowledge_base_with_columnar_store():
+    kb = KnowledgeBase(engine="seminaive", store=ColumnarFactStore())
+    kb.add_fact(Fact("dog", "has", "hair"))
+    kb.add_fact(Fact("dog", "is", "vertebrate"))
+    kb.add_rule(
+        Rule(
+            "mammalRule",
+            [Fact("?x", "has", "hair"), Fact("?x", "is", "vertebrate")],
+            [Fact("?x", "is", "mammal")],
+        )
+    )
+    kb.infer()
+    assert Fact("dog", "is", "mammal") in kb.facts
+
+
+def _bytes_per_fact(factory, count):
+    tracemalloc.start()
+    store = factory(
+        Fact(f"entity{i // 20}", f"attr{i % 20}", f"value{i % 300}") for i in range(count)
+    )
+    if hasattr(store, "compact"):
+        store.compact()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current / len(store)
+
+
+def test_columnar_store_uses_five_times_less_memory():
+    count = 20000
+    assert _bytes_per_fact(FactStore, count) >= 5 * _bytes_per_fact(ColumnarFactStore, count)
@@ -0,0 +1,91 @@
+import random
+
+import pytest
+
+from clyps.compiler import CompiledRule
+from clyps.fact import Fact
+from clyps.planner import join
+from clyps.rule import Rule
+from clyps.store import FactStore
+
+
+def _random_store(seed=3, count=300):
+    rng = random.Random(seed)
+    return FactStore(
+        Fact(f"n{rng.randrange(30)}", rng.choice(["knows", "likes"]), f"n{rng.randrange(30)}")
+        for _ in range(count)
+    )
+
+
+def _normalise(matches):
+    return sorted((sorted(bindings.items()), facts) for bindings, facts in matches)
+
+
+def test_compiled_matches_agree_with_planner():
+    store = _random_store()
+    conditions = [Fact("?x", "knows", "?y"), Fact("?y", "likes", "?z"), Fact("?z", "knows", "?x")]
+    compiled = CompiledRule(conditions, [Fact("?x", "friend", "?z")])
+    matches = [(compiled.bindings(values), facts) for values, facts in compiled.matches(store)]
+    assert matches
+    assert _normalise(matches) == _normalise(join(conditions, store))
+
+
+def test_compiled_matches_with_delta_agree_with_planner():
+    store = _random_store()
+    delta = FactStore(list(store)[-20:])
+    conditions = [Fact("?x", "knows", "?y"), Fact("?y", "knows", "?z")]
+    compiled = CompiledRule(conditions, [])
+    matches = [(compiled.bindings(values), facts) for values, facts in compiled.matches(store, delta)]
+    assert _normalise(matches) == _normalise(join(conditions, store, delta))
+
+
+def test_compiled_same_variable_twice():
+    store = FactStore([Fact("a", "likes", "a"), Fact("a", "likes", "b"), Fact("?v", "likes", "?v")])
+    compiled = CompiledRule([Fact("?x", "likes", "?x")], [])
+    assert [values for values, _ in compiled.matches(store)] == [("a",)]
+
+
+def test_compiled_derive_follows_apply_bindings():
+    compiled = CompiledRule(
+        [Fact("?x", "has", "?y")],
+        [Fact("?x", "is", "mammal"), Fact("?x", "owns", "?y"), Fact("rex", "is", "dog")],
+    )
+    assert compiled.derive(("dog", "hair")) == [Fact("dog", "is", "mammal"), Fact("dog", "owns", "hair")]
+
+
+def test_rule_caches_compiled_form():
+    rule = Rule("mammalRule", [Fact("?x", "has", "hair")], [Fact("?x", "is", "mammal")])
+    compiled = rule.compiled()
+    assert rule.compiled() is compiled
+    with pytest.raises(AttributeError):
+        rule.conditions.append(Fact("?x", "is", "vertebrate"))
+    with pytest.raises(AttributeError):
+        rule.actions = []
+    assert rule.compiled() is compiled
+    assert rule.conditions == [Fact("?x", "has", "hair")]
+
+
+def test_compiled_rule_caches_join_plans():
+    compiled = CompiledRule([Fact("?x", "has", "?y"), Fact("?y", "is", "?z")], [Fact("?x", "likes", "?z")])
+    store = FactStore([Fact("a", "has", "b"), Fact("b", "is", "c")])
+    assert list(compiled.matches(store))
+    cached = compiled._plans[None]
+    store.add(Fact("d", "has", "e"))
+    list(compiled.matches(store))
+    # Same store, same power of two: the order is reused
+    assert compiled._plans[None] is cached
+    for i in range(10):
+        store.add(Fact(f"x{i}", "has", "y"))
+    list(compiled.matches(store))
+    assert compiled._plans[None] is not cached
+
+
+def test_compiled_fire_derives_from_the_matches_with_the_delta():
+    compiled = CompiledRule([Fact("?x", "has", "hair")], [Fact("?x", "is", "mammal")])
+    store = FactStore([Fact("cat", "has", "hair"), Fact("dog", "has", "hair")])
+    assert compiled.fire(store) == [Fact("cat", "is", "mammal"), Fact("dog", "is", "mammal")]
+    assert compiled.fire(store, FactStore([Fact("dog", "has", "hair")])) == [Fact("dog", "is", "mammal")]
+    ground = CompiledRule([Fact("cat", "has", "hair")], [Fact("cat", "is", "mammal")])
+    assert ground.fire(store) == [Fact("cat", "is", "mammal")]
+    assert ground.fire(store, FactStore([Fact("dog", "has", "hair")])) == []
+    assert CompiledRule([], [Fact("zoo", "is", "open")]).fire(store) == [Fact("zoo", "is", "open")]
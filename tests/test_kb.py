@@ -1,3 +1,5 @@
+import pytest
+
 from clyps.fact import Fact
 from clyps.rule import Rule
 from clyps.kb import KnowledgeBase
@@ -125,3 +127,126 @@ def test_apply_bindings():
     bindings = [{"?x": "dog"}]
     new_facts = kb._apply_bindings(rule.actions[0], bindings)
     assert Fact("dog", "is", "mammal") in new_facts
+
+
+def test_add_fact_deduplicates():
+    kb = KnowledgeBase()
+    kb.add_fact(Fact("dog", "has", "hair"))
+    kb.add_fact(Fact("dog", "has", "hair"))
+    assert len(kb.facts) == 1
+
+
+def test_facts_setter_accepts_list():
+    kb = KnowledgeBase()
+    kb.facts = [Fact("dog", "has", "hair")]
+    assert Fact("dog", "has", "hair") in kb.facts
+    assert kb.facts == [Fact("dog", "has", "hair")]
+
+
+def _ancestor_kb(engine, length):
+    kb = KnowledgeBase(engine=engine)
+    for i in range(length):
+        kb.add_fact(Fact(f"n{i}", "parent", f"n{i + 1}"))
+    kb.add_rule(Rule("baseRule", [Fact("?x", "parent", "?y")], [Fact("?x", "ancestor", "?y")]))
+    kb.add_rule(
+        Rule(
+            "ancestorRule",
+            [Fact("?x", "parent", "?y"), Fact("?y", "ancestor", "?z")],
+            [Fact("?x", "ancestor", "?z")],
+        )
+    )
+    return kb
+
+
+def test_infer_seminaive_matches_naive():
+    naive = _ancestor_kb("naive", 20)
+    seminaive = _ancestor_kb("seminaive", 20)
+    naive.infer()
+    seminaive.infer()
+    assert set(naive.facts) == set(seminaive.facts)
+    assert len(seminaive.facts) == 20 + 20 * 21 // 2
+
+
+def test_infer_seminaive_ground_rule():
+    kb = KnowledgeBase(engine="seminaive")
+    kb.add_fact(Fact("dog", "has", "hair"))
+    kb.add_fact(Fact("dog", "is", "vertebrate"))
+    kb.add_rule(
+        Rule(
+            "mammalRule",
+            [Fact("?x", "has", "hair"), Fact("?x", "is", "vertebrate")],
+            [Fact("?x", "is", "mammal")],
+        )
+    )
+    kb.add_rule(Rule("dogRule", [Fact("dog", "is", "mammal")], [Fact("dog", "has", "fur")]))
+    kb.infer()
+    assert Fact("dog", "has", "fur") in kb.facts
+
+
+def test_infer_seminaive_resumes_from_new_facts():
+    kb = KnowledgeBase(engine="seminaive", stats=True)
+    kb.add_rule(Rule("mammal", [Fact("?x", "has", "hair")], [Fact("?x", "is", "mammal")]))
+    for i in range(50):
+        kb.add_fact(Fact(f"a{i}", "has", "hair"))
+    kb.infer()
+    kb.stats.reset()
+    kb.add_fact(Fact("dog", "has", "hair"))
+    kb.infer()
+    assert Fact("dog", "is", "mammal") in kb.facts
+    assert kb.stats.cycles[0]["mammal"].combinations == 1
+
+    # A new rule has to see every fact again
+    kb.add_rule(Rule("furry", [Fact("?x", "is", "mammal")], [Fact("?x", "is", "furry")]))
+    kb.infer()
+    assert len(kb.facts.lookup(None, "is", "furry")) == 51
+
+
+def _many_rules_kb(engine):
+    kb = KnowledgeBase(engine=engine, stats=True)
+    # A chain a0 -> a1 -> ... -> a9 and 2000 rules nothing ever wakes up
+    for i in range(9):
+        kb.add_rule(Rule(f"chain{i}", [Fact("?x", f"a{i}", "?y")], [Fact("?x", f"a{i + 1}", "?y")]))
+    for i in range(2000):
+        kb.add_rule(Rule(f"quiet{i}", [Fact("?x", f"q{i}", "?y")], [Fact("?x", f"r{i}", "?y")]))
+    kb.add_fact(Fact("dog", "a0", "yes"))
+    return kb
+
+
+def test_seminaive_only_wakes_rules_whose_inputs_changed():
+    kb = _many_rules_kb("seminaive")
+    kb.infer()
+    assert Fact("dog", "a9", "yes") in kb.facts
+    assert set(kb.stats.rules) == {f"chain{i}" for i in range(9)}
+    assert len(kb.stats.cycles) == 9
+
+
+def test_naive_skips_rules_whose_inputs_did_not_change():
+    kb = _many_rules_kb("naive")
+    kb.infer()
+    assert Fact("dog", "a9", "yes") in kb.facts
+    # Every rule runs once; afterwards only the chain rules are re-run
+    assert sum(len(cycle) for cycle in kb.stats.cycles[1:]) < 20
+
+
+@pytest.mark.parametrize("engine", KnowledgeBase.ENGINES)
+def test_rules_without_conditions_fire_with_every_engine(engine):
+    kb = KnowledgeBase(engine=engine, workers=1)
+    kb.loads("""
+    (defrule default => (zoo is open))
+    (defrule visit (?place is open) => (?place has visitors))
+    (cat has hair)
+    """)
+    kb.infer()
+    assert Fact("zoo", "is", "open") in kb.facts
+    assert Fact("zoo", "has", "visitors") in kb.facts
+
+
+def test_facts_cannot_be_appended_behind_the_engines_back():
+    kb = KnowledgeBase(engine="seminaive")
+    kb.add_rule(Rule("mammal", [Fact("?x", "has", "hair")], [Fact("?x", "is", "mammal")]))
+    kb.infer()
+    with pytest.raises(AttributeError):
+        kb.facts.append(Fact("cat", "has", "hair"))
+    kb.add_fact(Fact("cat", "has", "hair"))
+    kb.infer()
+    assert Fact("cat", "is", "mammal") in kb.facts
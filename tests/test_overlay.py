@@ -0,0 +1,221 @@
+import copy
+import random
+import tracemalloc
+
+import pytest
+
+from clyps.fact import Fact
+from clyps import overlay
+from clyps.columnar import ColumnarFactStore
+from clyps.kb import KnowledgeBase
+from clyps.overlay import OverlayFactStore, OverlaySet
+from clyps.rule import Rule
+from clyps.store import FactStore
+from clyps.versioned import VersionedFactStore
+
+
+def test_overlay_store_behaves_like_a_copy():
+    rng = random.Random(5)
+    facts = [Fact(f"e{rng.randrange(6)}", f"a{rng.randrange(3)}", f"v{rng.randrange(4)}") for _ in range(40)]
+    base = FactStore(facts)
+    overlay = OverlayFactStore(base)
+    expected = FactStore(base)
+    for _ in range(300):
+        fact = Fact(f"e{rng.randrange(6)}", f"a{rng.randrange(3)}", f"v{rng.randrange(4)}")
+        if rng.random() < 0.5:
+            assert overlay.add(fact) == expected.add(fact)
+        else:
+            assert overlay.discard(fact) == expected.discard(fact)
+        assert len(overlay) == len(expected)
+    assert set(overlay) == set(expected)
+    assert base == FactStore(facts)
+    for condition in (Fact("?x", "a1", "?y"), Fact("e2", "a0", "?y"), Fact("?x", "a2", "v3"), Fact("e1", "a1", "v1")):
+        assert sorted(map(str, overlay.candidates(condition))) == sorted(map(str, expected.candidates(condition)))
+        assert len(overlay.candidates(condition)) == len(list(expected.candidates(condition)))
+    added = next(iter(overlay.added), None)
+    if added is not None:
+        assert overlay.sequence(added) >= base._sequence
+
+
+def test_overlay_set():
+    derived = OverlaySet({1, 2, 3})
+    derived.add(4)
+    derived.discard(2)
+    derived -= {3, 5}
+    derived.add(3)
+    assert set(derived) == {1, 3, 4} and len(derived) == 3
+    assert 2 not in derived and 3 in derived
+
+
+def _kb(engine="seminaive", **kwargs):
+    kb = KnowledgeBase(engine=engine, **kwargs)
+    kb.add_rule(Rule("base", [Fact("?x", "parent", "?y")], [Fact("?x", "ancestor", "?y")]))
+    kb.add_rule(Rule("step", [Fact("?x", "parent", "?y"), Fact("?y", "ancestor", "?z")],
+                     [Fact("?x", "ancestor", "?z")]))
+    for i in range(20):
+        kb.add_fact(Fact(f"n{i}", "parent", f"n{i + 1}"))
+    kb.infer()
+    return kb
+
+
+def test_overlay_lookup_filters_removed_facts_lazily():
+    base = FactStore(Fact(f"e{i}", "a", f"v{i % 3}") for i in range(10))
+    overlay = OverlayFactStore(base)
+    overlay.discard(Fact("e0", "a", "v0"))
+    overlay.discard(Fact("e1", "a", "v1"))
+    facts = overlay.lookup(None, "a", "v0")
+    assert not isinstance(facts, list)
+    assert len(facts) == 3
+    assert list(facts) == [Fact(f"e{i}", "a", "v0") for i in (3, 6, 9)]
+    assert len(overlay.lookup(None, "a", None)) == 8
+    assert len(overlay.lookup("e1", None, None)) == 0
+
+
+def test_overlay_chains_are_compacted():
+    rng = random.Random(7)
+    facts = [Fact(f"e{rng.randrange(6)}", f"a{rng.randrange(3)}", f"v{rng.randrange(4)}") for _ in range(20)]
+    store = FactStore(facts)
+    expected = FactStore(store)
+    for _ in range(30):
+        store = OverlayFactStore(store)
+        assert store.depth <= overlay.MAX_DEPTH + 1
+        for _ in range(5):
+            fact = Fact(f"e{rng.randrange(6)}", f"a{rng.randrange(3)}", f"v{rng.randrange(4)}")
+            if rng.random() < 0.5:
+                assert store.add(fact) == expected.add(fact)
+            else:
+                assert store.discard(fact) == expected.discard(fact)
+        assert sorted(store, key=repr) == sorted(expected, key=repr)
+        order = sorted(expected, key=expected.sequence)
+        assert sorted(store, key=store.sequence) == order
+        assert len(store.lookup(None, "a0", None)) == len(expected.lookup(None, "a0", None))
+    items = OverlaySet({1, 2, 3})
+    for step in range(30):
+        items = OverlaySet(items)
+        assert items.depth <= overlay.MAX_DEPTH + 1
+        items.add(step)
+        items.discard(step - 2)
+    assert set(items) == {28, 29}
+
+
+def test_fork_chains_stay_shallow():
+    kb = _kb()
+    for i in range(20):
+        kb.fork()
+        kb.add_fact(Fact(f"x{i}", "parent", "n0"))
+        kb.infer()
+    assert kb.facts.depth <= overlay.MAX_DEPTH + 1
+    assert Fact("x19", "ancestor", "n20") in kb.facts
+
+
+@pytest.mark.parametrize("engine", [engine for engine in KnowledgeBase.ENGINES if engine != "sql"])
+def test_fork_matches_a_deep_copy(engine):
+    kb = _kb(engine)
+    expected = copy.deepcopy(kb)
+    child = kb.fork()
+    for knowledge_base in (expected, child):
+        knowledge_base.add_fact(Fact("n20", "parent", "n21"))
+        knowledge_base.remove_fact(Fact("n0", "parent", "n1"))
+        knowledge_base.infer()
+    assert set(child.facts) == set(expected.facts)
+    assert Fact("n1", "ancestor", "n21") in child.facts
+    assert Fact("n1", "ancestor", "n21") not in kb.facts
+    assert Fact("n0", "parent", "n1") in kb.facts
+
+
+def test_fork_is_isolated_from_the_parent_and_siblings():
+    kb = _kb()
+    first = kb.fork()
+    second = kb.fork()
+    assert first.facts.base is second.facts.base is kb.facts.base
+    kb.add_fact(Fact("x", "parent", "n0"))
+    kb.infer()
+    first.add_fact(Fact("y", "parent", "n0"))
+    first.infer()
+    assert Fact("x", "ancestor", "n20") in kb.facts
+    assert Fact("x", "ancestor", "n20") not in first.facts and Fact("x", "ancestor", "n20") not in second.facts
+    assert Fact("y", "ancestor", "n20") in first.facts and Fact("y", "ancestor", "n20") not in kb.facts
+    # Forking after a change keeps the earlier forks unaffected
+    third = kb.fork()
+    assert Fact("x", "ancestor", "n20") in third.facts
+    assert len(second.facts) == 20 + 20 * 21 // 2
+
+
+def test_fork_resumes_inference_from_the_parent_state():
+    kb = _kb("seminaive", stats=True)
+    child = kb.fork()
+    child.add_fact(Fact("n20", "parent", "n21"))
+    child.infer()
+    assert len(child.facts.added) == 1 + 21
+    # Only the joins with the new facts were evaluated
+    assert sum(stats.combinations for stats in child.stats.rules.values()) < 100
+
+
+def test_fork_with_truth_maintenance():
+    kb = _kb(truth_maintenance=True)
+    child = kb.fork()
+    child.remove_fact(Fact("n10", "parent", "n11"))
+    assert Fact("n0", "ancestor", "n20") not in child.facts
+    assert Fact("n0", "ancestor", "n10") in child.facts
+    assert Fact("n0", "ancestor", "n20") in kb.facts
+    kb.remove_fact(Fact("n5", "parent", "n6"))
+    assert Fact("n0", "ancestor", "n10") in child.facts
+    assert Fact("n0", "ancestor", "n10") not in kb.facts
+
+
+def test_fork_memory_is_proportional_to_its_changes():
+    kb = KnowledgeBase(engine="seminaive")
+    kb.add_rule(Rule("copy", [Fact("?x", "a", "?y")], [Fact("?x", "b", "?y")]))
+    for i in range(20000):
+        kb.add_fact(Fact(f"e{i}", "a", "v"))
+    kb.infer()
+    kb.fork()
+    tracemalloc.start()
+    children = [kb.fork() for _ in range(10)]
+    for child in children:
+        child.add_fact(Fact("new", "a", "v"))
+        child.infer()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert all(Fact("new", "b", "v") in child.facts for child in children)
+    assert current < 200000
+
+
+def test_fork_keeps_a_versioned_parent_store():
+    kb = _kb(store=VersionedFactStore())
+    before = kb.snapshot()
+    kb.add_fact(Fact("x", "parent", "n0"))
+    child = kb.fork()
+    assert isinstance(kb.facts, VersionedFactStore)
+    # Forking does not publish the parent's pending changes
+    assert kb.snapshot() is before
+    assert Fact("x", "parent", "n0") in child.facts
+    kb.remove_fact(Fact("n0", "parent", "n1"))
+    kb.infer()
+    snapshot = kb.snapshot()
+    assert snapshot.generation == before.generation + 1
+    assert Fact("x", "ancestor", "n20") in snapshot and Fact("n0", "parent", "n1") not in snapshot
+    assert Fact("n0", "parent", "n1") in child.facts
+    child.infer()
+    assert Fact("x", "ancestor", "n20") in child.facts and Fact("n0", "parent", "n1") not in kb.facts
+
+
+def test_fork_keeps_a_columnar_parent_store():
+    kb = _kb(store=ColumnarFactStore())
+    kb.remove_fact(Fact("n19", "parent", "n20"))
+    child = kb.fork()
+    assert isinstance(kb.facts, ColumnarFactStore)
+    kb.add_fact(Fact("x", "parent", "n0"))
+    kb.remove_fact(Fact("n0", "parent", "n1"))
+    kb.infer()
+    assert Fact("x", "ancestor", "n19") in kb.facts
+    assert Fact("x", "parent", "n0") not in child.facts and Fact("n0", "parent", "n1") in child.facts
+    assert Fact("n19", "parent", "n20") not in child.facts
+    child.add_fact(Fact("y", "parent", "n0"))
+    child.infer()
+    assert Fact("y", "ancestor", "n19") in child.facts and Fact("y", "ancestor", "n19") not in kb.facts
+
+
+def test_sql_engine_cannot_fork():
+    with pytest.raises(ValueError):
+        KnowledgeBase(engine="sql").fork()
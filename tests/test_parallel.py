@@ -0,0 +1,60 @@
+import random
+
+from clyps.depgraph import DependencyGraph
+from clyps.fact import Fact
+from clyps.kb import KnowledgeBase
+from clyps.rule import Rule
+
+
+def _rules():
+    return [
+        Rule("base", [Fact("?x", "parent", "?y")], [Fact("?x", "ancestor", "?y")]),
+        Rule("step", [Fact("?x", "parent", "?y"), Fact("?y", "ancestor", "?z")], [Fact("?x", "ancestor", "?z")]),
+        Rule("old", [Fact("?x", "ancestor", "?y")], [Fact("?y", "is", "younger")]),
+        Rule("mammal", [Fact("?x", "has", "hair")], [Fact("?x", "is", "mammal")]),
+        Rule("dog", [Fact("dog", "is", "mammal")], [Fact("dog", "has", "fur")]),
+    ]
+
+
+def test_dependency_graph_components():
+    graph = DependencyGraph(_rules())
+    # "dog" derives "has" facts, so it is recursive with "mammal"
+    assert graph.components() == [[0], [1], [2], [3, 4]]
+
+
+def test_dependency_graph_recursive_component():
+    rules = [
+        Rule("r1", [Fact("?x", "p", "?y")], [Fact("?x", "q", "?y")]),
+        Rule("r2", [Fact("?x", "q", "?y")], [Fact("?x", "p", "?y")]),
+    ]
+    assert DependencyGraph(rules).components() == [[0, 1]]
+
+
+def test_parallel_infer_matches_sequential():
+    sequential = KnowledgeBase(engine="seminaive")
+    parallel = KnowledgeBase(engine="parallel", workers=2)
+    for kb in (sequential, parallel):
+        for i in range(12):
+            kb.add_fact(Fact(f"n{i}", "parent", f"n{i + 1}"))
+        kb.add_fact(Fact("dog", "has", "hair"))
+        for rule in _rules():
+            kb.add_rule(rule)
+        kb.infer()
+    assert set(parallel.facts) == set(sequential.facts)
+    assert Fact("dog", "has", "fur") in parallel.facts
+
+
+def test_parallel_infer_shards_a_recursive_rule():
+    rng = random.Random(4)
+    edges = {(f"n{rng.randrange(40)}", f"n{rng.randrange(40)}") for _ in range(60)}
+    results = []
+    for engine, workers in (("seminaive", None), ("parallel", 3)):
+        kb = KnowledgeBase(engine=engine, workers=workers)
+        kb.add_rule(Rule("reach", [Fact("?x", "reach", "?y"), Fact("?y", "reach", "?z")],
+                         [Fact("?x", "reach", "?z")]))
+        for entity, value in edges:
+            kb.add_fact(Fact(entity, "reach", value))
+        kb.infer()
+        results.append(set(kb.facts))
+    assert results[0] == results[1]
+    assert len(results[0]) > len(edges)
@@ -0,0 +1,111 @@
+import io
+
+import pytest
+
+from clyps.fact import Fact
+from clyps.kb import KnowledgeBase
+from clyps.parser import ParseError, format_rule, parse, parse_fact, parse_file, parse_rule, tokenize
+from clyps.rule import Rule
+
+SOURCE = """
+; animals
+(dog has hair)
+(assert (cat has hair) (cat is vertebrate))
+(deffacts farm
+    (cow has hair)
+    (cow gives milk))
+(defrule mammalRule "hairy animals"
+    (?x has hair)
+    =>
+    (?x is mammal))
+(defrule milkRule (?x gives milk) => (assert (?x is mammal) (?x is farm)))
+"""
+
+
+def test_tokenize_skips_comments_and_whitespace():
+    tokens = [text for _, text, _ in tokenize('(a b c) ; comment\n(d e "f g")')]
+    assert tokens == ["(", "a", "b", "c", ")", "(", "d", "e", '"f g"', ")"]
+
+
+def test_parse_source():
+    items = parse(SOURCE)
+    facts = [item for item in items if isinstance(item, Fact)]
+    rules = [item for item in items if isinstance(item, Rule)]
+    assert facts == [
+        Fact("dog", "has", "hair"),
+        Fact("cat", "has", "hair"),
+        Fact("cat", "is", "vertebrate"),
+        Fact("cow", "has", "hair"),
+        Fact("cow", "gives", "milk"),
+    ]
+    assert rules == [
+        Rule("mammalRule", [Fact("?x", "has", "hair")], [Fact("?x", "is", "mammal")]),
+        Rule("milkRule", [Fact("?x", "gives", "milk")], [Fact("?x", "is", "mammal"), Fact("?x", "is", "farm")]),
+    ]
+
+
+def test_parse_error_reports_line_and_column():
+    try:
+        parse("(dog has hair)\n(cat has)\n")
+    except ParseError as e:
+        assert (e.line, e.column) == (2, 9)
+        assert str(e) == "Expected fact value, found ')' at line 2, column 9"
+    else:
+        assert False, "ParseError not raised"
+
+
+def test_parse_error_unterminated_string():
+    try:
+        parse('(dog says "woof)')
+    except ParseError as e:
+        assert (e.line, e.column) == (1, 11)
+    else:
+        assert False, "ParseError not raised"
+
+
+def test_parse_rule_without_arrow():
+    try:
+        parse_rule("(defrule broken (?x has hair))")
+    except ParseError as e:
+        assert e.message == "Expected '=>' in rule"
+    else:
+        assert False, "ParseError not raised"
+
+
+def test_parse_fact_and_rule():
+    assert parse_fact("( dog  has hair )") == Fact("dog", "has", "hair")
+    rule = parse_rule("(defrule r (?x has hair) => (?x is mammal))")
+    assert rule.name == "r"
+
+
+def test_parse_file_from_stream():
+    assert len(parse_file(io.StringIO(SOURCE))) == 7
+
+
+def test_knowledge_base_load(tmp_path):
+    path = tmp_path / "animals.clp"
+    path.write_text(SOURCE)
+    kb = KnowledgeBase()
+    kb.load(str(path))
+    assert len(kb.rules) == 2
+    kb.infer()
+    assert Fact("cow", "is", "farm") in kb.facts
+    assert Fact("dog", "is", "mammal") in kb.facts
+
+
+def test_knowledge_base_loads_is_atomic():
+    kb = KnowledgeBase()
+    try:
+        kb.loads("(dog has hair)\n(cat")
+    except ParseError:
+        pass
+    assert len(kb.facts) == 0
+
+
+def test_rule_salience():
+    rule = parse_rule('(defrule urgent "doc" (declare (salience 10)) (?x is sick) => (?x needs vet))')
+    assert rule.salience == 10
+    assert parse_rule(format_rule(rule)).salience == 10
+    assert parse_rule("(defrule r (?x is sick) => (?x needs vet))").salience == 0
+    with pytest.raises(ParseError):
+        parse_rule("(defrule r (declare (salience high)) (?x is sick) => (?x needs vet))")
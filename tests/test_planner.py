@@ -0,0 +1,38 @@
+from clyps.fact import Fact
+from clyps.planner import join, plan
+from clyps.store import FactStore
+
+
+def _store():
+    facts = [Fact(f"p{i}", "knows", f"p{i + 1}") for i in range(20)]
+    facts.append(Fact("p3", "is", "admin"))
+    return FactStore(facts)
+
+
+def test_plan_starts_with_most_selective_condition():
+    conditions = [Fact("?x", "knows", "?y"), Fact("?y", "knows", "?z"), Fact("?x", "is", "admin")]
+    assert plan(conditions, _store()) == [2, 0, 1]
+
+
+def test_plan_with_forced_first_condition():
+    conditions = [Fact("?x", "knows", "?y"), Fact("?y", "knows", "?z"), Fact("?x", "is", "admin")]
+    assert plan(conditions, _store(), first=1)[0] == 1
+
+
+def test_join_returns_bindings_and_facts():
+    conditions = [Fact("?x", "knows", "?y"), Fact("?y", "knows", "?z"), Fact("?x", "is", "admin")]
+    matches = list(join(conditions, _store()))
+    assert matches == [
+        (
+            {"?x": "p3", "?y": "p4", "?z": "p5"},
+            (Fact("p3", "knows", "p4"), Fact("p4", "knows", "p5"), Fact("p3", "is", "admin")),
+        )
+    ]
+
+
+def test_join_with_delta_produces_each_match_once():
+    store = _store()
+    conditions = [Fact("?x", "knows", "?y"), Fact("?y", "knows", "?z")]
+    delta = FactStore([Fact("p4", "knows", "p5"), Fact("p5", "knows", "p6")])
+    matches = [bindings for bindings, _ in join(conditions, store, delta)]
+    assert sorted(m["?x"] for m in matches) == ["p3", "p4", "p5"]
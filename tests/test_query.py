@@ -0,0 +1,64 @@
+import pytest
+
+from clyps.columnar import ColumnarFactStore
+from clyps.fact import Fact
+from clyps.kb import KnowledgeBase
+
+
+@pytest.fixture(params=["default", "columnar"])
+def kb(request):
+    kb = KnowledgeBase(store=ColumnarFactStore() if request.param == "columnar" else None)
+    kb.loads("""
+        (dog is mammal) (cat is mammal) (trout is fish)
+        (dog has hair) (cat has hair) (trout has scales)
+        (dog likes cat) (cat likes cat) (?x is mammal)
+    """)
+    return kb
+
+
+def test_single_pattern(kb):
+    results = kb.query("(?x is mammal)")
+    assert iter(results) is results
+    # Facts holding variables are not matched
+    assert sorted(b["?x"] for b in results) == ["cat", "dog"]
+
+
+def test_conjunctive_query(kb):
+    assert list(kb.query("(?x is mammal)", Fact("?x", "likes", "?y"))) in (
+        [{"?x": "dog", "?y": "cat"}, {"?x": "cat", "?y": "cat"}],
+        [{"?x": "cat", "?y": "cat"}, {"?x": "dog", "?y": "cat"}],
+    )
+    assert list(kb.query("(?x likes ?x)")) == [{"?x": "cat"}]
+    assert list(kb.query("(?x is fish) (?x has ?covering)")) == [{"?x": "trout", "?covering": "scales"}]
+
+
+def test_ground_and_empty_queries(kb):
+    assert list(kb.query("(dog has hair)")) == [{}]
+    assert list(kb.query("(dog has scales)")) == []
+    assert list(kb.query("(?x is bird)")) == []
+
+
+def test_limit_and_offset(kb):
+    everything = list(kb.query("(?x has ?y)"))
+    assert len(everything) == 3
+    assert list(kb.query("(?x has ?y)", limit=2)) == everything[:2]
+    assert list(kb.query("(?x has ?y)", offset=1, limit=5)) == everything[1:]
+    assert list(kb.query("(?x has ?y)", offset=3)) == []
+
+
+def test_query_rejects_rules(kb):
+    with pytest.raises(ValueError):
+        list(kb.query("(defrule r (?x is mammal) => (?x is animal))"))
+
+
+def test_query_uses_indexes():
+    kb = KnowledgeBase()
+    for i in range(1000):
+        kb.add_fact(Fact(f"e{i}", "value", str(i)))
+    kb.add_fact(Fact("e7", "tag", "special"))
+    probes = []
+    candidates = kb.facts.candidates
+    kb.facts.candidates = lambda condition: probes.append(condition) or candidates(condition)
+    assert list(kb.query("(?x value ?v)", "(?x tag special)")) == [{"?x": "e7", "?v": "7"}]
+    # The selective pattern goes first and binds ?x for the second lookup
+    assert probes[-2:] == [Fact("?x", "tag", "special"), Fact("e7", "value", "?v")]
@@ -0,0 +1,100 @@
+from clyps.fact import Fact
+from clyps.kb import KnowledgeBase
+from clyps.rete import ReteNetwork
+from clyps.rule import Rule
+
+
+def _mammal_rule():
+    return Rule(
+        "mammalRule",
+        [Fact("?x", "has", "hair"), Fact("?x", "is", "vertebrate")],
+        [Fact("?x", "is", "mammal")],
+    )
+
+
+def test_rete_infer():
+    kb = KnowledgeBase(engine="rete")
+    kb.add_fact(Fact("dog", "has", "hair"))
+    kb.add_fact(Fact("dog", "is", "vertebrate"))
+    kb.add_fact(Fact("cat", "has", "hair"))
+    kb.add_rule(_mammal_rule())
+    kb.infer()
+    assert Fact("dog", "is", "mammal") in kb.facts
+    assert Fact("cat", "is", "mammal") not in kb.facts
+
+
+def test_rete_ground_rule():
+    kb = KnowledgeBase(engine="rete")
+    kb.add_fact(Fact("dog", "is", "mammal"))
+    kb.add_rule(Rule("dogRule", [Fact("dog", "is", "mammal")], [Fact("dog", "has", "fur")]))
+    kb.infer()
+    assert Fact("dog", "has", "fur") in kb.facts
+
+
+def test_rete_chained_rules():
+    kb = KnowledgeBase(engine="rete")
+    kb.add_fact(Fact("dog", "has", "hair"))
+    kb.add_fact(Fact("dog", "is", "vertebrate"))
+    kb.add_rule(_mammal_rule())
+    kb.add_rule(Rule("dogRule", [Fact("dog", "is", "mammal")], [Fact("dog", "has", "fur")]))
+    kb.infer()
+    assert Fact("dog", "has", "fur") in kb.facts
+
+
+def test_rete_incremental_add_fact():
+    kb = KnowledgeBase(engine="rete")
+    kb.add_rule(_mammal_rule())
+    kb.add_fact(Fact("dog", "has", "hair"))
+    kb.infer()
+    assert Fact("dog", "is", "mammal") not in kb.facts
+    kb.add_fact(Fact("dog", "is", "vertebrate"))
+    kb.infer()
+    assert Fact("dog", "is", "mammal") in kb.facts
+
+
+def test_rete_remove_fact_drops_pending_activation():
+    kb = KnowledgeBase(engine="rete")
+    kb.add_rule(_mammal_rule())
+    kb.infer()
+    kb.add_fact(Fact("dog", "has", "hair"))
+    kb.add_fact(Fact("dog", "is", "vertebrate"))
+    kb.remove_fact(Fact("dog", "has", "hair"))
+    kb.infer()
+    assert Fact("dog", "is", "mammal") not in kb.facts
+
+
+def test_rete_transitive_closure_matches_naive():
+    rule = Rule(
+        "ancestorRule",
+        [Fact("?x", "parent", "?y"), Fact("?y", "ancestor", "?z")],
+        [Fact("?x", "ancestor", "?z")],
+    )
+    base = Rule("baseRule", [Fact("?x", "parent", "?y")], [Fact("?x", "ancestor", "?y")])
+    kb = KnowledgeBase(engine="rete")
+    for i in range(6):
+        kb.add_fact(Fact(f"n{i}", "parent", f"n{i + 1}"))
+    kb.add_rule(base)
+    kb.add_rule(rule)
+    kb.infer()
+    ancestors = {(f.entity, f.value) for f in kb.facts if f.attribute == "ancestor"}
+    assert ancestors == {(f"n{i}", f"n{j}") for i in range(7) for j in range(i + 1, 7)}
+
+
+def test_rete_shares_join_nodes():
+    rule1 = _mammal_rule()
+    rule2 = Rule(
+        "furRule",
+        [Fact("?y", "has", "hair"), Fact("?y", "is", "vertebrate"), Fact("?y", "lives", "home")],
+        [Fact("?y", "is", "pet")],
+    )
+    network = ReteNetwork([rule1, rule2])
+    # Two nodes for the shared prefix plus one for the extra condition
+    assert len(network.join_nodes) == 3
+    assert len(network.alpha_memories) == 3
+
+
+def test_unknown_engine():
+    try:
+        KnowledgeBase(engine="magic")
+    except ValueError as e:
+        assert str(e) == "Unknown inference engine: magic"
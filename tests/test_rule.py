@@ -148,3 +148,44 @@ def test_rule_match_with_variable_and_multiple_match():
     ]
     bindings = rule.match(facts)
     assert bindings == [{"?x": "dog"}, {"?x": "cat"}]
+
+
+def test_rule_match_with_delta():
+    rule = Rule(
+        "mammalRule",
+        [Fact("?x", "has", "hair"), Fact("?x", "is", "vertebrate")],
+        [Fact("?x", "is", "mammal")],
+    )
+    facts = [
+        Fact("dog", "has", "hair"),
+        Fact("dog", "is", "vertebrate"),
+        Fact("cat", "has", "hair"),
+        Fact("cat", "is", "vertebrate"),
+    ]
+    assert rule.match(facts, delta=[Fact("cat", "is", "vertebrate")]) == [{"?x": "cat"}]
+    assert rule.match(facts, delta=[]) == []
+
+
+def test_rule_match_facts_in_any_order():
+    rule = Rule(
+        "mammalRule",
+        [Fact("?x", "has", "hair"), Fact("?x", "is", "vertebrate")],
+        [Fact("?x", "is", "mammal")],
+    )
+    facts = [Fact("dog", "is", "vertebrate"), Fact("dog", "has", "hair")]
+    assert rule.match(facts) == [{"?x": "dog"}]
+
+
+def test_rule_match_same_variable_twice_in_condition():
+    rule = Rule("selfRule", [Fact("?x", "likes", "?x")], [Fact("?x", "is", "vain")])
+    facts = [Fact("narcissus", "likes", "narcissus"), Fact("dog", "likes", "cat")]
+    assert rule.match(facts) == [{"?x": "narcissus"}]
+
+
+def test_rule_match_one_fact_matches_several_conditions():
+    rule = Rule(
+        "hairyRule",
+        [Fact("?x", "has", "hair"), Fact("?x", "has", "?what")],
+        [Fact("?x", "has", "something")],
+    )
+    assert rule.match([Fact("dog", "has", "hair")]) == [{"?x": "dog", "?what": "hair"}]
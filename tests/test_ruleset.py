@@ -0,0 +1,76 @@
+import itertools
+import random
+
+import pytest
+
+from clyps.fact import Fact
+from clyps.kb import KnowledgeBase
+from clyps.rule import Rule
+from clyps.ruleset import RuleSet
+
+SOURCE = """
+(defrule mammal (?x has hair) => (?x is mammal))
+(defrule carnivore (?x is mammal) (?x eats meat) => (?x is carnivore))
+(defrule kin (?x is carnivore) (?x lives ?place) (?y lives ?place) => (?y fears ?x))
+(defrule default => (zoo is open))
+(meat is food)
+"""
+
+
+def _batches(count, seed=1):
+    rng = random.Random(seed)
+    for record in range(count):
+        yield [
+            Fact(f"r{record}a{i}", rng.choice(["has", "eats", "lives"]), rng.choice(["hair", "meat", "north", "south"]))
+            for i in range(rng.randint(0, 8))
+        ]
+
+
+def _expected(batch):
+    kb = KnowledgeBase(engine="seminaive")
+    kb.loads(SOURCE)
+    kb.infer()
+    background = set(kb.facts)
+    for fact in batch:
+        kb.add_fact(fact)
+    kb.infer()
+    return {fact for fact in kb.facts if fact not in background} - set(batch)
+
+
+def test_run_matches_a_knowledge_base_per_batch():
+    rule_set = RuleSet.loads(SOURCE)
+    assert Fact("zoo", "is", "open") in rule_set.facts
+    for batch in _batches(50):
+        assert set(rule_set.run(batch)) == _expected(batch)
+
+
+def test_run_does_not_change_the_rule_set():
+    rule_set = RuleSet.loads(SOURCE)
+    facts = list(rule_set.facts)
+    assert rule_set.run([Fact("rex", "has", "hair")]) == [Fact("rex", "is", "mammal")]
+    assert list(rule_set.facts) == facts
+    assert rule_set.run([Fact("zoo", "is", "open")]) == []
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_many_keeps_the_order_of_the_batches(workers):
+    rule_set = RuleSet.loads(SOURCE)
+    batches = list(_batches(200))
+    results = list(rule_set.run_many(iter(batches), workers=workers, chunksize=7))
+    assert results == [rule_set.run(batch) for batch in batches]
+
+
+def test_run_many_reads_batches_lazily():
+    rule_set = RuleSet([Rule("mammal", [Fact("?x", "has", "hair")], [Fact("?x", "is", "mammal")])])
+    read = []
+
+    def batches():
+        for index in itertools.count():
+            read.append(index)
+            yield [Fact(f"a{index}", "has", "hair")]
+
+    results = rule_set.run_many(batches(), workers=2, chunksize=4)
+    assert [next(results) for _ in range(3)] == [[Fact(f"a{i}", "is", "mammal")] for i in range(3)]
+    results.close()
+    # At most two chunks per worker were read ahead
+    assert len(read) <= 4 * 4 + 4
@@ -0,0 +1,173 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from clyps.fact import Fact
+from clyps.kb import KnowledgeBase
+from clyps.rule import Rule
+from clyps.server import Client, KnowledgeBaseServer
+
+
+def make_kb():
+    kb = KnowledgeBase(engine="seminaive")
+    kb.add_rule(Rule("mammal", [Fact("?x", "has", "hair")], [Fact("?x", "is", "mammal")]))
+    return kb
+
+
+async def stop(listener):
+    # Let the handlers see the closed connections before the loop ends
+    await asyncio.sleep(0.01)
+    listener.close()
+    await listener.wait_closed()
+
+
+async def started(kb, **kwargs):
+    server = KnowledgeBaseServer(kb, **kwargs)
+    listener = await server.start()
+    return server, listener, listener.sockets[0].getsockname()[1]
+
+
+def test_assert_query_retract_over_tcp():
+    async def scenario():
+        kb = make_kb()
+        server, listener, port = await started(kb)
+        client = await Client.connect(port=port)
+        response = await client.assert_facts("(dog has hair)", Fact("cat", "has", "hair"))
+        assert (response["added"], response["derived"]) == (2, 2)
+        assert (await client.assert_facts("(dog has hair)"))["added"] == 0
+
+        results = [b async for b in client.query("(?x is mammal)")]
+        assert sorted(b["?x"] for b in results) == ["cat", "dog"]
+        assert len([b async for b in client.query("(?x is mammal)", limit=1)]) == 1
+
+        assert (await client.retract("(cat has hair)"))["removed"] == 1
+        assert Fact("cat", "has", "hair") not in kb.facts
+
+        await client.load("(defrule warm (?x is mammal) => (?x is warm))")
+        assert (await client.run())["derived"] == 2
+        with pytest.raises(ValueError, match="Unknown op"):
+            await client.request("explode")
+        with pytest.raises(ValueError):
+            await client.assert_facts("(not a fact")
+        # The connection is still usable after errors
+        assert (await client.run())["derived"] == 0
+        await client.close()
+        await stop(listener)
+
+    asyncio.run(scenario())
+
+
+def test_sql_engine_behind_the_server():
+    async def scenario():
+        kb = KnowledgeBase(engine="sql")
+        kb.add_rule(Rule("mammal", [Fact("?x", "has", "hair")], [Fact("?x", "is", "mammal")]))
+        server, listener, port = await started(kb)
+        client = await Client.connect(port=port)
+        response = await client.assert_facts("(dog has hair)", "(cat has hair)")
+        assert (response["added"], response["derived"]) == (2, 2)
+        assert sorted([b["?x"] async for b in client.query("(?x is mammal)")]) == ["cat", "dog"]
+        assert (await client.retract("(cat has hair)"))["removed"] == 1
+        await client.load("(defrule warm (?x is mammal) => (?x is warm))")
+        assert (await client.run())["derived"] == 2
+        await client.close()
+        await stop(listener)
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_assertions_are_batched():
+    async def scenario():
+        kb = make_kb()
+        server, listener, port = await started(kb, batch_delay=0.05)
+        clients = [await Client.connect(port=port) for _ in range(20)]
+        responses = await asyncio.gather(
+            *(client.assert_facts(f"(animal{i} has hair)") for i, client in enumerate(clients))
+        )
+        assert all(response["added"] == 1 for response in responses)
+        assert server.batches == 1
+        assert len(kb.facts) == 40
+        for client in clients:
+            await client.close()
+        await stop(listener)
+
+    asyncio.run(scenario())
+
+
+def test_inference_does_not_block_the_event_loop():
+    async def scenario():
+        kb = make_kb()
+        infer = kb.infer
+
+        def slow_infer(*args):
+            time.sleep(0.2)
+            infer(*args)
+
+        kb.infer = slow_infer
+        server, listener, port = await started(kb)
+        client = await Client.connect(port=port)
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.ensure_future(tick())
+        response = await client.assert_facts("(dog has hair)")
+        assert response["derived"] == 1
+        assert ticks >= 5
+        assert server._flusher is None
+        ticker.cancel()
+        await client.close()
+        await stop(listener)
+
+    asyncio.run(scenario())
+
+
+def test_failed_batches_let_later_batches_run():
+    async def scenario():
+        kb = make_kb()
+        infer = kb.infer
+        calls = []
+
+        def failing_infer(*args):
+            calls.append(args)
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+            infer(*args)
+
+        kb.infer = failing_infer
+        server, listener, port = await started(kb)
+        client = await Client.connect(port=port)
+        with pytest.raises(ValueError, match="boom"):
+            await client.assert_facts("(dog has hair)")
+        assert (await client.assert_facts("(cat has hair)"))["derived"] == 2
+        await client.close()
+        await stop(listener)
+
+    asyncio.run(scenario())
+
+
+def test_unix_socket_and_raw_protocol(tmp_path):
+    async def scenario():
+        kb = make_kb()
+        path = str(tmp_path / "clyps.sock")
+        listener = await KnowledgeBaseServer(kb, chunk_size=2).start(path=path)
+        reader, writer = await asyncio.open_unix_connection(path)
+        writer.write(b'{"id": 7, "op": "assert", "facts": [["a", "has", "hair"], ["b", "has", "hair"], '
+                     b'["c", "has", "hair"]]}\n')
+        writer.write(b"not json\n")
+        writer.write(b'{"id": 8, "op": "query", "pattern": "(?x is mammal)"}\n')
+        responses = [json.loads(await reader.readline()) for _ in range(6)]
+        assert responses[0] == {"id": 7, "ok": True, "added": 3, "derived": 3}
+        assert responses[1]["ok"] is False and responses[1]["id"] is None
+        assert [r["id"] for r in responses[2:]] == [8, 8, 8, 8]
+        assert responses[-1] == {"id": 8, "ok": True, "count": 3}
+        writer.close()
+        await writer.wait_closed()
+        await stop(listener)
+
+    asyncio.run(scenario())
@@ -0,0 +1,89 @@
+import random
+
+import pytest
+
+from clyps.fact import Fact
+from clyps.kb import KnowledgeBase
+from clyps.rule import Rule
+from clyps.sharding import _saturate_shard, is_entity_local, sharded_infer
+
+
+def _rules():
+    return [
+        Rule("mammal", [Fact("?animal", "has", "hair")], [Fact("?animal", "is", "mammal")]),
+        Rule("warm", [Fact("?a", "is", "mammal"), Fact("?a", "eats", "?food")], [Fact("?a", "likes", "?food")]),
+        Rule("base", [Fact("?x", "parent", "?y")], [Fact("?x", "ancestor", "?y")]),
+        Rule("step", [Fact("?x", "parent", "?y"), Fact("?y", "ancestor", "?z")], [Fact("?x", "ancestor", "?z")]),
+        Rule("heir", [Fact("?x", "ancestor", "?y"), Fact("?y", "is", "mammal")], [Fact("?x", "has", "hair")]),
+        Rule("dog", [Fact("dog", "is", "mammal")], [Fact("cat", "has", "hair")]),
+    ]
+
+
+def _facts():
+    rng = random.Random(7)
+    facts = []
+    for i in range(60):
+        if rng.random() < 0.4:
+            facts.append(Fact(f"e{i}", "has", "hair"))
+        facts.append(Fact(f"e{i}", "eats", rng.choice(["meat", "grass", "fish"])))
+        if i % 10:
+            facts.append(Fact(f"e{i}", "parent", f"e{i - 1}"))
+    facts += [Fact("dog", "has", "hair"), Fact("cat", "eats", "fish")]
+    return facts
+
+
+def test_is_entity_local():
+    local = [is_entity_local(_rule) for _rule in _rules()]
+    assert local == [True, True, True, False, False, False]
+    assert not is_entity_local(Rule("other", [Fact("?x", "has", "hair")], [Fact("?y", "is", "mammal")]))
+    assert not is_entity_local(Rule("constant", [Fact("?x", "has", "hair")], [Fact("rex", "is", "mammal")]))
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_sharded_infer_matches_seminaive(workers):
+    sequential = KnowledgeBase(engine="seminaive")
+    sharded = KnowledgeBase(engine="sharded", workers=workers)
+    for kb in (sequential, sharded):
+        for fact in _facts():
+            kb.add_fact(fact)
+        for _rule in _rules():
+            kb.add_rule(_rule)
+        kb.infer()
+    assert set(sharded.facts) == set(sequential.facts)
+    # Derived by a cross-entity rule, then used by the entity-local ones
+    assert Fact("cat", "likes", "fish") in sharded.facts
+
+
+def test_only_entity_local_rules():
+    kb = KnowledgeBase(engine="sharded", workers=2)
+    kb.add_rule(_rules()[0])
+    for i in range(100):
+        kb.add_fact(Fact(f"e{i}", "has", "hair"))
+    kb.infer()
+    assert len(kb.facts) == 200
+    kb.add_fact(Fact("rex", "has", "hair"))
+    kb.infer()
+    assert Fact("rex", "is", "mammal") in kb.facts
+
+
+def test_shard_saturation_returns_derived_facts():
+    triples = [("rex", "has", "hair"), ("rex", "eats", "meat")]
+    derived = _saturate_shard(_rules()[:2], triples)
+    assert derived == [("rex", "is", "mammal"), ("rex", "likes", "meat")]
+
+
+def test_sharded_engine_with_truth_maintenance_and_subscriptions():
+    kb = KnowledgeBase(engine="sharded", workers=2, truth_maintenance=True)
+    kb.add_rule(_rules()[0])
+    kb.add_fact(Fact("rex", "has", "hair"))
+    with kb.subscribe("(?x is mammal)") as subscription:
+        sharded_infer(kb, 2)
+        assert [change.fact for change in subscription.pending()] == [Fact("rex", "is", "mammal")]
+    kb.remove_fact(Fact("rex", "has", "hair"))
+    assert Fact("rex", "is", "mammal") not in kb.facts
+
+
+def test_sharded_engine_rejects_max_cycles():
+    kb = KnowledgeBase(engine="sharded")
+    with pytest.raises(ValueError):
+        kb.infer(max_cycles=1)
@@ -0,0 +1,149 @@
+import struct
+
+import pytest
+
+from clyps.columnar import ColumnarFactStore
+from clyps.fact import Fact
+from clyps.kb import KnowledgeBase
+from clyps.parser import format_rule, parse_rule
+from clyps.rule import Rule
+from clyps.overlay import OverlaySet
+from clyps.snapshot import _HEADER, _SECTION, SECTIONS, SnapshotError, load_snapshot
+
+
+def saturated_kb(**kwargs):
+    kb = KnowledgeBase(engine="seminaive", **kwargs)
+    kb.add_rule(Rule("mammal", [Fact("?x", "has", "hair")], [Fact("?x", "is", "mammal")]))
+    kb.add_rule(Rule("parent", [Fact("?x", "parent", "?y"), Fact("?y", "parent", "?z")],
+                     [Fact("?x", "grandparent", "?z")]))
+    for fact in [Fact("dog", "has", "hair"), Fact("a", "parent", "b"), Fact("b", "parent", "c"),
+                 Fact("café", "has", "hair")]:
+        kb.add_fact(fact)
+    kb.infer()
+    return kb
+
+
+def test_format_rule_round_trip():
+    rule = Rule("r", [Fact("?x", "has", "hair"), Fact("?x", "gives", "milk")], [Fact("?x", "is", "mammal")])
+    parsed = parse_rule(format_rule(rule))
+    assert (parsed.name, parsed.conditions, parsed.actions) == (rule.name, rule.conditions, rule.actions)
+
+
+@pytest.mark.parametrize("use_mmap", [True, False])
+def test_snapshot_round_trip(tmp_path, use_mmap):
+    kb = saturated_kb()
+    path = tmp_path / "kb.snap"
+    kb.save_snapshot(str(path))
+
+    loaded = KnowledgeBase.load_snapshot(str(path), use_mmap=use_mmap, engine="seminaive")
+    assert isinstance(loaded.facts, ColumnarFactStore)
+    assert set(loaded.facts) == set(kb.facts)
+    assert len(loaded.facts) == len(kb.facts)
+    assert [r.name for r in loaded.rules] == ["mammal", "parent"]
+    assert loaded.facts.lookup(None, "grandparent", None) == [Fact("a", "grandparent", "c")]
+    assert Fact("café", "is", "mammal") in loaded.facts
+
+    # The loaded knowledge base keeps working from the saturated state
+    loaded.add_fact(Fact("cat", "has", "hair"))
+    loaded.infer()
+    assert Fact("cat", "is", "mammal") in loaded.facts
+    loaded.remove_fact(Fact("dog", "has", "hair"))
+    assert Fact("dog", "has", "hair") not in loaded.facts
+
+
+def test_snapshot_of_modified_columnar_store(tmp_path):
+    kb = saturated_kb(store=ColumnarFactStore())
+    kb.remove_fact(Fact("a", "parent", "b"))
+    path = tmp_path / "kb.snap"
+    kb.save_snapshot(str(path))
+    assert set(load_snapshot(str(path)).facts) == set(kb.facts)
+
+
+def test_snapshot_keeps_truth_maintenance(tmp_path):
+    kb = saturated_kb(truth_maintenance=True)
+    path = tmp_path / "kb.snap"
+    kb.save_snapshot(str(path))
+
+    loaded = KnowledgeBase.load_snapshot(str(path), engine="seminaive")
+    assert loaded._tms is not None
+    assert set(loaded._tms.derived) == kb._tms.derived
+    assert len(loaded._tms.derived) == len(kb._tms.derived)
+    loaded.remove_fact(Fact("b", "parent", "c"))
+    assert Fact("a", "grandparent", "c") not in loaded.facts
+
+
+def test_snapshot_reads_symbols_and_derived_flags_in_place(tmp_path):
+    kb = saturated_kb(truth_maintenance=True)
+    for i in range(500):
+        kb.add_fact(Fact(f"e{i}", "has", f"v{i}"))
+    path = tmp_path / "kb.snap"
+    kb.save_snapshot(str(path))
+
+    loaded = KnowledgeBase.load_snapshot(str(path), engine="seminaive")
+    symbols = loaded.facts.symbols
+    assert Fact("e7", "has", "v7") in loaded.facts
+    assert Fact("e7", "has", "v8") not in loaded.facts
+    assert symbols.get("missing") is None and "café" in symbols
+    # Only the symbols met by the binary searches were decoded
+    assert not symbols._indexed
+    assert len(symbols._decoded) < 100
+    derived = loaded._tms.derived
+    assert isinstance(derived, OverlaySet) and not derived.changed()
+    assert Fact("dog", "is", "mammal") in derived and Fact("dog", "has", "hair") not in derived
+    loaded.remove_fact(Fact("dog", "has", "hair"))
+    assert Fact("dog", "is", "mammal") not in loaded.facts
+    assert Fact("dog", "is", "mammal") not in derived
+    assert set(derived) == kb._tms.derived - {Fact("dog", "is", "mammal")}
+
+
+def test_version_1_snapshot(tmp_path):
+    kb = saturated_kb()
+    path = tmp_path / "kb.snap"
+    kb.save_snapshot(str(path))
+    # Rewrites the file without the sorted symbol ids, as version 1 wrote it
+    data = path.read_bytes()
+    header = list(_HEADER.unpack_from(data))
+    entries = [_SECTION.unpack_from(data, _HEADER.size + i * _SECTION.size) for i in range(len(SECTIONS))]
+    sections = [data[offset:offset + length] for (offset, length), name in zip(entries, SECTIONS)
+                if name != "symbol_order"]
+    header[1] = 1
+    position = _HEADER.size + _SECTION.size * len(sections)
+    out = bytearray()
+    table = []
+    for section in sections:
+        position = (position + 7) & ~7
+        table.append((position, len(section)))
+        position += len(section)
+    out += _HEADER.pack(*header)
+    for entry in table:
+        out += _SECTION.pack(*entry)
+    for (offset, _), section in zip(table, sections):
+        out += b"\0" * (offset - len(out)) + section
+    path.write_bytes(bytes(out))
+
+    loaded = load_snapshot(str(path))
+    assert set(loaded.facts) == set(kb.facts)
+    assert Fact("café", "is", "mammal") in loaded.facts
+
+
+def test_snapshot_resaved_after_loading(tmp_path):
+    kb = saturated_kb()
+    first, second = tmp_path / "first.snap", tmp_path / "second.snap"
+    kb.save_snapshot(str(first))
+    load_snapshot(str(first)).save_snapshot(str(second))
+    assert first.read_bytes() == second.read_bytes()
+
+
+def test_invalid_snapshot(tmp_path):
+    path = tmp_path / "bad.snap"
+    path.write_bytes(b"not a snapshot at all, really not")
+    with pytest.raises(SnapshotError):
+        load_snapshot(str(path))
+
+    kb = saturated_kb()
+    kb.save_snapshot(str(path))
+    data = bytearray(path.read_bytes())
+    struct.pack_into("<I", data, 8, 99)
+    path.write_bytes(bytes(data))
+    with pytest.raises(SnapshotError, match="version"):
+        load_snapshot(str(path))
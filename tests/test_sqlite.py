@@ -0,0 +1,164 @@
+import random
+import sqlite3
+
+import pytest
+
+from clyps.fact import Fact
+from clyps.kb import KnowledgeBase
+from clyps.rule import Rule
+from clyps.sqlite import SQLiteFactStore
+from clyps.store import FactStore
+
+
+def test_sqlite_store_interface():
+    facts = [Fact(f"e{i % 7}", f"a{i % 3}", f"v{i % 5}") for i in range(60)]
+    store = SQLiteFactStore(facts=facts)
+    expected = FactStore(facts)
+    assert list(store) == list(expected)
+    assert len(store) == len(expected)
+    assert not store.add(facts[0])
+    assert set(store.lookup(attribute="a1")) == set(expected.lookup(attribute="a1"))
+    assert set(store.lookup(entity="e2", attribute="a2")) == set(expected.lookup(entity="e2", attribute="a2"))
+    assert set(store.candidates(Fact("?x", "a0", "v3"))) == set(expected.candidates(Fact("?x", "a0", "v3")))
+    assert store.sequence(facts[1]) > store.sequence(facts[0])
+    assert store.discard(facts[0])
+    assert not store.discard(facts[0])
+    assert facts[0] not in store and facts[1] in store
+    assert len(store) == len(expected) - 1
+    with pytest.raises(ValueError):
+        store.remove(facts[0])
+
+
+def test_sqlite_store_persists_published_facts(tmp_path):
+    path = str(tmp_path / "facts.db")
+    kb = KnowledgeBase(engine="sql", store=SQLiteFactStore(path))
+    kb.loads("(dog has hair) (defrule mammal (?x has hair) => (?x is mammal))")
+    kb.infer()
+    # Another connection sees the facts committed by infer()
+    (count,) = sqlite3.connect(path).execute("SELECT count(*) FROM facts").fetchone()
+    assert count == 2
+    kb.facts.close()
+    reopened = SQLiteFactStore(path)
+    assert len(reopened) == 2
+    assert Fact("dog", "is", "mammal") in reopened
+
+
+def _rules():
+    return [
+        Rule("base", [Fact("?x", "parent", "?y")], [Fact("?x", "ancestor", "?y")]),
+        Rule("step", [Fact("?x", "parent", "?y"), Fact("?y", "ancestor", "?z")], [Fact("?x", "ancestor", "?z")]),
+        Rule("self", [Fact("?x", "likes", "?x")], [Fact("?x", "is", "vain")]),
+        Rule("ground", [Fact("n1", "ancestor", "n3")], [Fact("n1", "is", "old"), Fact("tree", "is", "deep")]),
+        # The second action has a constant entity, so it derives nothing
+        Rule("quirk", [Fact("?x", "is", "vain")], [Fact("?x", "needs", "?unbound"), Fact("mirror", "is", "busy")]),
+        Rule("constant", [Fact("?x", "ancestor", "n4"), Fact("tree", "is", "deep")], [Fact("?x", "sees", "n4")]),
+    ]
+
+
+def _facts():
+    rng = random.Random(3)
+    facts = [Fact(f"n{i}", "parent", f"n{i + 1}") for i in range(8)]
+    facts += [Fact(f"n{rng.randrange(8)}", "likes", f"n{rng.randrange(8)}") for _ in range(30)]
+    facts += [Fact("n2", "likes", "n2"), Fact("?v", "likes", "?v"), Fact("n5", "parent", "?w")]
+    return facts
+
+
+def test_sql_engine_matches_naive():
+    expected = KnowledgeBase()
+    kb = KnowledgeBase(engine="sql")
+    for knowledge_base in (expected, kb):
+        for fact in _facts():
+            knowledge_base.add_fact(fact)
+        for _rule in _rules():
+            knowledge_base.add_rule(_rule)
+        knowledge_base.infer()
+    assert isinstance(kb.facts, SQLiteFactStore)
+    assert set(kb.facts) == set(expected.facts)
+    assert len(kb.facts) == len(expected.facts)
+    assert Fact("n2", "needs", "?unbound") in kb.facts
+    assert Fact("mirror", "is", "busy") not in kb.facts
+
+
+def test_sql_engine_resumes_after_new_facts():
+    kb = KnowledgeBase(engine="sql", stats=True)
+    for _rule in _rules()[:2]:
+        kb.add_rule(_rule)
+    for i in range(20):
+        kb.add_fact(Fact(f"n{i}", "parent", f"n{i + 1}"))
+    kb.infer()
+    assert len(kb.facts) == 20 + 20 * 21 // 2
+    assert kb.stats.rules["step"].derived == 20 * 19 // 2
+    kb.add_fact(Fact("n20", "parent", "n21"))
+    assert kb.facts[-1] == Fact("n20", "parent", "n21")
+    kb.infer()
+    assert len(kb.facts) == 21 + 21 * 22 // 2
+    assert kb.facts[-1] == list(kb.facts)[-1] != Fact("n20", "parent", "n21")
+
+
+def test_sql_engine_resumes_from_the_last_saturation():
+    kb = KnowledgeBase(engine="sql")
+    for _rule in _rules()[:2]:
+        kb.add_rule(_rule)
+    for i in range(20):
+        kb.add_fact(Fact(f"n{i}", "parent", f"n{i + 1}"))
+    kb.infer()
+    statements = []
+    kb.facts.connection.set_trace_callback(statements.append)
+    # SQLite gives the next fact the id of the deleted one
+    last = kb.facts[-1]
+    kb.remove_fact(last)
+    kb.add_fact(Fact("n20", "parent", "n21"))
+    kb.infer()
+    joins = [sql for sql in statements if sql.startswith("INSERT OR IGNORE INTO facts (entity, attribute, value) SELECT")]
+    # Every join starts from the new facts
+    assert joins and all("likelihood" in sql for sql in joins)
+    assert Fact("n0", "ancestor", "n21") in kb.facts
+    # As with the seminaive engine, only new facts are matched: the removed fact is not derived again
+    assert last not in kb.facts
+    assert len(kb.facts) == 21 + 21 * 22 // 2 - 1
+    statements.clear()
+    kb.add_rule(Rule("root", [Fact("?x", "ancestor", "n21")], [Fact("?x", "reaches", "n21")]))
+    kb.infer()
+    assert any("likelihood" not in sql for sql in statements if sql.startswith("INSERT OR IGNORE INTO facts"))
+    assert len(kb.facts.lookup(attribute="reaches")) == 21
+
+
+def test_sql_engine_max_cycles_and_until():
+    kbs = [KnowledgeBase(), KnowledgeBase(engine="sql")]
+    for kb in kbs:
+        for _rule in _rules()[:2]:
+            kb.add_rule(_rule)
+        for i in range(10):
+            kb.add_fact(Fact(f"n{i}", "parent", f"n{i + 1}"))
+    # Rounds see the facts derived by the rules before them, like the naive engine
+    for kb in kbs:
+        kb.infer(max_cycles=2)
+    assert set(kbs[1].facts) == set(kbs[0].facts)
+    assert Fact("n0", "ancestor", "n10") not in kbs[1].facts
+    kbs[1].infer(until="(n0 ancestor n8)")
+    assert Fact("n0", "ancestor", "n8") in kbs[1].facts
+    assert Fact("n0", "ancestor", "n10") not in kbs[1].facts
+
+
+def test_sql_engine_needs_sqlite_store():
+    kb = KnowledgeBase(engine="sql", store=FactStore())
+    kb.add_rule(_rules()[0])
+    with pytest.raises(ValueError):
+        kb.infer()
+
+
+def test_sql_engine_with_truth_maintenance_and_subscriptions():
+    kb = KnowledgeBase(engine="sql", truth_maintenance=True)
+    for _rule in _rules()[:2]:
+        kb.add_rule(_rule)
+    for i in range(3):
+        kb.add_fact(Fact(f"n{i}", "parent", f"n{i + 1}"))
+    changes = []
+    kb.subscribe("(?x ancestor ?y)", callback=changes.append)
+    kb.infer()
+    assert len(changes) == 6
+    kb.remove_fact(Fact("n1", "parent", "n2"))
+    assert set(kb.facts) == {
+        Fact("n0", "parent", "n1"), Fact("n2", "parent", "n3"),
+        Fact("n0", "ancestor", "n1"), Fact("n2", "ancestor", "n3"),
+    }
@@ -0,0 +1,78 @@
+import pytest
+
+from clyps.fact import Fact
+from clyps.kb import KnowledgeBase
+from clyps.rule import Rule
+from clyps.stats import InferenceStats, RuleStats
+
+
+def build(engine, **kwargs):
+    kb = KnowledgeBase(engine=engine, **kwargs)
+    kb.add_rule(Rule("base", [Fact("?x", "parent", "?y")], [Fact("?x", "ancestor", "?y")]))
+    kb.add_rule(Rule("step", [Fact("?x", "parent", "?y"), Fact("?y", "ancestor", "?z")],
+                     [Fact("?x", "ancestor", "?z")]))
+    kb.add_rule(Rule("ground", [Fact("a", "parent", "b")], [Fact("a", "is", "parent")]))
+    for i in range(4):
+        kb.add_fact(Fact(f"n{i}", "parent", f"n{i + 1}"))
+    kb.add_fact(Fact("a", "parent", "b"))
+    return kb
+
+
+@pytest.mark.parametrize("engine", ["naive", "seminaive", "rete"])
+def test_stats_count_derived_facts(engine):
+    kb = build(engine, stats=True)
+    kb.infer()
+    totals = kb.stats.rules
+    derived = len(kb.facts) - 5
+    assert sum(stats.derived for stats in totals.values()) == derived
+    assert totals["ground"].derived == 1
+    assert totals["step"].bindings >= 6
+    assert all(stats.seconds >= 0 for stats in totals.values())
+    assert kb.stats.cycles
+    assert "step" in kb.stats.report()
+
+
+def test_seminaive_stats_per_cycle():
+    kb = build("seminaive", stats=True)
+    kb.infer()
+    # Components run one after another; each round of the recursive one
+    # derives the ancestors one step longer
+    assert [list(cycle) for cycle in kb.stats.cycles] == [["ground"], ["base"]] + [["step"]] * 4
+    assert [cycle["step"].derived for cycle in kb.stats.cycles[2:]] == [3, 2, 1, 0]
+    base = kb.stats.cycles[1]["base"]
+    assert (base.tests, base.combinations, base.bindings, base.derived) == (1, 5, 5, 5)
+
+
+def test_duplicates_are_counted():
+    kb = KnowledgeBase(engine="seminaive", stats=True)
+    kb.add_rule(Rule("r", [Fact("?x", "likes", "?y")], [Fact("?x", "is", "happy")]))
+    kb.add_fact(Fact("a", "likes", "b"))
+    kb.add_fact(Fact("a", "likes", "c"))
+    kb.infer()
+    stats = kb.stats.rules["r"]
+    assert (stats.bindings, stats.derived, stats.duplicates) == (2, 1, 1)
+
+
+def test_rule_match_stats():
+    rule = Rule("r", [Fact("?x", "parent", "?y"), Fact("?y", "parent", "?z")], [Fact("?x", "grand", "?z")])
+    facts = [Fact("a", "parent", "b"), Fact("b", "parent", "c"), Fact("c", "parent", "d")]
+    stats = RuleStats("r")
+    assert len(rule.match(facts, stats=stats)) == 2
+    assert stats.bindings == 2
+    assert stats.combinations == 5
+    assert stats.tests == 4
+
+
+def test_watch_and_disabled_stats():
+    fired = []
+    kb = build("seminaive")
+    assert kb.stats is None
+    kb.infer()
+
+    kb = build("seminaive")
+    kb.stats = InferenceStats(watch=lambda name, bindings: fired.append((name, bindings)))
+    kb.infer()
+    assert ("base", {"?x": "n0", "?y": "n1"}) in fired
+    assert kb.stats.firings == len(fired)
+    kb.stats.reset()
+    assert not kb.stats.cycles and kb.stats.firings == 0
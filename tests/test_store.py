@@ -0,0 +1,75 @@
+import pytest
+
+from clyps.columnar import ColumnarFactStore
+from clyps.fact import Fact
+from clyps.overlay import OverlayFactStore
+from clyps.sqlite import SQLiteFactStore
+from clyps.store import FactStore
+from clyps.versioned import VersionedFactStore
+
+
+def test_store_deduplicates():
+    store = FactStore()
+    assert store.add(Fact("dog", "has", "hair"))
+    assert not store.add(Fact("dog", "has", "hair"))
+    assert len(store) == 1
+
+
+def test_store_keeps_insertion_order():
+    facts = [Fact("dog", "has", "hair"), Fact("cat", "has", "fur"), Fact("dog", "is", "mammal")]
+    store = FactStore(facts)
+    assert list(store) == facts
+    assert store == facts
+    assert store[1] == Fact("cat", "has", "fur")
+    assert repr(store) == "[(dog has hair), (cat has fur), (dog is mammal)]"
+
+
+@pytest.mark.parametrize("store_type", [
+    FactStore, ColumnarFactStore, VersionedFactStore, SQLiteFactStore,
+    lambda: OverlayFactStore(FactStore([Fact("base", "is", "fact")])),
+], ids=["store", "columnar", "versioned", "sqlite", "overlay"])
+def test_store_indexing_follows_changes(store_type):
+    store = store_type()
+    for i in range(5):
+        store.add(Fact(f"e{i}", "a", "v"))
+    assert [store[i] for i in range(len(store))] == list(store)
+    store.discard(store[1])
+    store.add(Fact("new", "a", "v"))
+    assert [store[i] for i in range(len(store))] == list(store)
+    assert store[-1] == Fact("new", "a", "v")
+    assert store[:2] == list(store)[:2]
+
+
+def test_store_remove():
+    store = FactStore([Fact("dog", "has", "hair")])
+    store.remove(Fact("dog", "has", "hair"))
+    assert Fact("dog", "has", "hair") not in store
+    assert list(store.lookup(attribute="has")) == []
+    try:
+        store.remove(Fact("dog", "has", "hair"))
+    except ValueError as e:
+        assert str(e) == "(dog has hair) not in store"
+
+
+def test_store_lookup_indexes():
+    store = FactStore([
+        Fact("dog", "has", "hair"),
+        Fact("cat", "has", "hair"),
+        Fact("dog", "is", "mammal"),
+    ])
+    assert list(store.lookup(attribute="has")) == [Fact("dog", "has", "hair"), Fact("cat", "has", "hair")]
+    assert list(store.lookup(entity="dog", attribute="has")) == [Fact("dog", "has", "hair")]
+    assert list(store.lookup(attribute="is", value="mammal")) == [Fact("dog", "is", "mammal")]
+    assert list(store.lookup("cat", "has", "hair")) == [Fact("cat", "has", "hair")]
+    assert list(store.lookup("cat", "is", "mammal")) == []
+
+
+def test_store_candidates_treat_variables_as_wildcards():
+    store = FactStore([Fact("dog", "has", "hair"), Fact("cat", "has", "fur")])
+    assert list(store.candidates(Fact("?x", "has", "fur"))) == [Fact("cat", "has", "fur")]
+    assert len(list(store.candidates(Fact("?x", "has", "?y")))) == 2
+
+
+def test_fact_hash():
+    assert hash(Fact("dog", "has", "hair")) == hash(Fact("dog", "has", "hair"))
+    assert len({Fact("dog", "has", "hair"), Fact("dog", "has", "hair")}) == 1
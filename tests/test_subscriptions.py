@@ -0,0 +1,161 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from clyps.fact import Fact
+from clyps.kb import KnowledgeBase
+from clyps.rule import Rule
+from clyps.subscriptions import Change
+
+
+def _kb(engine="naive", **kwargs):
+    kb = KnowledgeBase(engine=engine, **kwargs)
+    kb.add_rule(Rule("mammal", [Fact("?x", "has", "hair")], [Fact("?x", "is", "mammal")]))
+    kb.add_rule(Rule("warm", [Fact("?x", "is", "mammal")], [Fact("?x", "is", "warm")]))
+    kb.add_fact(Fact("dog", "has", "hair"))
+    kb.add_fact(Fact("cat", "has", "hair"))
+    return kb
+
+
+@pytest.mark.parametrize("engine", KnowledgeBase.ENGINES)
+def test_subscribe_callback_receives_derived_facts(engine):
+    kb = _kb(engine)
+    changes = []
+    kb.subscribe("(?x is mammal)", callback=changes.append)
+    kb.infer()
+    assert sorted(change.fact.entity for change in changes) == ["cat", "dog"]
+    assert {change.kind for change in changes} == {"derived"}
+
+
+def test_subscribe_without_pattern_and_asserted_facts():
+    kb = _kb()
+    changes = []
+    kb.subscribe(callback=changes.append)
+    kb.add_fact(Fact("cow", "has", "hair"))
+    assert changes == []
+    kb.infer()
+    assert len(changes) == 6
+
+
+def test_subscribe_reports_retractions_with_truth_maintenance():
+    kb = _kb("seminaive", truth_maintenance=True)
+    kb.add_rule(Rule("hairy", [Fact("?x", "has", "fur")], [Fact("?x", "is", "mammal")]))
+    kb.add_fact(Fact("dog", "has", "fur"))
+    kb.infer()
+    changes = []
+    kb.subscribe(callback=changes.append)
+    kb.remove_fact(Fact("cat", "has", "hair"))
+    kb.remove_fact(Fact("dog", "has", "hair"))
+    # The dog is still a mammal through its fur, so nothing about it is reported
+    assert set(changes) == {
+        Change("retracted", Fact("cat", "has", "hair")),
+        Change("retracted", Fact("cat", "is", "mammal")),
+        Change("retracted", Fact("cat", "is", "warm")),
+        Change("retracted", Fact("dog", "has", "hair")),
+    }
+
+
+def test_retraction_reports_facts_it_derives_for_the_first_time():
+    kb = KnowledgeBase(engine="seminaive", truth_maintenance=True)
+    kb.add_rule(Rule("hair", [Fact("?x", "has", "hair")], [Fact("?x", "is", "mammal")]))
+    kb.add_rule(Rule("fur", [Fact("?x", "has", "fur")], [Fact("?x", "is", "mammal")]))
+    kb.add_fact(Fact("rex", "has", "hair"))
+    kb.add_fact(Fact("rex", "has", "fur"))
+    kb.infer()
+    # Not inferred yet: resuming inference after the retraction derives it
+    kb.add_rule(Rule("warm", [Fact("?x", "is", "mammal")], [Fact("?x", "is", "warm")]))
+    changes = []
+    kb.subscribe(callback=changes.append)
+    kb.remove_fact(Fact("rex", "has", "hair"))
+    assert changes == [
+        Change("retracted", Fact("rex", "has", "hair")),
+        Change("derived", Fact("rex", "is", "warm")),
+    ]
+
+
+def test_closed_subscription_stops_receiving():
+    kb = _kb()
+    changes = []
+    subscription = kb.subscribe(callback=changes.append)
+    subscription.close()
+    kb.infer()
+    assert changes == []
+    assert kb._subscriptions == []
+
+
+def test_bounded_queue_applies_backpressure():
+    kb = KnowledgeBase(engine="seminaive")
+    kb.add_rule(Rule("copy", [Fact("?x", "a", "?y")], [Fact("?x", "b", "?y")]))
+    for i in range(50):
+        kb.add_fact(Fact(f"e{i}", "a", "v"))
+    subscription = kb.subscribe("(?x b ?y)", maxsize=5)
+    worker = threading.Thread(target=kb.infer)
+    worker.start()
+    time.sleep(0.05)
+    # Inference waits for the consumer once the queue is full
+    assert worker.is_alive()
+    assert subscription._queue.qsize() == 5
+    received = []
+    for change in subscription:
+        received.append(change)
+        if len(received) == 50:
+            break
+    worker.join()
+    subscription.close()
+    assert list(subscription) == []
+    assert {change.fact.entity for change in received} == {f"e{i}" for i in range(50)}
+
+
+def test_close_unblocks_producer():
+    kb = _kb()
+    subscription = kb.subscribe(maxsize=1)
+    worker = threading.Thread(target=kb.infer)
+    worker.start()
+    time.sleep(0.05)
+    subscription.close()
+    worker.join(timeout=2)
+    assert not worker.is_alive()
+    assert Fact("cat", "is", "warm") in kb.facts
+    assert len(subscription.pending()) == 1
+
+
+def test_async_iteration():
+    kb = _kb()
+
+    async def consume():
+        subscription = kb.subscribe("(?x is warm)", maxsize=1)
+        loop = asyncio.get_running_loop()
+        inference = loop.run_in_executor(None, kb.infer)
+        received = []
+        async for change in subscription:
+            received.append(change.fact)
+            if len(received) == 2:
+                subscription.close()
+        await inference
+        return received
+
+    received = asyncio.run(consume())
+    assert sorted(received, key=str) == [Fact("cat", "is", "warm"), Fact("dog", "is", "warm")]
+
+
+def test_async_readers_do_not_hold_executor_threads():
+    kb = _kb()
+
+    async def consume(subscription):
+        return [change.fact async for change in subscription]
+
+    async def scenario():
+        # More readers than threads in the default executor, which also runs inference
+        subscriptions = [kb.subscribe("(?x is warm)", maxsize=1) for _ in range(40)]
+        readers = [asyncio.ensure_future(consume(subscription)) for subscription in subscriptions]
+        await asyncio.sleep(0.05)
+        await asyncio.get_running_loop().run_in_executor(None, kb.infer)
+        for subscription in subscriptions:
+            subscription.close()
+        return await asyncio.gather(*readers)
+
+    results = asyncio.run(asyncio.wait_for(scenario(), timeout=10))
+    assert all(sorted(received, key=str) == [Fact("cat", "is", "warm"), Fact("dog", "is", "warm")]
+               for received in results)
@@ -0,0 +1,88 @@
+from clyps.fact import Fact
+from clyps.kb import KnowledgeBase
+from clyps.rule import Rule
+
+
+def _animal_kb(engine="seminaive"):
+    kb = KnowledgeBase(engine=engine, truth_maintenance=True)
+    kb.add_rule(Rule("mammalRule", [Fact("?x", "has", "hair")], [Fact("?x", "is", "mammal")]))
+    kb.add_rule(Rule("milkRule", [Fact("?x", "gives", "milk")], [Fact("?x", "is", "mammal")]))
+    kb.add_rule(Rule("warmRule", [Fact("?x", "is", "mammal")], [Fact("?x", "is", "warm")]))
+    kb.add_fact(Fact("dog", "has", "hair"))
+    kb.add_fact(Fact("cow", "has", "hair"))
+    kb.add_fact(Fact("cow", "gives", "milk"))
+    kb.infer()
+    return kb
+
+
+def test_retract_removes_unsupported_derived_facts():
+    kb = _animal_kb()
+    kb.remove_fact(Fact("dog", "has", "hair"))
+    assert Fact("dog", "is", "mammal") not in kb.facts
+    assert Fact("dog", "is", "warm") not in kb.facts
+    assert Fact("cow", "is", "warm") in kb.facts
+
+
+def test_retract_keeps_facts_with_alternative_support():
+    kb = _animal_kb()
+    kb.remove_fact(Fact("cow", "has", "hair"))
+    assert Fact("cow", "is", "mammal") in kb.facts
+    assert Fact("cow", "is", "warm") in kb.facts
+    kb.remove_fact(Fact("cow", "gives", "milk"))
+    assert Fact("cow", "is", "mammal") not in kb.facts
+    assert Fact("cow", "is", "warm") not in kb.facts
+
+
+def test_retract_cyclic_support():
+    kb = KnowledgeBase(engine="seminaive", truth_maintenance=True)
+    kb.add_rule(Rule("r1", [Fact("?x", "p", "yes")], [Fact("?x", "q", "yes")]))
+    kb.add_rule(Rule("r2", [Fact("?x", "q", "yes")], [Fact("?x", "p", "yes")]))
+    kb.add_rule(Rule("r3", [Fact("?x", "base", "yes")], [Fact("?x", "p", "yes")]))
+    kb.add_fact(Fact("a", "base", "yes"))
+    kb.infer()
+    assert Fact("a", "q", "yes") in kb.facts
+    kb.remove_fact(Fact("a", "base", "yes"))
+    assert list(kb.facts) == []
+
+
+def test_retract_transitive_closure():
+    kb = KnowledgeBase(engine="seminaive", truth_maintenance=True)
+    kb.add_rule(Rule("base", [Fact("?x", "edge", "?y")], [Fact("?x", "path", "?y")]))
+    kb.add_rule(
+        Rule("step", [Fact("?x", "edge", "?y"), Fact("?y", "path", "?z")], [Fact("?x", "path", "?z")])
+    )
+    for i in range(5):
+        kb.add_fact(Fact(f"n{i}", "edge", f"n{i + 1}"))
+    kb.add_fact(Fact("n0", "edge", "n2"))
+    kb.infer()
+    kb.remove_fact(Fact("n1", "edge", "n2"))
+    paths = {(f.entity, f.value) for f in kb.facts if f.attribute == "path"}
+    assert ("n0", "n5") in paths
+    assert ("n1", "n2") not in paths
+    assert not any(entity == "n1" for entity, _ in paths)
+
+
+def test_asserted_fact_is_not_retracted_with_its_derivation():
+    kb = _animal_kb()
+    kb.add_fact(Fact("dog", "is", "mammal"))
+    kb.remove_fact(Fact("dog", "has", "hair"))
+    assert Fact("dog", "is", "mammal") in kb.facts
+    assert Fact("dog", "is", "warm") in kb.facts
+
+
+def test_retract_with_rete_engine():
+    kb = _animal_kb(engine="rete")
+    kb.remove_fact(Fact("dog", "has", "hair"))
+    assert Fact("dog", "is", "warm") not in kb.facts
+    kb.add_fact(Fact("dog", "has", "hair"))
+    kb.infer()
+    assert Fact("dog", "is", "warm") in kb.facts
+
+
+def test_remove_fact_without_truth_maintenance_keeps_derived_facts():
+    kb = KnowledgeBase()
+    kb.add_rule(Rule("mammalRule", [Fact("?x", "has", "hair")], [Fact("?x", "is", "mammal")]))
+    kb.add_fact(Fact("dog", "has", "hair"))
+    kb.infer()
+    kb.remove_fact(Fact("dog", "has", "hair"))
+    assert Fact("dog", "is", "mammal") in kb.facts
@@ -0,0 +1,118 @@
+import random
+
+import pytest
+
+from clyps import kb as kb_module
+from clyps.columnar import ColumnarFactStore
+from clyps.compiler import CompiledRule
+from clyps.fact import Fact
+from clyps.kb import KnowledgeBase
+from clyps.rule import Rule
+from clyps.store import FactStore
+
+np = pytest.importorskip("numpy")
+
+from clyps.vectorized import FactArrays, match  # noqa: E402
+
+
+def _sorted(bindings):
+    return sorted(sorted(item.items()) for item in bindings)
+
+
+def _facts(count, seed=1):
+    rng = random.Random(seed)
+    return [Fact(f"e{rng.randrange(40)}", f"a{rng.randrange(4)}", f"e{rng.randrange(40)}") for _ in range(count)]
+
+
+RULES = [
+    Rule("one", [Fact("?x", "a0", "?y")], []),
+    Rule("constant", [Fact("e1", "a1", "?y")], []),
+    Rule("same", [Fact("?x", "a2", "?x")], []),
+    Rule("chain", [Fact("?x", "a0", "?y"), Fact("?y", "a1", "?z")], []),
+    Rule("two_shared", [Fact("?x", "a0", "?y"), Fact("?x", "a1", "?y")], []),
+    Rule("triangle", [Fact("?x", "a0", "?y"), Fact("?y", "a1", "?z"), Fact("?z", "a2", "?x")], []),
+    Rule("product", [Fact("?x", "a0", "e3"), Fact("?y", "a1", "e4")], []),
+    Rule("ground", [Fact("?x", "a0", "?y"), Fact("e1", "a3", "e2")], []),
+    Rule("missing", [Fact("?x", "a0", "?y"), Fact("?y", "nothing", "?z")], []),
+]
+
+
+@pytest.mark.parametrize("rule", RULES, ids=lambda rule: rule.name)
+def test_vectorized_match_equals_rule_match(rule):
+    facts = _facts(600) + [Fact("e1", "a3", "e2")]
+    assert _sorted(match(rule, facts)) == _sorted(rule.match(facts))
+
+
+def test_vectorized_match_skips_variable_values():
+    facts = [Fact("dog", "has", "?x"), Fact("?y", "has", "hair"), Fact("cat", "has", "hair")]
+    rule = Rule("r", [Fact("?a", "has", "?b")], [])
+    assert match(rule, facts) == [{"?a": "cat", "?b": "hair"}] == rule.match(facts)
+
+
+def test_vectorized_match_on_columnar_store_with_removed_facts():
+    store = ColumnarFactStore(_facts(300))
+    for fact in list(store)[::3]:
+        store.remove(fact)
+    rule = RULES[3]
+    arrays = FactArrays(store)
+    assert len(arrays) == len(store)
+    assert _sorted(arrays.match(rule)) == _sorted(rule.match(store))
+    ids = arrays.match_ids(rule)
+    assert set(ids) == {"?x", "?y", "?z"}
+    assert all(isinstance(column, np.ndarray) for column in ids.values())
+
+
+def test_vectorized_match_without_variables():
+    facts = [Fact("dog", "has", "hair")]
+    rule = Rule("r", [Fact("dog", "has", "hair")], [])
+    assert match(rule, facts) == rule.match(facts) == []
+
+
+@pytest.mark.parametrize("rule", RULES, ids=lambda rule: rule.name)
+def test_vectorized_fire_equals_compiled_fire(rule):
+    rule = Rule(rule.name, rule.conditions, [Fact("?x", "found", "e0"), Fact("?y", "found", "?z")])
+    facts = _facts(600) + [Fact("e1", "a3", "e2")]
+    store = ColumnarFactStore(facts)
+    delta = FactStore(facts[::7])
+    expected = CompiledRule(rule.conditions, rule.actions).fire(FactStore(facts), delta)
+    assert sorted(FactArrays(store, delta).fire(rule), key=repr) == sorted(expected, key=repr)
+
+
+def test_seminaive_engine_matches_large_rounds_with_numpy(monkeypatch):
+    results = []
+    for threshold in (10 ** 9, 1):
+        monkeypatch.setattr(kb_module, "VECTORIZED_DELTA", threshold)
+        kb = KnowledgeBase(engine="seminaive", store=ColumnarFactStore())
+        kb.add_rule(Rule("reach", [Fact("?x", "a0", "?y"), Fact("?y", "a0", "?z")], [Fact("?x", "a0", "?z")]))
+        kb.add_rule(Rule("mark", [Fact("?x", "a0", "e1"), Fact("e1", "a1", "?y")], [Fact("?x", "a3", "?y")]))
+        for fact in _facts(200, seed=4):
+            kb.add_fact(fact)
+        kb.remove_fact(next(iter(kb.facts)))
+        kb.infer()
+        results.append(set(kb.facts))
+    assert results[0] == results[1]
+
+
+def test_forked_parent_keeps_matching_with_numpy(monkeypatch):
+    monkeypatch.setattr(kb_module, "VECTORIZED_DELTA", 1)
+    rounds = []
+    arrays = KnowledgeBase._arrays
+
+    def spy(kb, delta):
+        rounds.append(arrays(kb, delta))
+        return rounds[-1]
+
+    monkeypatch.setattr(KnowledgeBase, "_arrays", spy)
+    results = []
+    for fork in (False, True):
+        kb = KnowledgeBase(engine="seminaive", store=ColumnarFactStore())
+        kb.add_rule(Rule("reach", [Fact("?x", "a0", "?y"), Fact("?y", "a0", "?z")], [Fact("?x", "a0", "?z")]))
+        for fact in _facts(100, seed=2):
+            kb.add_fact(fact)
+        child = kb.fork() if fork else None
+        rounds.clear()
+        kb.infer()
+        assert rounds and all(arrays is not None for arrays in rounds)
+        results.append(set(kb.facts))
+    assert results[0] == results[1]
+    assert set(child.facts) == set(_facts(100, seed=2))
@@ -0,0 +1,122 @@
+import threading
+
+from clyps.fact import Fact
+from clyps.kb import KnowledgeBase
+from clyps.rule import Rule
+from clyps.store import FactStore
+from clyps.versioned import FactSnapshot, VersionedFactStore
+
+
+def test_versioned_store_behaves_like_fact_store():
+    facts = [Fact(f"e{i % 7}", f"a{i % 3}", f"v{i % 5}") for i in range(60)]
+    store = VersionedFactStore()
+    reference = FactStore()
+    for i, fact in enumerate(facts):
+        assert store.add(fact) == reference.add(fact)
+        if i % 10 == 0:
+            store.publish()
+    for fact in facts[::4]:
+        assert store.discard(fact) == reference.discard(fact)
+    assert not store.discard(Fact("x", "y", "z"))
+    assert len(store) == len(reference)
+    assert list(store) == list(reference)
+    for entity, attribute, value in [("e1", "a1", None), (None, "a2", "v3"), (None, "a0", None), ("e2", "a2", "v2")]:
+        assert sorted(store.lookup(entity, attribute, value), key=repr) == sorted(
+            reference.lookup(entity, attribute, value), key=repr
+        )
+    assert store.candidates(Fact("?x", "a1", "v1")) == [f for f in store if f.attribute == "a1" and f.value == "v1"]
+
+
+def test_snapshots_are_isolated():
+    store = VersionedFactStore([Fact("a", "is", "x")])
+    first = store.snapshot()
+    store.add(Fact("b", "is", "x"))
+    store.discard(Fact("a", "is", "x"))
+    # Unpublished changes are invisible
+    assert store.snapshot() is first
+    assert list(first) == [Fact("a", "is", "x")]
+
+    second = store.publish()
+    assert second.generation == first.generation + 1
+    assert list(second) == [Fact("b", "is", "x")]
+    assert list(first) == [Fact("a", "is", "x")] and len(first) == 1
+
+    store.add(Fact("a", "is", "x"))
+    third = store.publish()
+    assert sorted(map(repr, third)) == ["(a is x)", "(b is x)"]
+    assert Fact("a", "is", "x") not in second
+    assert store.sequence(Fact("a", "is", "x")) > store.sequence(Fact("b", "is", "x"))
+
+
+def test_segments_are_merged_and_tombstones_dropped():
+    store = VersionedFactStore()
+    for i in range(4096):
+        store.add(Fact(f"e{i}", "n", str(i)))
+        store.publish()
+    assert len(store._sealed) <= 13
+    for i in range(3000):
+        store.discard(Fact(f"e{i}", "n", str(i)))
+    snapshot = store.publish()
+    assert not store._tombstones and len(store._sealed) == 1
+    assert len(snapshot) == len(list(snapshot)) == 1096
+    assert snapshot.lookup(None, "n", "4000") == [Fact("e4000", "n", "4000")]
+
+
+def test_knowledge_base_publishes_after_infer():
+    kb = KnowledgeBase(engine="seminaive", store=VersionedFactStore())
+    kb.add_rule(Rule("mammal", [Fact("?x", "has", "hair")], [Fact("?x", "is", "mammal")]))
+    kb.add_fact(Fact("dog", "has", "hair"))
+    before = kb.snapshot()
+    kb.infer()
+    after = kb.snapshot()
+    assert isinstance(after, FactSnapshot) and after.generation > before.generation
+    assert Fact("dog", "is", "mammal") not in before
+    assert list(after.query("(?x is mammal)")) == [{"?x": "dog"}]
+
+    plain = KnowledgeBase()
+    plain.add_fact(Fact("dog", "has", "hair"))
+    copy = plain.snapshot()
+    plain.add_fact(Fact("cat", "has", "hair"))
+    assert len(copy) == 1
+
+
+def test_reads_during_inference_in_another_thread():
+    kb = KnowledgeBase(engine="seminaive", store=VersionedFactStore())
+    kb.add_rule(Rule("base", [Fact("?x", "parent", "?y")], [Fact("?x", "ancestor", "?y")]))
+    kb.add_rule(Rule("step", [Fact("?x", "parent", "?y"), Fact("?y", "ancestor", "?z")],
+                     [Fact("?x", "ancestor", "?z")]))
+    errors = []
+    done = threading.Event()
+
+    def writer():
+        try:
+            for chain in range(10):
+                for i in range(40):
+                    kb.add_fact(Fact(f"c{chain}n{i}", "parent", f"c{chain}n{i + 1}"))
+                kb.infer()
+        except Exception as error:
+            errors.append(error)
+        finally:
+            done.set()
+
+    def reader():
+        try:
+            generation = 0
+            while not done.is_set():
+                snapshot = kb.snapshot()
+                assert snapshot.generation >= generation
+                generation = snapshot.generation
+                ancestors = snapshot.lookup(None, "ancestor", None)
+                # Every published version is a complete saturation
+                assert len(ancestors) % (40 * 41 // 2) == 0
+                assert len(list(snapshot)) == len(snapshot)
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=writer), threading.Thread(target=reader)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert len(kb.snapshot().lookup(None, "ancestor", None)) == 10 * 40 * 41 // 2